@@ -0,0 +1,128 @@
+import argparse
+import json
+
+from common import (
+    FAMILIES,
+    add_transport_arguments,
+    connect,
+    device_addresses,
+    time_calls,
+)
+
+
+def family_commands(ki, family, num_devices, num_bytes):
+    # {name: callable} for the key scan and register access paths of a family
+    data = bytes(num_bytes)
+    if family == "iqs7220a":
+        return {
+            "iqs7220a_ks": ki.iqs7220a_ks,
+            "iqs7220a_i2c_read_single": lambda: ki.iqs7220a_i2c_read_single(
+                0, 0x10, num_bytes
+            ),
+            "iqs7220a_i2c_write_single": lambda: ki.iqs7220a_i2c_write_single(
+                0, 0x10, data
+            ),
+            "iqs7220a_i2c_read_multi": lambda: ki.iqs7220a_i2c_read_multi(
+                0x10, num_bytes
+            ),
+            "iqs7220a_i2c_write_multi": lambda: ki.iqs7220a_i2c_write_multi(0x10, data),
+        }
+    if family == "iqs7320a":
+        return {
+            "iqs7320a_ks": ki.iqs7320a_ks,
+            "iqs7320a_i2c_read_single": lambda: ki.iqs7320a_i2c_read_single(
+                0, 0x10, num_bytes
+            ),
+            "iqs7320a_i2c_write_single": lambda: ki.iqs7320a_i2c_write_single(
+                0, 0x10, data
+            ),
+            "iqs7320a_i2c_read_multi": lambda: ki.iqs7320a_i2c_read_multi(
+                0x10, num_bytes
+            ),
+            "iqs7320a_i2c_write_multi": lambda: ki.iqs7320a_i2c_write_multi(0x10, data),
+        }
+    if family == "iqs9320_i2c":
+        addresses = device_addresses(family, num_devices)
+        return {
+            "iqs9320_i2c_read_single": lambda: ki.iqs9320_i2c_read_single(
+                0x2000, num_bytes
+            ),
+            "iqs9320_i2c_write_single": lambda: ki.iqs9320_i2c_write_single(
+                0x2000, data
+            ),
+            "iqs9320_i2c_read_multi": lambda: ki.iqs9320_i2c_read_multi(
+                addresses, 0x2000, num_bytes
+            ),
+            "iqs9320_i2c_write_multi": lambda: ki.iqs9320_i2c_write_multi(
+                addresses, 0x2000, data
+            ),
+        }
+    return {
+        "iqs9320_ks": lambda: ki.iqs9320_ks(20),
+        "iqs9320_ks_i2c_read_single": lambda: ki.iqs9320_ks_i2c_read_single(
+            0, 0x2000, num_bytes
+        ),
+        "iqs9320_ks_i2c_write_single": lambda: ki.iqs9320_ks_i2c_write_single(
+            0, 0x2000, data
+        ),
+        "iqs9320_ks_i2c_read_multi": lambda: ki.iqs9320_ks_i2c_read_multi(
+            0x2000, num_bytes
+        ),
+        "iqs9320_ks_i2c_write_multi": lambda: ki.iqs9320_ks_i2c_write_multi(
+            0x2000, data
+        ),
+    }
+
+
+def bench_commands(args):
+    # [{family, command, devices, bytes, count, mean_us, p50_us, ...}]
+    results = []
+    for family in args.family or sorted(FAMILIES):
+        for num_devices in args.devices:
+            ki, _ = connect(family, num_devices, args)
+            try:
+                for num_bytes in args.bytes:
+                    commands = family_commands(ki, family, num_devices, num_bytes)
+                    for name, function in commands.items():
+                        result = {
+                            "family": family,
+                            "command": name,
+                            "devices": num_devices,
+                            "bytes": num_bytes,
+                        }
+                        result.update(time_calls(function, args.number))
+                        results.append(result)
+            finally:
+                ki.close()
+    return results
+
+
+def add_arguments(parser):
+    add_transport_arguments(parser)
+    parser.add_argument("--number", type=int, default=500, help="Calls per command")
+    parser.add_argument(
+        "--devices", type=int, nargs="+", default=[1, 4], help="Device counts"
+    )
+    parser.add_argument(
+        "--bytes", type=int, nargs="+", default=[2, 32], help="Register access sizes"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Command latency percentiles")
+    add_arguments(parser)
+    parser.add_argument("--json", action="store_true", help="Print JSON results")
+    args = parser.parse_args()
+    results = bench_commands(args)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for r in results:
+        print(
+            "{command:>28} {devices:>2} dev {bytes:>3} B : p50 {p50_us:>8.1f} us"
+            "  p99 {p99_us:>8.1f} us".format(**r)
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import argparse
+import contextlib
+import io
+import json
+
+from common import DEVICE_ADDRESS, FAMILIES, add_transport_arguments, time_calls
+
+from azo_ki import KeyboardInterface, SimulatedPico
+from azo_ki.azo_ki import close_open_connections, find_ports
+
+
+def connect_modes(family, args):
+    # {mode: callable} creating and closing one interface
+    device = FAMILIES[family]
+    kwargs = {"device_address": DEVICE_ADDRESS[family]}
+
+    def connect(**options):
+        options = dict(kwargs, **options)
+        if not args.port:
+            options["transport"] = SimulatedPico(
+                latency=args.latency, baudrate=args.baudrate
+            )
+        KeyboardInterface(device, **options).close()
+
+    modes = {
+        "connect": lambda: connect(port=args.port),
+        "connect_skip_setup": lambda: connect(port=args.port, skip_setup=True),
+    }
+    if args.port:
+        # Enumeration, then the port left open and set up by the last call
+        modes["connect_discover"] = lambda: connect()
+        modes["connect_reuse_port"] = lambda: connect(reuse_port=True)
+    return modes
+
+
+def bench_connect(args):
+    # [{family, mode, count, mean_us, p50_us, ...}], host port discovery
+    # is reported once under the family "host". Finding no board is not
+    # cached, so without a board both discovery modes enumerate.
+    results = []
+    for name, max_age in (("discovery", 0), ("cached_discovery", 60)):
+        result = {"family": "host", "mode": name}
+        result.update(
+            time_calls(lambda a=max_age: find_ports(False, max_age=a), args.connects)
+        )
+        results.append(result)
+    # The interfaces print their connection progress
+    with contextlib.redirect_stdout(io.StringIO()):
+        for family in args.family or sorted(FAMILIES):
+            try:
+                for mode, function in connect_modes(family, args).items():
+                    result = {"family": family, "mode": mode}
+                    result.update(time_calls(function, args.connects, warmup=2))
+                    results.append(result)
+            finally:
+                close_open_connections()
+    return results
+
+
+def add_arguments(parser):
+    add_transport_arguments(parser)
+    parser.add_argument(
+        "--connects", type=int, default=50, help="Interfaces created per mode"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Interface startup latency")
+    add_arguments(parser)
+    parser.add_argument("--json", action="store_true", help="Print JSON results")
+    args = parser.parse_args()
+    results = bench_connect(args)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for r in results:
+        print(
+            "{family:>12} {mode:>20} : p50 {p50_us:>10.1f} us"
+            "  p99 {p99_us:>10.1f} us".format(**r)
+        )
+
+
+if __name__ == "__main__":
+    main()
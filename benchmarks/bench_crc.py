@@ -0,0 +1,29 @@
+import argparse
+import os
+import timeit
+
+from azo_ki import crc
+
+
+def bench_crc(size=64, number=2000):
+    data = os.urandom(size)
+    results = {}
+    for name, backend in crc.backends.items():
+        n = number if name != "bitwise" else max(1, number // 10)
+        elapsed = timeit.timeit(lambda b=backend: b(data), number=n)
+        results[name] = size * n / elapsed
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CRC-16/CCITT backend throughput")
+    parser.add_argument("--size", type=int, default=64)
+    parser.add_argument("--number", type=int, default=2000)
+    args = parser.parse_args()
+    print("Active backend : {}".format(crc.backend_name))
+    for name, rate in bench_crc(args.size, args.number).items():
+        print("{:>10} : {:>14,.0f} bytes/s".format(name, rate))
+
+
+if __name__ == "__main__":
+    main()
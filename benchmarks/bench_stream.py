@@ -0,0 +1,170 @@
+import argparse
+import json
+import time
+
+from common import FAMILIES, add_transport_arguments, connect, device_addresses
+
+try:
+    from azo_ki import StreamDecoder
+    from azo_ki.stream import require_numpy
+
+    require_numpy()
+except ImportError:
+    StreamDecoder = None
+
+# Report interval for the stream commands, the firmware minimum
+REPORT_INTERVAL_MS = 1
+
+
+def stream_modes(ki, family, num_devices, num_registers):
+    # {mode: (start function, frame size, StreamDecoder arguments or None)}
+    wide = family.startswith("iqs9320")
+    registers = [(0x1000 if wide else 0x10) + i for i in range(num_registers)]
+    sizes = [2] * num_registers
+    interval = REPORT_INTERVAL_MS
+    single = sum(sizes)
+    multi = single * num_devices
+    if family in ("iqs7220a", "iqs7320a"):
+        stream = getattr(ki, family + "_stream_ks")
+        single_stream = getattr(ki, family + "_stream_i2c_read_single")
+        multi_stream = getattr(ki, family + "_stream_i2c_read_multi")
+        return {
+            family + "_stream_ks": (lambda: stream(interval), num_devices, None),
+            family + "_stream_i2c_read_single": (
+                lambda: single_stream(interval, 0, registers, sizes),
+                single,
+                (registers, sizes, 1),
+            ),
+            family + "_stream_i2c_read_multi": (
+                lambda: multi_stream(interval, registers, sizes),
+                multi,
+                (registers, sizes, num_devices),
+            ),
+        }
+    if family == "iqs9320_i2c":
+        addresses = device_addresses(family, num_devices)
+        return {
+            "iqs9320_stream_i2c_read_single": (
+                lambda: ki.iqs9320_stream_i2c_read_single(interval, registers, sizes),
+                single,
+                (registers, sizes, 1),
+            ),
+            "iqs9320_stream_i2c_read_multi": (
+                lambda: ki.iqs9320_stream_i2c_read_multi(
+                    interval, addresses, registers, sizes
+                ),
+                multi,
+                (registers, sizes, addresses),
+            ),
+        }
+    return {
+        "iqs9320_ks_stream_ks": (
+            lambda: ki.iqs9320_ks_stream_ks(interval, 20),
+            num_devices * 3,
+            None,
+        ),
+        "iqs9320_ks_stream_i2c_read_single": (
+            lambda: ki.iqs9320_ks_stream_i2c_read_single(interval, 0, registers, sizes),
+            single,
+            (registers, sizes, 1),
+        ),
+        "iqs9320_ks_stream_i2c_read_multi": (
+            lambda: ki.iqs9320_ks_stream_i2c_read_multi(interval, registers, sizes),
+            multi,
+            (registers, sizes, num_devices),
+        ),
+    }
+
+
+def sustained_rate(ki, pico, frame_size, decoder, duration, chunk_samples):
+    # Samples per second read (and decoded) over duration. With the simulator
+    # the samples are produced as fast as they are read, which gives the
+    # host-side maximum, a board is limited by its report interval.
+    num_samples = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < duration:
+        if pico is not None:
+            pico.stream(chunk_samples)
+        data = ki.read(chunk_samples * frame_size)
+        if decoder is not None:
+            decoder.decode(data)
+        num_samples += len(data) // frame_size
+    elapsed = time.perf_counter() - start
+    return num_samples / elapsed, num_samples * frame_size / elapsed
+
+
+def bench_stream(args):
+    # [{family, mode, devices, registers, frame_size, samples_per_s, bytes_per_s}]
+    results = []
+    for family in args.family or sorted(FAMILIES):
+        for num_devices in args.devices:
+            ki, pico = connect(family, num_devices, args)
+            try:
+                for num_registers in args.registers:
+                    modes = stream_modes(ki, family, num_devices, num_registers)
+                    for mode, (start, frame_size, layout) in modes.items():
+                        decoder = None
+                        if StreamDecoder is not None and layout is not None:
+                            decoder = StreamDecoder(*layout)
+                        start()
+                        try:
+                            rate, throughput = sustained_rate(
+                                ki, pico, frame_size, decoder, args.duration, args.chunk
+                            )
+                        finally:
+                            ki.stop_streaming()
+                        results.append(
+                            {
+                                "family": family,
+                                "mode": mode,
+                                "devices": num_devices,
+                                "registers": num_registers,
+                                "frame_size": frame_size,
+                                "decoded": decoder is not None,
+                                "samples_per_s": rate,
+                                "bytes_per_s": throughput,
+                            }
+                        )
+            finally:
+                ki.close()
+    return results
+
+
+def add_arguments(parser):
+    add_transport_arguments(parser)
+    parser.add_argument(
+        "--duration", type=float, default=0.2, help="Seconds per stream mode"
+    )
+    parser.add_argument("--chunk", type=int, default=64, help="Samples per read")
+    parser.add_argument(
+        "--devices", type=int, nargs="+", default=[1, 4], help="Device counts"
+    )
+    parser.add_argument(
+        "--registers",
+        type=int,
+        nargs="+",
+        default=[1, 8],
+        help="Streamed 2 byte registers",
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sustained stream sample rate")
+    add_arguments(parser)
+    parser.add_argument("--json", action="store_true", help="Print JSON results")
+    args = parser.parse_args()
+    results = bench_stream(args)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for r in results:
+        print(
+            "{mode:>34} {devices:>2} dev {registers:>2} reg : "
+            "{samples_per_s:>12,.0f} samples/s {bytes_per_s:>14,.0f} bytes/s".format(
+                **r
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
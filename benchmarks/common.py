@@ -0,0 +1,86 @@
+import statistics
+import time
+
+from azo_ki import KeyboardInterface, SimulatedPico
+
+devices = KeyboardInterface.device_select_e
+
+# Benchmark names per device family
+FAMILIES = {
+    "iqs7220a": devices.device_iqs7220a,
+    "iqs7320a": devices.device_iqs7320a,
+    "iqs9320_i2c": devices.device_iqs9320_i2c,
+    "iqs9320_ks": devices.device_iqs9320_ks,
+}
+
+DEVICE_ADDRESS = {
+    "iqs7220a": 0x56,
+    "iqs7320a": 0x56,
+    "iqs9320_i2c": 0x30,
+    "iqs9320_ks": 0x30,
+}
+
+
+def add_transport_arguments(parser):
+    parser.add_argument(
+        "--port", help="Serial port of a board, the simulator is used if not given"
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Simulated seconds per frame"
+    )
+    parser.add_argument(
+        "--baudrate", type=int, default=None, help="Simulated link baud rate"
+    )
+    parser.add_argument(
+        "--family",
+        action="append",
+        choices=sorted(FAMILIES),
+        help="Device family to run, repeat for several (default: all)",
+    )
+
+
+def device_addresses(family, num_devices):
+    # IQS9320 I2C devices are addressed individually, 0x30, 0x32, ...
+    return [DEVICE_ADDRESS[family] + 2 * i for i in range(num_devices)]
+
+
+def connect(family, num_devices, args):
+    # (KeyboardInterface, SimulatedPico or None) for num_devices in one row
+    pico = None
+    kwargs = {"device_address": DEVICE_ADDRESS[family]}
+    if args.port:
+        kwargs["port"] = args.port
+    else:
+        pico = SimulatedPico(latency=args.latency, baudrate=args.baudrate)
+        kwargs["transport"] = pico
+    num_columns = 1 if family == "iqs9320_i2c" else num_devices
+    ki = KeyboardInterface(FAMILIES[family], num_columns, 1, **kwargs)
+    return ki, pico
+
+
+def percentiles(samples):
+    # Latency summary in microseconds
+    samples = sorted(samples)
+
+    def pick(p):
+        return samples[min(len(samples) - 1, int(p / 100 * len(samples)))] * 1e6
+
+    return {
+        "count": len(samples),
+        "mean_us": statistics.fmean(samples) * 1e6,
+        "p50_us": pick(50),
+        "p90_us": pick(90),
+        "p99_us": pick(99),
+        "max_us": samples[-1] * 1e6,
+    }
+
+
+def time_calls(function, number, warmup=10):
+    for _ in range(warmup):
+        function()
+    samples = []
+    for _ in range(number):
+        start = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - start)
+    return percentiles(samples)
@@ -0,0 +1,124 @@
+import argparse
+import json
+import platform
+import sys
+from importlib import metadata
+
+import bench_commands
+import bench_connect
+import bench_stream
+from bench_crc import bench_crc
+
+from azo_ki import crc
+
+
+def environment(args):
+    try:
+        version = metadata.version("azo_ki")
+    except metadata.PackageNotFoundError:
+        version = None
+    return {
+        "azo_ki": version,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "crc_backend": crc.backend_name,
+        "transport": args.port or "simulator",
+        "latency": args.latency,
+        "baudrate": args.baudrate,
+    }
+
+
+def run(args):
+    return {
+        "environment": environment(args),
+        "crc": {name: {"bytes_per_s": rate} for name, rate in bench_crc().items()},
+        "commands": bench_commands.bench_commands(args),
+        "streams": bench_stream.bench_stream(args),
+        "startup": bench_connect.bench_connect(args),
+    }
+
+
+def metrics(results):
+    # {key: (value, higher is better)} for comparing two runs
+    out = {}
+    for name, r in results["crc"].items():
+        out["crc/" + name] = (r["bytes_per_s"], True)
+    for r in results["commands"]:
+        key = "commands/{command}/{devices}/{bytes}".format(**r)
+        out[key] = (r["p50_us"], False)
+    for r in results["streams"]:
+        key = "streams/{mode}/{devices}/{registers}".format(**r)
+        out[key] = (r["samples_per_s"], True)
+    for r in results.get("startup", ()):
+        key = "startup/{family}/{mode}".format(**r)
+        out[key] = (r["p50_us"], False)
+    return out
+
+
+def compare(results, baseline, threshold):
+    # Metrics that are worse than the baseline by more than threshold
+    regressions = []
+    current = metrics(results)
+    for key, (before, higher) in metrics(baseline).items():
+        if key not in current or not before:
+            continue
+        after = current[key][0]
+        change = (after - before) / before
+        if (change < -threshold) if higher else (change > threshold):
+            regressions.append((key, before, after, change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run all benchmarks and write the results as JSON"
+    )
+    bench_commands.add_arguments(parser)
+    parser.add_argument(
+        "--duration", type=float, default=0.2, help="Seconds per stream mode"
+    )
+    parser.add_argument("--chunk", type=int, default=64, help="Samples per read")
+    parser.add_argument(
+        "--registers",
+        type=int,
+        nargs="+",
+        default=[1, 8],
+        help="Streamed 2 byte registers",
+    )
+    parser.add_argument(
+        "--connects", type=int, default=50, help="Interfaces created per mode"
+    )
+    parser.add_argument("--output", help="JSON file, stdout if not given")
+    parser.add_argument("--compare", help="Baseline JSON file to check against")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="Relative change reported as a regression",
+    )
+    args = parser.parse_args()
+
+    results = run(args)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for key, before, after, change in regressions:
+            print(
+                "Regression {} : {:.6g} -> {:.6g} ({:+.0%})".format(
+                    key, before, after, change
+                ),
+                file=sys.stderr,
+            )
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
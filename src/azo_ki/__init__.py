@@ -1,3 +1,50 @@
+from azo_ki.acquisition import Acquisition, RingReader
+from azo_ki.aio import AsyncKeyboardInterface
 from azo_ki.azo_ki import KeyboardInterface
+from azo_ki.capture import StreamCapture, StreamRecorder
+from azo_ki.errors import (
+    AckMismatchError,
+    AckTimeoutError,
+    AcquisitionError,
+    DeviceNotFoundError,
+    GenericReturnError,
+    KeyboardInterfaceError,
+    ResponseLengthError,
+)
+from azo_ki.keyscan import KeyEvent, KeyScanDecoder
+from azo_ki.link import LinkConfig, LinkOversubscribedWarning
+from azo_ki.pool import KeyboardInterfacePool
+from azo_ki.regmap import RegisterMap
+from azo_ki.retry import RetryPolicy
+from azo_ki.scheduler import PollScheduler
+from azo_ki.simulator import SimulatedPico
+from azo_ki.stream import KeyScanStreamDecoder, StreamDecoder, StreamReader
+from azo_ki.transport import RecordingTransport, ReplayTransport
 
 KeyboardInterface = KeyboardInterface
+AsyncKeyboardInterface = AsyncKeyboardInterface
+KeyboardInterfacePool = KeyboardInterfacePool
+StreamDecoder = StreamDecoder
+KeyScanStreamDecoder = KeyScanStreamDecoder
+StreamReader = StreamReader
+StreamRecorder = StreamRecorder
+StreamCapture = StreamCapture
+Acquisition = Acquisition
+RingReader = RingReader
+KeyScanDecoder = KeyScanDecoder
+KeyEvent = KeyEvent
+SimulatedPico = SimulatedPico
+RecordingTransport = RecordingTransport
+ReplayTransport = ReplayTransport
+RetryPolicy = RetryPolicy
+RegisterMap = RegisterMap
+PollScheduler = PollScheduler
+LinkConfig = LinkConfig
+LinkOversubscribedWarning = LinkOversubscribedWarning
+KeyboardInterfaceError = KeyboardInterfaceError
+DeviceNotFoundError = DeviceNotFoundError
+AckTimeoutError = AckTimeoutError
+AckMismatchError = AckMismatchError
+GenericReturnError = GenericReturnError
+ResponseLengthError = ResponseLengthError
+AcquisitionError = AcquisitionError
@@ -0,0 +1,414 @@
+# Multiprocess acquisition
+#
+# One process owns the KeyboardInterface and does nothing but drain the
+# stream, decode it and publish the samples into a shared memory ring.
+# Consumer processes map the same ring and read the samples in place, so
+# analysis runs outside the acquisition process' GIL and never holds up the
+# serial port: the writer does not wait for readers, a reader that falls
+# more than the ring capacity behind loses the oldest samples and is told
+# how many.
+#
+# Ring layout: four little-endian uint64 (reserved sequence, committed
+# sequence, capacity, data offset), a closed flag, the stream description in
+# the capture file header format, then capacity records of the capture
+# record layout (receive time and one decoded sample). Sequence numbers count
+# samples since the stream started. The writer bumps the reserved sequence,
+# copies the records and then bumps the committed sequence, so a reader can
+# tell whether records it was handed were overwritten while it used them.
+
+import io
+import multiprocessing
+import queue
+import sys
+import time
+from multiprocessing import shared_memory
+
+from azo_ki.capture import encode_header, header_stream, read_header, record_fields
+from azo_ki.errors import AcquisitionError
+from azo_ki.stream import require_numpy
+
+RESERVED = 0
+COMMITTED = 1
+CAPACITY = 2
+DATA_OFFSET = 3
+CLOSED = 4
+CONTROL_SIZE = 64
+DATA_ALIGN = 64
+
+
+def _shared_memory(name=None, size=0):
+    if name is None:
+        return shared_memory.SharedMemory(create=True, size=size)
+    if sys.version_info >= (3, 13):
+        # Only the creating process unlinks the ring
+        return shared_memory.SharedMemory(name, track=False)
+    return shared_memory.SharedMemory(name)
+
+
+def _buffer(shm):
+    buf = shm.buf
+    if buf is None:
+        raise AcquisitionError("Shared memory block {} is closed".format(shm.name))
+    return buf
+
+
+class SharedRing:
+    # Single writer, many reader ring of stream records in shared memory.
+    # SharedRing.create() makes one for a stream, SharedRing(name) maps an
+    # existing one.
+
+    def __init__(self, name, shm=None):
+        np = require_numpy()
+        self.shm = shm if shm is not None else _shared_memory(name)
+        self.name = self.shm.name
+        buf = _buffer(self.shm)
+        self.control = np.ndarray(5, "<u8", buf)
+        self.capacity = int(self.control[CAPACITY])
+        data_offset = int(self.control[DATA_OFFSET])
+        self.header, _ = read_header(io.BytesIO(buf[CONTROL_SIZE:data_offset]))
+        self.stream = header_stream(self.header)
+        self.fields = record_fields(self.stream)
+        self.dtype = np.dtype(self.fields)
+        # Decoded sample layout, without the receive time
+        self.sample_dtype = np.dtype(self.fields[1:])
+        self.records = np.ndarray(self.capacity, self.dtype, buf, data_offset)
+
+    @classmethod
+    def create(cls, stream, capacity=65536):
+        np = require_numpy()
+        header = encode_header(stream, time.time())
+        data_offset = -(-(CONTROL_SIZE + len(header)) // DATA_ALIGN) * DATA_ALIGN
+        record_size = np.dtype(record_fields(stream)).itemsize
+        shm = _shared_memory(size=data_offset + capacity * record_size)
+        buf = _buffer(shm)
+        control = np.ndarray(5, "<u8", buf)
+        control[:] = [0, 0, capacity, data_offset, 0]
+        del control
+        buf[CONTROL_SIZE : CONTROL_SIZE + len(header)] = header
+        return cls(shm.name, shm)
+
+    @property
+    def committed(self):
+        return int(self.control[COMMITTED])
+
+    @property
+    def closed(self):
+        return bool(self.control[CLOSED])
+
+    def mark_closed(self):
+        # No more samples will be published
+        self.control[CLOSED] = 1
+
+    def decode(self, data, receive_time):
+        # Records of the complete samples in data
+        np = require_numpy()
+        samples = np.frombuffer(
+            data, self.sample_dtype, len(data) // self.sample_dtype.itemsize
+        )
+        records = np.empty(len(samples), self.dtype)
+        records["time"] = receive_time
+        for name, *_ in self.fields[1:]:
+            records[name] = samples[name]
+        return records
+
+    def publish(self, records):
+        # Writer side, never blocks: the oldest records are overwritten
+        count = len(records)
+        capacity = self.capacity
+        sequence = int(self.control[COMMITTED])
+        if count > capacity:
+            records = records[-capacity:]
+            sequence += count - capacity
+            count = capacity
+        self.control[RESERVED] = sequence + count
+        start = sequence % capacity
+        first = min(count, capacity - start)
+        self.records[start : start + first] = records[:first]
+        self.records[: count - first] = records[first:]
+        self.control[COMMITTED] = sequence + count
+
+    def close(self):
+        # Views into the block must go before it can be closed
+        del self.records, self.control
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
+
+
+class RingReader:
+    # One consumer's cursor into a SharedRing. read() returns records in
+    # place (no copy), valid until the writer laps them: overwritten() after
+    # using them counts any that were. start is "latest" (only new samples)
+    # or "oldest" (everything still in the ring).
+
+    def __init__(self, ring, start="latest"):
+        if isinstance(ring, str):
+            ring = SharedRing(ring)
+        self.ring = ring
+        committed = ring.committed
+        if start == "latest":
+            self.cursor = committed
+        elif start == "oldest":
+            self.cursor = max(0, committed - ring.capacity)
+        else:
+            raise ValueError("start must be 'latest' or 'oldest'")
+        self.received = 0
+        self.dropped = 0
+        self.view_start = self.cursor
+        self.view_count = 0
+
+    @property
+    def lag(self):
+        # Samples published but not read yet
+        return self.ring.committed - self.cursor
+
+    def read(self, max_samples=None):
+        ring = self.ring
+        capacity = ring.capacity
+        committed = ring.committed
+        if committed - self.cursor > capacity:
+            # Lapped by the writer, skip to the oldest record still there
+            self.dropped += committed - capacity - self.cursor
+            self.cursor = committed - capacity
+        count = min(committed - self.cursor, capacity - self.cursor % capacity)
+        if max_samples is not None:
+            count = min(count, max_samples)
+        start = self.cursor % capacity
+        self.view_start = self.cursor
+        self.view_count = count
+        self.cursor += count
+        self.received += count
+        return ring.records[start : start + count]
+
+    def overwritten(self):
+        # Records of the last read() overwritten since, counted as dropped
+        # rather than received
+        reserved = int(self.ring.control[RESERVED])
+        lost = reserved - self.ring.capacity - self.view_start
+        lost = max(0, min(lost, self.view_count))
+        self.dropped += lost
+        self.received -= lost
+        self.view_count -= lost
+        self.view_start += lost
+        return lost
+
+    def close(self):
+        self.ring.close()
+
+
+# ------------------------------------
+# Processes
+# ------------------------------------
+
+
+def _acquire(make_ki, stream_method, stream_args, conn, stop, chunk_samples):
+    ki = ring = None
+    try:
+        ki = make_ki()
+        getattr(ki, stream_method)(*stream_args)
+        conn.send(("stream", ki.stream_config))
+        ring = SharedRing(conn.recv())
+        sample_size = ring.sample_dtype.itemsize
+        pending = bytearray()
+        while not stop.is_set():
+            available = len(pending) + ki.serial_conn.in_waiting
+            count = max(1, min(available // sample_size, chunk_samples))
+            pending += ki.read(count * sample_size - len(pending))
+            complete = len(pending) // sample_size * sample_size
+            if complete:
+                ring.publish(ring.decode(pending[:complete], time.monotonic()))
+                del pending[:complete]
+        conn.send(("done", ring.committed))
+    except Exception as e:
+        conn.send(("error", "{}: {}".format(type(e).__name__, e)))
+        raise
+    finally:
+        if ring is not None:
+            ring.mark_closed()
+            ring.close()
+        if ki is not None:
+            try:
+                ki.stop_streaming()
+            finally:
+                ki.close()
+
+
+def _consume(name, handler, args, start, results, index, poll_interval):
+    # Runs until the ring is closed and drained
+    reader = RingReader(name, start)
+    records = None
+    try:
+        while True:
+            records = reader.read()
+            if len(records):
+                handler(records, *args)
+                reader.overwritten()
+                continue
+            if reader.ring.closed and not reader.lag:
+                break
+            time.sleep(poll_interval)
+        results.put((index, None, reader.received, reader.dropped))
+    except Exception as e:
+        error = "{}: {}".format(type(e).__name__, e)
+        results.put((index, error, reader.received, reader.dropped))
+        raise
+    finally:
+        del records
+        reader.close()
+
+
+class Acquisition:
+    # e.g.
+    #   def make_ki():
+    #       return KeyboardInterface(device_iqs9320_i2c, device_address=0x30)
+    #
+    #   with Acquisition(make_ki, "iqs9320_stream_i2c_read_multi",
+    #                    [5, [0x30, 0x32], [0x1000], [4]]) as acquisition:
+    #       acquisition.add_consumer(baseline_filter)
+    #       time.sleep(60)
+    #   print(acquisition.stats)
+    #
+    # make_ki runs in the acquisition process and stream_method(*stream_args)
+    # starts the stream there. Consumers are called as handler(records, *args)
+    # in their own process with the records in place in the ring. With the
+    # spawn and forkserver start methods make_ki and the handlers must be
+    # importable module level functions.
+
+    def __init__(
+        self,
+        make_ki,
+        stream_method,
+        stream_args=(),
+        capacity=65536,
+        chunk_samples=64,
+        context=None,
+        timeout=10.0,
+    ):
+        self.make_ki = make_ki
+        self.stream_method = stream_method
+        self.stream_args = list(stream_args)
+        self.capacity = capacity
+        self.chunk_samples = chunk_samples
+        self.context = multiprocessing.get_context(context)
+        self.timeout = timeout
+        self.ring = None
+        self.stream = None
+        self.process = None
+        self.conn = None
+        self.consumers = []
+        self.stats = None
+        self.__stop = self.context.Event()
+        self.__results = self.context.Queue()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def start(self):
+        conn, child_conn = self.context.Pipe()
+        self.process = self.context.Process(
+            target=_acquire,
+            args=(
+                self.make_ki,
+                self.stream_method,
+                self.stream_args,
+                child_conn,
+                self.__stop,
+                self.chunk_samples,
+            ),
+            daemon=True,
+        )
+        self.process.start()
+        self.conn = conn
+        kind, value = self.__receive()
+        if kind != "stream":
+            self.process.join()
+            self.process = None
+            raise AcquisitionError("Acquisition failed to start : {}".format(value))
+        self.stream = value
+        self.ring = SharedRing.create(value, self.capacity)
+        conn.send(self.ring.name)
+        return self
+
+    def __receive(self):
+        conn, process = self.conn, self.process
+        if conn is None or process is None:
+            raise AcquisitionError("Acquisition is not running")
+        if not conn.poll(self.timeout):
+            process.kill()
+            raise AcquisitionError("No response from the acquisition process")
+        return conn.recv()
+
+    def add_consumer(self, handler, *args, start="latest", poll_interval=0.001):
+        if self.ring is None:
+            raise AcquisitionError("Acquisition is not running")
+        process = self.context.Process(
+            target=_consume,
+            args=(
+                self.ring.name,
+                handler,
+                args,
+                start,
+                self.__results,
+                len(self.consumers),
+                poll_interval,
+            ),
+            daemon=True,
+        )
+        process.start()
+        self.consumers.append(process)
+        return process
+
+    def reader(self, start="latest"):
+        # Read the ring from this process
+        return RingReader(self.ring, start)
+
+    def stop(self):
+        # Stop acquisition, wait for consumers to drain the ring and return
+        # {"samples", "consumers": [{"received", "dropped", "error"}]}
+        process, ring = self.process, self.ring
+        if process is None or ring is None:
+            return self.stats
+        self.__stop.set()
+        consumers = []
+        try:
+            kind, value = self.__receive()
+            process.join(self.timeout)
+        finally:
+            # Also when the acquisition process died without closing it
+            ring.mark_closed()
+            try:
+                consumers = self.__collect()
+            finally:
+                self.stats = {"samples": ring.committed, "consumers": consumers}
+                self.process = None
+                ring.close()
+                ring.unlink()
+        if kind == "error":
+            raise AcquisitionError("Acquisition failed : {}".format(value))
+        return self.stats
+
+    def __collect(self):
+        # Consumer results in add_consumer order, a consumer that exited
+        # without reporting one is recorded as an error
+        results = {}
+        deadline = time.monotonic() + self.timeout
+        for _ in self.consumers:
+            try:
+                result = self.__results.get(timeout=max(0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            index, error, received, dropped = result
+            results[index] = {"received": received, "dropped": dropped, "error": error}
+        consumers = []
+        for index, consumer in enumerate(self.consumers):
+            consumer.join(self.timeout)
+            error = "Consumer exited without a result (exit code {})".format(
+                consumer.exitcode
+            )
+            missing = {"received": 0, "dropped": 0, "error": error}
+            consumers.append(results.get(index, missing))
+        return consumers
@@ -0,0 +1,143 @@
+import asyncio
+
+from azo_ki.azo_ki import KeyboardInterfaceBase, find_ports
+from azo_ki.errors import DeviceNotFoundError
+from azo_ki.framing import ACK_LENGTH, GENERIC_RETURN_LENGTH
+
+
+class AsyncKeyboardInterface(KeyboardInterfaceBase):
+    # All command methods of KeyboardInterface are available and return
+    # awaitables, e.g. data = await ki.iqs9320_i2c_read_single(0x2000, 2)
+
+    def __init__(
+        self,
+        reader: asyncio.StreamReader,
+        writer,
+        device,
+        num_columns=1,
+        num_rows=1,
+        device_address=None,
+        return_type="list",
+        timeout=0.5,
+    ):
+        super().__init__(device, num_columns, num_rows, device_address, return_type)
+        self.reader = reader
+        self.writer = writer
+        self.timeout = timeout
+        self.discarded = 0
+        self.__lock = asyncio.Lock()
+
+    @classmethod
+    async def connect(
+        cls,
+        device,
+        num_columns=1,
+        num_rows=1,
+        device_address=None,
+        port=None,
+        baudrate=115200,
+        **kwargs,
+    ):
+        try:
+            import serial_asyncio  # pyright: ignore[reportMissingImports]
+        except ImportError:
+            raise ImportError(
+                "pyserial-asyncio is required for AsyncKeyboardInterface.connect: "
+                "pip install pyserial-asyncio"
+            ) from None
+        if port is None:
+            ports = find_ports()
+            if not ports:
+                raise DeviceNotFoundError("Unable to connect to Raspberry Pi Pico W")
+            port = ports[0].device
+        reader, writer = await serial_asyncio.open_serial_connection(
+            url=port, baudrate=baudrate
+        )
+        ki = cls(
+            reader, writer, device, num_columns, num_rows, device_address, **kwargs
+        )
+        await ki.setup(device, num_columns, num_rows)
+        return ki
+
+    async def close(self):
+        try:
+            await self.stop_serial_comms()
+        finally:
+            self.writer.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def send_command(self, command_bytes, payload=b""):
+        # The frame buffer is reused, the transport gets its own copy
+        frame = bytes(self.encode_command(command_bytes, payload))
+        self.writer.write(frame)
+        await self.writer.drain()
+        try:
+            read_values = await asyncio.wait_for(self.__read_ack(), self.timeout)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError):
+            read_values = b""
+        self.verify_ack(read_values, command_bytes)
+
+    async def __read_ack(self):
+        data = await self.reader.readuntil(bytes([self.packet_byte_a]))
+        self.discarded += len(data) - 1
+        return await self.reader.readexactly(ACK_LENGTH - 1)
+
+    async def read(self, size, timeout=None):
+        if timeout is None:
+            timeout = self.timeout
+        try:
+            return await asyncio.wait_for(self.reader.readexactly(size), timeout)
+        except asyncio.IncompleteReadError as e:
+            return e.partial
+
+    async def generic_return(self):
+        self.verify_generic_return(await self.read(GENERIC_RETURN_LENGTH))
+
+    async def iter_samples(self, decoder=None, frame_size=None):
+        # Async iterator over stream samples, decoded if a StreamDecoder is given
+        if decoder is not None:
+            frame_size = decoder.frame_size
+        if frame_size is None:
+            raise ValueError("Either a decoder or frame_size is required")
+        while True:
+            data = await self.reader.readexactly(frame_size)
+            if decoder is not None:
+                yield decoder.decode(data)[0]
+            else:
+                yield data
+
+    def _join_chunks(self, values, join):
+        # The chunks are coroutines, run one at a time in order
+        async def joined():
+            results = []
+            try:
+                for value in values:
+                    results.append(await value)
+            finally:
+                # Chunks after a failed one are never sent
+                for value in values[len(results) + 1 :]:
+                    value.close()
+            return join(results)
+
+        return joined()
+
+    async def _command(self, command_bytes, payload=b""):
+        async with self.__lock:
+            await self.send_command(command_bytes, payload)
+
+    async def _write(self, command_bytes, payload=b""):
+        async with self.__lock:
+            await self.send_command(command_bytes, payload)
+            await self.generic_return()
+
+    async def _read(self, command_bytes, num_bytes, return_type=None):
+        return_type = self._check_return_type(return_type)
+        async with self.__lock:
+            await self.send_command(command_bytes)
+            read_values = await self.read(num_bytes)
+        return self._convert_values(read_values, return_type)
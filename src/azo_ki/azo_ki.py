@@ -1,10 +1,178 @@
+import abc
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, replace
 from enum import IntEnum
+from typing import Any
 
 import serial
 import serial.tools.list_ports as list_ports
 
+from azo_ki.crc import crc16
+from azo_ki.errors import (
+    AckMismatchError,
+    AckTimeoutError,
+    DeviceNotFoundError,
+    GenericReturnError,
+    KeyboardInterfaceError,
+    ResponseLengthError,
+)
+from azo_ki.framing import (
+    GENERIC_RETURN,
+    GENERIC_RETURN_LENGTH,
+    MAX_COMMAND_LENGTH,
+    PACKET_BYTE_A,
+    PACKET_BYTE_B,
+    ByteData,
+    FrameEncoder,
+    FrameReader,
+    byte_view,
+    pack_registers,
+)
+from azo_ki.link import LinkConfig, apply_link, set_buffer_size
+from azo_ki.stream import StreamConfig
+
+PICO_VID = [0x2E8A, 0x239A]
+PICO_PID = [0xF00A, 0x000A, 0xCAFE]
+
+
+@dataclass(frozen=True)
+class I2CFamily:
+    name: str
+    read_single: int
+    write_single: int
+    read_multi: int
+    write_multi: int
+    # Register address width in bytes, sent little-endian
+    address_width: int
+    # Single device commands take a device select byte (matrix position)
+    device_select: bool
+    # Multi device commands take an explicit device address list instead of
+    # addressing every device in the matrix
+    address_list: bool
+    # Data bytes per register address, used when merging contiguous accesses
+    bytes_per_address: int = 2
+
+    def register_bytes(self, register_addr):
+        if self.address_width == 2:
+            return [register_addr & 0xFF, (register_addr & 0xFF00) >> 8]
+        return [register_addr]
+
+
+# Single byte read length
+MAX_READ_LENGTH = 0xFF
+
+
+def max_read_length(family):
+    return MAX_READ_LENGTH - MAX_READ_LENGTH % family.bytes_per_address
+
+
+def max_write_length(family, num_addresses=None):
+    # Longest register aligned write in one frame, num_addresses is the
+    # length of the address list of a multi write to an address list family
+    header = 1 + int(family.device_select) + 1 + family.address_width + 1
+    if num_addresses is not None and family.address_list:
+        header = 1 + 1 + num_addresses + family.address_width + 1
+    length = min(MAX_COMMAND_LENGTH - header, 0xFF)
+    return length - length % family.bytes_per_address
+
+
+class ChunkedFuture(Future):
+    # Result of a transfer split into several pipelined or batched frames.
+    # Completes with join(results) once every part has, waiting on it waits
+    # on the parts (which drives a pipeline).
+
+    def __init__(self, parts, join):
+        super().__init__()
+        self.parts = parts
+        self.join = join
+        for part in parts:
+            part.add_done_callback(self.__part_done)
+
+    def __part_done(self, part):
+        if self.done():
+            return
+        if part.exception() is not None:
+            self.set_exception(part.exception())
+        elif all(p.done() for p in self.parts):
+            try:
+                self.set_result(self.join([p.result() for p in self.parts]))
+            except (ImportError, TypeError, ValueError) as e:
+                # A result the return type conversion failed on
+                self.set_exception(e)
+
+    def result(self, timeout=None):
+        for part in self.parts:
+            if self.done():
+                break
+            part.exception(timeout)
+        return super().result(timeout)
+
+    def exception(self, timeout=None):
+        for part in self.parts:
+            if self.done():
+                break
+            part.exception(timeout)
+        return super().exception(timeout)
+
+
+def join_chunks(values, join):
+    # join(values) now, or a ChunkedFuture if the chunks are still in flight
+    if any(isinstance(value, Future) for value in values):
+        return ChunkedFuture(
+            [value if isinstance(value, Future) else _done(value) for value in values],
+            join,
+        )
+    return join(values)
+
+
+def _done(value):
+    future = Future()
+    future.set_result(value)
+    return future
+
+
+# Discovered ports are reused for this many seconds, so that creating many
+# short-lived interfaces does not enumerate every USB device each time
+PORT_CACHE_TTL = 2.0
+_port_cache = {"time": 0.0, "ports": None}
+
+# Connections left open by KeyboardInterface(reuse_port=True).close(),
+# {port: (serial_conn, setup arguments)}
+_open_connections = {}
+
+
+def find_ports(verbose=True, serial_number=None, max_age=PORT_CACHE_TTL):
+    # All serial ports with a Raspberry Pi Pico VID/PID, or only the one with
+    # the given USB serial number. max_age=0 forces a fresh enumeration.
+    ports = _port_cache["ports"]
+    if ports is None or time.monotonic() - _port_cache["time"] > max_age:
+        ports = []
+        for port in list_ports.comports():
+            if verbose:
+                print(port, ", pid = ", port.pid, ", vid = ", port.vid)
+            if port.vid in PICO_VID and port.pid in PICO_PID:
+                ports.append(port)
+        # Nothing found is not cached, a board may be plugged in any moment
+        _port_cache["ports"] = ports or None
+        _port_cache["time"] = time.monotonic()
+    if serial_number is not None:
+        ports = [x for x in ports if x.serial_number == serial_number]
+    return list(ports)
+
 
-class KeyboardInterface:
+def clear_port_cache():
+    _port_cache["ports"] = None
+
+
+def close_open_connections():
+    # Close the connections kept open for reuse
+    while _open_connections:
+        serial_conn, _ = _open_connections.popitem()[1]
+        serial_conn.close()
+
+
+class KeyboardInterfaceBase(abc.ABC):
     class commands(IntEnum):
         # fmt: off
         # General Commands
@@ -61,252 +229,357 @@ class KeyboardInterface:
         device_iqs9320_ks = 3
 
     # ------------------------------------
-    # Constructor, Destructor, other helper functions
+    # Constructor, other helper functions
     # ------------------------------------
 
-    def __init__(self, device, num_columns=1, num_rows=1, device_address=None):
-        self.__pid = [0xF00A, 0x000A, 0xCAFE]
-        self.__vid = [0x2E8A, 0x239A]
-        self.packet_byte_a = 0xCC
-        self.packet_byte_b = 0xEF
+    return_types = ("list", "bytes", "memoryview", "numpy")
+
+    def __init__(
+        self,
+        device,
+        num_columns=1,
+        num_rows=1,
+        device_address=None,
+        return_type="list",
+    ):
+        self.packet_byte_a = PACKET_BYTE_A
+        self.packet_byte_b = PACKET_BYTE_B
         self.command_id = 0
         self.device = device
         self.num_columns = num_columns
         self.num_rows = num_rows
         self.device_address = device_address
+        self.return_type = self._check_return_type(return_type)
 
         self.num_devices = self.num_columns * self.num_rows
+        self.frame_encoder = FrameEncoder(self.packet_byte_a, self.packet_byte_b)
+        self.register_cache = None
+        self.metrics = None
+        self.retry_policy = None
+        # Report protocol errors on stdout, as well as raising them
+        self.print_errors = True
+
+    def _check_return_type(self, return_type):
+        if return_type is None:
+            return self.return_type
+        if return_type not in self.return_types:
+            raise ValueError(
+                "Unknown return type : {} (expected one of {})".format(
+                    return_type, ", ".join(self.return_types)
+                )
+            )
+        return return_type
 
-        if self.__find_devices():
-            print("Connected to Raspberry Pi Pico W")
-        else:
-            raise Exception("Unable to connect to Raspberry Pi Pico W")
-
-        self.setup(device, num_columns, num_rows)
-
-    def __del__(self):
-        try:
-            self.stop_serial_comms()
-            self.serial_conn.close()
-        except:  # noqa
-            pass
+    def _convert_values(self, read_values, return_type):
+        if return_type == "list":
+            return list(read_values)
+        if return_type == "bytes":
+            return read_values
+        if return_type == "memoryview":
+            return memoryview(read_values)
+        import numpy as np
 
-    def __find_devices(self):
-        for port in list_ports.comports():
-            print(port, ", pid = ", port.pid, ", vid = ", port.vid)
-            if port.vid in self.__vid and port.pid in self.__pid:
-                self.serial_conn = serial.Serial(
-                    port.device, baudrate=115200, timeout=0.5
-                )
-                print("Serial port open")
-                return True
-        return False
+        return np.frombuffer(read_values, dtype=np.uint8)
 
     def get_crc(self, data_array):
-        crc = 0xFFFF
-        j = 0
-
-        for byte in data_array:
-            crc = crc ^ ((byte) << 8)
-            crc = crc & 0xFFFF
-
-            j = 0
-            while j < 8:
-                if crc & 0x8000:
-                    crc = crc << 1 ^ 0x1021
-                    crc = crc & 0xFFFF
-                else:
-                    crc = crc << 1
-                    crc = crc & 0xFFFF
-                j += 1
-
-        return crc
-
-    def send_command(self, command_bytes):
+        return crc16(data_array)
+
+    def encode_command(self, command_bytes, payload=b""):
         # Get 8-bit command ID
         self.command_id += 1
         if self.command_id > 0xFF:
             self.command_id = 0
 
-        # Compile packet
-        total_packet = [
-            self.packet_byte_a,
-            self.packet_byte_b,
-            len(command_bytes) + 1,
-            self.command_id,
-        ]
-        for byte in command_bytes:
-            total_packet.append(byte)
-
-        # Now calculate the CRC for the packet excluding Start of Frame and Packet Length
-        crc_value = self.get_crc(total_packet[3:])
-        total_packet.append(crc_value & 0xFF)
-        total_packet.append((crc_value & 0xFF00) >> 8)
-        total_packet.append(self.packet_byte_a)
-        total_packet.append(self.packet_byte_b)
+        # Compile packet into the reusable frame buffer
+        return self.frame_encoder.encode(self.command_id, command_bytes, payload)
 
-        # Write packet
-        self.serial_conn.read_all()
-        self.serial_conn.write(bytes(total_packet))
-
-        # Await packet response
-        await_A = True
-        bytes_read = 0
-        while await_A:
-            read_value = int(self.serial_conn.read()[0])
-            bytes_read += 1
-            if read_value == self.packet_byte_a:
-                await_A = False
-            if bytes_read > 100:
-                raise Exception("Failed to receive response packet from device")
-        read_values = self.serial_conn.read(5)
-        read_values = [int(x) for x in read_values]
-
-        # Verify packet
+    def verify_ack(self, read_values, command_bytes):
+        failures = []
+        errors = []
         if len(read_values) == 5:
-            packet_fail = False
             if not (read_values[0] == self.packet_byte_b):
-                print("\033[91m Byte B 1 error \033[0m")
-                packet_fail = True
+                errors.append("Byte B 1 error")
+                failures.append("byte_b")
             if not (read_values[1] == self.command_id):
-                print("\033[91m ID error \033[0m")
-                print("\033[91m Expected : {} \033[0m".format(self.command_id))
-                print("\033[91m Received : {} \033[0m".format(read_values[1]))
-                packet_fail = True
+                errors.append("ID error")
+                errors.append("Expected : {}".format(self.command_id))
+                errors.append("Received : {}".format(read_values[1]))
+                failures.append("command_id")
             if not (read_values[2] == command_bytes[0]):
-                print("\033[91m command error \033[0m")
-                packet_fail = True
+                errors.append("command error")
+                failures.append("command")
             if not (read_values[3] == self.packet_byte_a):
-                print("\033[91m Byte A 2 error \033[0m")
-                packet_fail = True
+                errors.append("Byte A 2 error")
+                failures.append("trailer")
             if not (read_values[4] == self.packet_byte_b):
-                print("\033[91m Byte B 2 error \033[0m")
-                packet_fail = True
+                errors.append("Byte B 2 error")
+                if "trailer" not in failures:
+                    failures.append("trailer")
         else:
-            print("\033[91m Serial timeout \033[0m")
-            packet_fail = True
-        if packet_fail:
-            raise Exception(
-                "Packet transmission failed : {} : {}".format(
-                    self.command_id, command_bytes[0]
-                )
+            errors.append("Serial timeout")
+            failures.append("timeout")
+        if failures:
+            if self.print_errors:
+                for error in errors:
+                    print("\033[91m {} \033[0m".format(error))
+            if self.metrics is not None:
+                self.metrics.count_failures(failures)
+            message = "Packet transmission failed : {} : {}".format(
+                self.command_id, command_bytes[0]
             )
+            if failures == ["timeout"]:
+                raise AckTimeoutError(message)
+            raise AckMismatchError(message, failures, bytes(read_values))
+
+    def verify_generic_return(self, read_values):
+        if read_values != GENERIC_RETURN:
+            if self.metrics is not None:
+                self.metrics.count_failures(["generic_return"])
+            if self.print_errors:
+                print("\033[91m Invalid response from RP Pi Pico \033[0m")
+            raise GenericReturnError("Invalid response from RP Pi Pico")
 
-    def generic_return(self):
-        read_values = self.serial_conn.read(4)
-        read_values = [int(x) for x in read_values]
-        if len(read_values) == 4:
-            valid_read = True
-            for i in range(4):
-                if read_values[i] != 0xFF:
-                    valid_read = False
-                    break
+    # ------------------------------------
+    # Transactions, implemented by the transport specific subclass
+    # ------------------------------------
+
+    @abc.abstractmethod
+    def _command(self, command_bytes, payload=b"") -> Any:
+        # Command without a response after the acknowledge
+        ...
+
+    @abc.abstractmethod
+    def _write(self, command_bytes, payload=b"") -> Any:
+        # Command followed by the generic return
+        ...
+
+    @abc.abstractmethod
+    def _read(self, command_bytes, num_bytes, return_type=None) -> Any:
+        # Command followed by num_bytes of data
+        ...
+
+    def _stream(self, command_bytes, payload, stream: StreamConfig):
+        # Stream start, a write describing the samples that will follow
+        return self._write(command_bytes, payload)
+
+    def _ks_stream(self, command_bytes, bytes_per_device):
+        return StreamConfig(
+            command_bytes[0],
+            command_bytes[1],
+            [bytes_per_device],
+            list(range(self.num_devices)),
+        )
+
+    # ------------------------------------
+    # I2C register access, shared by the device family methods
+    # ------------------------------------
+
+    def _single_device(self, family, device_select, device_addr):
+        # (device_select, device_addr), device_select is None for families
+        # addressed by device address only
+        return (device_select if family.device_select else None, device_addr)
+
+    def _multi_devices(self, family, device_addr):
+        if family.address_list:
+            return [(None, addr) for addr in device_addr]
+        return [(i, device_addr) for i in range(self.num_devices)]
+
+    def _invalidate_cache(self, family=None, device_select=None):
+        if self.register_cache is not None:
+            self.register_cache.invalidate(family, device_select)
+
+    # Transfers longer than the single byte length fields (or one frame)
+    # allow are split into register aligned chunks. The chunks go out
+    # back-to-back on a pipeline or batch and are joined into one buffer,
+    # device-major like a single *_read_multi response.
+
+    def _join_chunks(self, values, join) -> Any:
+        # The joined transfer, or a future of it while chunks are in flight.
+        # Transports whose transactions return awaitables override this.
+        return join_chunks(values, join)
+
+    def __chunked_read(
+        self, read, family, register_addr, num_bytes, num_devices, return_type
+    ):
+        limit = max_read_length(family)
+        if num_bytes <= limit:
+            return read(register_addr, num_bytes, return_type)
+        return_type = self._check_return_type(return_type)
+        per_address = family.bytes_per_address
+        chunks = [
+            (offset, min(limit, num_bytes - offset))
+            for offset in range(0, num_bytes, limit)
+        ]
+        values = [
+            read(register_addr + offset // per_address, length, "bytes")
+            for offset, length in chunks
+        ]
+
+        def join(values):
+            data = b"".join(
+                value[device * length : (device + 1) * length]
+                for device in range(num_devices)
+                for (_, length), value in zip(chunks, values)
+            )
+            return self._convert_values(data, return_type)
+
+        return self._join_chunks(values, join)
+
+    def __chunked_write(self, write, family, register_addr, payload, limit):
+        if len(payload) <= limit:
+            return write(register_addr, payload)
+        per_address = family.bytes_per_address
+        values = [
+            write(
+                register_addr + offset // per_address, payload[offset : offset + limit]
+            )
+            for offset in range(0, len(payload), limit)
+        ]
+        return self._join_chunks(values, lambda values: None)
+
+    def _i2c_read_single(
+        self, family, device_select, device_addr, register_addr, num_bytes, return_type
+    ):
+        def read(register_addr, num_bytes, return_type):
+            command = [family.read_single]
+            if family.device_select:
+                command.append(device_select)
+            command += [device_addr, *family.register_bytes(register_addr), num_bytes]
+            return self._read(command, num_bytes, return_type)
+
+        return self.__chunked_read(
+            read, family, register_addr, num_bytes, 1, return_type
+        )
+
+    def _i2c_write_single(
+        self, family, device_select, device_addr, register_addr, bytes_array
+    ):
+        def write(register_addr, payload):
+            command = [family.write_single]
+            if family.device_select:
+                command.append(device_select)
+            command += [
+                device_addr,
+                *family.register_bytes(register_addr),
+                len(payload),
+            ]
+            return self._write(command, payload)
+
+        return self.__chunked_write(
+            write,
+            family,
+            register_addr,
+            byte_view(bytes_array),
+            max_write_length(family),
+        )
+
+    def _i2c_read_multi(
+        self, family, device_addr, register_addr, num_bytes, return_type
+    ):
+        if family.address_list:
+            prefix = [family.read_multi, len(device_addr), *device_addr]
+            num_devices = len(device_addr)
         else:
-            valid_read = False
-        if not valid_read:
-            print("\033[91m Invalid response from RP Pi Pico \033[0m")
-            raise Exception("Invalid response from RP Pi Pico")
+            prefix = [family.read_multi, device_addr]
+            num_devices = self.num_devices
+
+        def read(register_addr, num_bytes, return_type):
+            command = prefix + [*family.register_bytes(register_addr), num_bytes]
+            return self._read(command, num_bytes * num_devices, return_type)
+
+        return self.__chunked_read(
+            read, family, register_addr, num_bytes, num_devices, return_type
+        )
+
+    def _i2c_write_multi(self, family, device_addr, register_addr, bytes_array):
+        if family.address_list:
+            prefix = [family.write_multi, len(device_addr), *device_addr]
+            limit = max_write_length(family, len(device_addr))
+        else:
+            prefix = [family.write_multi, device_addr]
+            limit = max_write_length(family)
+
+        def write(register_addr, payload):
+            command = prefix + [*family.register_bytes(register_addr), len(payload)]
+            return self._write(command, payload)
+
+        return self.__chunked_write(
+            write, family, register_addr, byte_view(bytes_array), limit
+        )
 
     # ------------------------------------
     # Generic Functions
     # ------------------------------------
 
     def setup(self, device: device_select_e, num_columns: int = 0, num_rows: int = 0):
-        self.send_command([self.commands.cmd_setup, device, num_columns, num_rows])
+        self._invalidate_cache()
+        return self._command([self.commands.cmd_setup, device, num_columns, num_rows])
 
     def stop_streaming(self):
-        self.send_command([self.commands.cmd_stop_streaming])
+        return self._command([self.commands.cmd_stop_streaming])
 
     def stop_serial_comms(self):
-        self.send_command([self.commands.cmd_stop_serial_comms])
+        return self._command([self.commands.cmd_stop_serial_comms])
 
     # ------------------------------------
     # IQS7220A
     # ------------------------------------
 
-    def iqs7220a_ks(self):
-        self.send_command([self.commands.cmd_iqs7220a_ks])
-        read_values = self.serial_conn.read(self.num_devices)
-        read_values = [int(x) for x in read_values]
-        return read_values
+    def iqs7220a_ks(self, return_type=None):
+        return self._read(
+            [self.commands.cmd_iqs7220a_ks], self.num_devices, return_type
+        )
 
     def iqs7220a_i2c_read_single(
-        self, device_select, register_addr, num_bytes, device_addr=None
+        self,
+        device_select,
+        register_addr,
+        num_bytes,
+        device_addr=None,
+        return_type=None,
     ):
         if device_addr is None:
             device_addr = self.device_address
             if device_addr is None:
                 raise Exception("No device address selected")
-        self.send_command(
-            [
-                self.commands.cmd_iqs7220a_i2c_read_single,
-                device_select,
-                device_addr,
-                register_addr,
-                num_bytes,
-            ]
+        return self._i2c_read_single(
+            IQS7220A, device_select, device_addr, register_addr, num_bytes, return_type
         )
-        read_values = self.serial_conn.read(num_bytes)
-        read_values = [int(x) for x in read_values]
-        return read_values
 
     def iqs7220a_i2c_write_single(
-        self, device_select, register_addr, bytes_array: list, device_addr=None
+        self, device_select, register_addr, bytes_array: ByteData, device_addr=None
     ):
         if device_addr is None:
             device_addr = self.device_address
             if device_addr is None:
                 raise Exception("No device address selected")
-        command = [
-            self.commands.cmd_iqs7220a_i2c_write_single,
-            device_select,
-            device_addr,
-            register_addr,
-            len(bytes_array),
-        ]
-        for byte in bytes_array:
-            command.append(byte)
-        self.send_command(command)
-        self.generic_return()
+        return self._i2c_write_single(
+            IQS7220A, device_select, device_addr, register_addr, bytes_array
+        )
 
-    def iqs7220a_i2c_read_multi(self, register_addr, num_bytes, device_addr=None):
+    def iqs7220a_i2c_read_multi(
+        self, register_addr, num_bytes, device_addr=None, return_type=None
+    ):
         if device_addr is None:
             device_addr = self.device_address
             if device_addr is None:
                 raise Exception("No device address selected")
-        self.send_command(
-            [
-                self.commands.cmd_iqs7220a_i2c_read_multi,
-                device_addr,
-                register_addr,
-                num_bytes,
-            ]
+        return self._i2c_read_multi(
+            IQS7220A, device_addr, register_addr, num_bytes, return_type
         )
-        read_values = self.serial_conn.read(num_bytes * self.num_devices)
-        read_values = [int(x) for x in read_values]
-        return read_values
 
     def iqs7220a_i2c_write_multi(
-        self, register_addr, bytes_array: list, device_addr=None
+        self, register_addr, bytes_array: ByteData, device_addr=None
     ):
         if device_addr is None:
             device_addr = self.device_address
             if device_addr is None:
                 raise Exception("No device address selected")
-        command = [
-            self.commands.cmd_iqs7220a_i2c_write_multi,
-            device_addr,
-            register_addr,
-            len(bytes_array),
-        ]
-        for byte in bytes_array:
-            command.append(byte)
-        self.send_command(command)
-        self.generic_return()
+        return self._i2c_write_multi(IQS7220A, device_addr, register_addr, bytes_array)
 
     def iqs7220a_stream_ks(self, report_interval_ms):
-        self.send_command([self.commands.cmd_iqs7220a_stream_ks, report_interval_ms])
-        self.generic_return()
+        command = [self.commands.cmd_iqs7220a_stream_ks, report_interval_ms]
+        return self._stream(command, b"", self._ks_stream(command, 1))
 
     def iqs7220a_stream_i2c_read_single(
         self,
@@ -329,12 +602,10 @@ class KeyboardInterface:
             device_addr,
             len(register_addr),
         ]
-        for x in register_addr:
-            command.append(x)
-        for x in num_bytes:
-            command.append(x)
-        self.send_command(command)
-        self.generic_return()
+        stream = StreamConfig(
+            command[0], report_interval_ms, num_bytes, [device_select], register_addr
+        )
+        return self._stream(command, bytes(register_addr) + bytes(num_bytes), stream)
 
     def iqs7220a_stream_i2c_read_multi(
         self, report_interval_ms, register_addr: list, num_bytes: list, device_addr=None
@@ -351,117 +622,90 @@ class KeyboardInterface:
             device_addr,
             len(register_addr),
         ]
-        for x in register_addr:
-            command.append(x)
-        for x in num_bytes:
-            command.append(x)
-        self.send_command(command)
-        self.generic_return()
+        stream = StreamConfig(
+            command[0],
+            report_interval_ms,
+            num_bytes,
+            list(range(self.num_devices)),
+            register_addr,
+        )
+        return self._stream(command, bytes(register_addr) + bytes(num_bytes), stream)
 
     # ------------------------------------
     # IQS7320A
     # ------------------------------------
 
-    def iqs7320a_ks(self):
-        self.send_command([self.commands.cmd_iqs7320a_ks])
-        read_values = self.serial_conn.read(self.num_devices)
-        read_values = [int(x) for x in read_values]
-        return read_values
+    def iqs7320a_ks(self, return_type=None):
+        return self._read(
+            [self.commands.cmd_iqs7320a_ks], self.num_devices, return_type
+        )
 
     def iqs7320a_i2c_read_single(
-        self, device_select, register_addr, num_bytes, device_addr=None
+        self,
+        device_select,
+        register_addr,
+        num_bytes,
+        device_addr=None,
+        return_type=None,
     ):
         if device_addr is None:
             device_addr = self.device_address
             if device_addr is None:
                 raise Exception("No device address selected")
-        self.send_command(
-            [
-                self.commands.cmd_iqs7320a_i2c_read_single,
-                device_select,
-                device_addr,
-                register_addr,
-                num_bytes,
-            ]
+        return self._i2c_read_single(
+            IQS7320A, device_select, device_addr, register_addr, num_bytes, return_type
         )
-        read_values = self.serial_conn.read(num_bytes)
-        read_values = [int(x) for x in read_values]
-        return read_values
 
     def iqs7320a_i2c_write_single(
-        self, device_select, register_addr, bytes_array: list, device_addr=None
+        self, device_select, register_addr, bytes_array: ByteData, device_addr=None
     ):
         if device_addr is None:
             device_addr = self.device_address
             if device_addr is None:
                 raise Exception("No device address selected")
-        command = [
-            self.commands.cmd_iqs7320a_i2c_write_single,
-            device_select,
-            device_addr,
-            register_addr,
-            len(bytes_array),
-        ]
-        for byte in bytes_array:
-            command.append(byte)
-        self.send_command(command)
-        self.generic_return()
+        return self._i2c_write_single(
+            IQS7320A, device_select, device_addr, register_addr, bytes_array
+        )
 
-    def iqs7320a_i2c_read_multi(self, register_addr, num_bytes, device_addr=None):
+    def iqs7320a_i2c_read_multi(
+        self, register_addr, num_bytes, device_addr=None, return_type=None
+    ):
         if device_addr is None:
             device_addr = self.device_address
             if device_addr is None:
                 raise Exception("No device address selected")
-        self.send_command(
-            [
-                self.commands.cmd_iqs7320a_i2c_read_multi,
-                device_addr,
-                register_addr,
-                num_bytes,
-            ]
+        return self._i2c_read_multi(
+            IQS7320A, device_addr, register_addr, num_bytes, return_type
         )
 
-        read_values = self.serial_conn.read(num_bytes * self.num_devices)
-        read_values = [int(x) for x in read_values]
-        return read_values
-
     def iqs7320a_i2c_write_multi(
-        self, register_addr, bytes_array: list, device_addr=None
+        self, register_addr, bytes_array: ByteData, device_addr=None
     ):
         if device_addr is None:
             device_addr = self.device_address
             if device_addr is None:
                 raise Exception("No device address selected")
-        command = [
-            self.commands.cmd_iqs7320a_i2c_write_multi,
-            device_addr,
-            register_addr,
-            len(bytes_array),
-        ]
-        for byte in bytes_array:
-            command.append(byte)
-        self.send_command(command)
-        self.generic_return()
+        return self._i2c_write_multi(IQS7320A, device_addr, register_addr, bytes_array)
 
     def iqs7320a_autonomous(self, selection_bool: bool):
         if selection_bool is True:
             selection = 2
         elif selection_bool is False:
             selection = 1
-        self.send_command([self.commands.cmd_iqs7320a_autonomous_mode, selection])
-        self.generic_return()
+        self._invalidate_cache(IQS7320A)
+        return self._write([self.commands.cmd_iqs7320a_autonomous_mode, selection])
 
     def iqs7320a_standby(self, selection_bool: bool):
         if selection_bool is True:
             selection = 2
         elif selection_bool is False:
             selection = 1
-        self.send_command([self.commands.cmd_iqs7320a_standby_mode, selection])
-        self.generic_return()
+        self._invalidate_cache(IQS7320A)
+        return self._write([self.commands.cmd_iqs7320a_standby_mode, selection])
 
     def iqs7320a_stream_ks(self, report_interval_ms):
-        self.send_command([self.commands.cmd_iqs7320a_stream_ks, report_interval_ms])
-        self.generic_return()
+        command = [self.commands.cmd_iqs7320a_stream_ks, report_interval_ms]
+        return self._stream(command, b"", self._ks_stream(command, 1))
 
     def iqs7320a_stream_i2c_read_single(
         self,
@@ -484,12 +728,10 @@ class KeyboardInterface:
             device_addr,
             len(register_addr),
         ]
-        for x in register_addr:
-            command.append(x)
-        for x in num_bytes:
-            command.append(x)
-        self.send_command(command)
-        self.generic_return()
+        stream = StreamConfig(
+            command[0], report_interval_ms, num_bytes, [device_select], register_addr
+        )
+        return self._stream(command, bytes(register_addr) + bytes(num_bytes), stream)
 
     def iqs7320a_stream_i2c_read_multi(
         self, report_interval_ms, register_addr: list, num_bytes: list, device_addr=None
@@ -506,85 +748,54 @@ class KeyboardInterface:
             device_addr,
             len(register_addr),
         ]
-        for x in register_addr:
-            command.append(x)
-        for x in num_bytes:
-            command.append(x)
-        self.send_command(command)
-        self.generic_return()
+        stream = StreamConfig(
+            command[0],
+            report_interval_ms,
+            num_bytes,
+            list(range(self.num_devices)),
+            register_addr,
+        )
+        return self._stream(command, bytes(register_addr) + bytes(num_bytes), stream)
 
     # ------------------------------------
     # IQS9320 I2C
     # ------------------------------------
 
-    def iqs9320_i2c_read_single(self, register_addr, num_bytes, device_addr=None):
+    def iqs9320_i2c_read_single(
+        self, register_addr, num_bytes, device_addr=None, return_type=None
+    ):
         if device_addr is None:
             device_addr = self.device_address
             if device_addr is None:
                 raise Exception("No device address selected")
-        self.send_command(
-            [
-                self.commands.cmd_iqs9320_i2c_read_single,
-                device_addr,
-                register_addr & 0xFF,
-                (register_addr & 0xFF00) >> 8,
-                num_bytes,
-            ]
+        return self._i2c_read_single(
+            IQS9320_I2C, None, device_addr, register_addr, num_bytes, return_type
         )
-        read_values = self.serial_conn.read(num_bytes)
-        read_values = [int(x) for x in read_values]
-        return read_values
 
     def iqs9320_i2c_write_single(
-        self, register_addr, bytes_array: list, device_addr=None
+        self, register_addr, bytes_array: ByteData, device_addr=None
     ):
         if device_addr is None:
             device_addr = self.device_address
             if device_addr is None:
                 raise Exception("No device address selected")
-        command = [
-            self.commands.cmd_iqs9320_i2c_write_single,
-            device_addr,
-            register_addr & 0xFF,
-            ((register_addr & 0xFF00) >> 8),
-            len(bytes_array),
-        ]
-        for byte in bytes_array:
-            command.append(byte)
-        self.send_command(command)
-        self.generic_return()
+        return self._i2c_write_single(
+            IQS9320_I2C, None, device_addr, register_addr, bytes_array
+        )
 
-    def iqs9320_i2c_read_multi(self, device_addresses: list, register_addr, num_bytes):
-        command = [
-            self.commands.cmd_iqs9320_i2c_read_multi,
-            len(device_addresses),
-        ]
-        for addr in device_addresses:
-            command.append(addr)
-        command.append(register_addr & 0xFF)
-        command.append((register_addr & 0xFF00) >> 8)
-        command.append(num_bytes)
-        self.send_command(command)
-        read_values = self.serial_conn.read(num_bytes * len(device_addresses))
-        read_values = [int(x) for x in read_values]
-        return read_values
+    def iqs9320_i2c_read_multi(
+        self, device_addresses: list, register_addr, num_bytes, return_type=None
+    ):
+        return self._i2c_read_multi(
+            IQS9320_I2C, device_addresses, register_addr, num_bytes, return_type
+        )
 
     def iqs9320_i2c_write_multi(
-        self, device_addresses: list, register_addr, bytes_array: list
+        self, device_addresses: list, register_addr, bytes_array: ByteData
     ):
-        command = [
-            self.commands.cmd_iqs9320_i2c_write_multi,
-            len(device_addresses),
-        ]
-        for addr in device_addresses:
-            command.append(addr)
-        command.append(register_addr & 0xFF)
-        command.append((register_addr & 0xFF00) >> 8)
-        command.append(len(bytes_array))
-        for byte in bytes_array:
-            command.append(byte)
-        self.send_command(command)
-        self.generic_return()
+        return self._i2c_write_multi(
+            IQS9320_I2C, device_addresses, register_addr, bytes_array
+        )
 
     def iqs9320_stream_i2c_read_single(
         self, report_interval_ms, register_addr: list, num_bytes: list, device_addr=None
@@ -601,13 +812,12 @@ class KeyboardInterface:
             device_addr,
             len(register_addr),
         ]
-        for x in register_addr:
-            command.append(x & 0xFF)
-            command.append((x & 0xFF00) >> 8)
-        for x in num_bytes:
-            command.append(x)
-        self.send_command(command)
-        self.generic_return()
+        stream = StreamConfig(
+            command[0], report_interval_ms, num_bytes, [device_addr], register_addr
+        )
+        return self._stream(
+            command, pack_registers(register_addr) + bytes(num_bytes), stream
+        )
 
     def iqs9320_stream_i2c_read_multi(
         self,
@@ -622,123 +832,96 @@ class KeyboardInterface:
             self.commands.cmd_iqs9320_stream_i2c_read_multi,
             report_interval_ms,
             len(device_addr),
+            *device_addr,
+            len(register_addr),
         ]
-        for x in device_addr:
-            command.append(x)
-        command.append(len(register_addr))
-        for x in register_addr:
-            command.append(x & 0xFF)
-            command.append((x & 0xFF00) >> 8)
-        for x in num_bytes:
-            command.append(x)
-        self.send_command(command)
-        self.generic_return()
+        stream = StreamConfig(
+            command[0], report_interval_ms, num_bytes, device_addr, register_addr
+        )
+        return self._stream(
+            command, pack_registers(register_addr) + bytes(num_bytes), stream
+        )
 
     # ------------------------------------
     # IQS9320 Key Scan
     # ------------------------------------
 
-    def iqs9320_ks(self, num_channels):
-        self.send_command([self.commands.cmd_iqs9320_ks, int(num_channels)])
-        read_values = self.serial_conn.read(self.num_devices * 3)
-        read_values = [int(x) for x in read_values]
-        return read_values
+    def iqs9320_ks(self, num_channels, return_type=None):
+        return self._read(
+            [self.commands.cmd_iqs9320_ks, int(num_channels)],
+            self.num_devices * 3,
+            return_type,
+        )
 
     def iqs9320_ks_i2c_read_single(
-        self, device_select, register_addr, num_bytes, device_addr=None
+        self,
+        device_select,
+        register_addr,
+        num_bytes,
+        device_addr=None,
+        return_type=None,
     ):
         if device_addr is None:
             device_addr = self.device_address
             if device_addr is None:
                 raise Exception("No device address selected")
-        self.send_command(
-            [
-                self.commands.cmd_iqs9320_ks_i2c_read_single,
-                device_select,
-                device_addr,
-                register_addr & 0xFF,
-                (register_addr & 0xFF00) >> 8,
-                num_bytes,
-            ]
+        return self._i2c_read_single(
+            IQS9320_KS,
+            device_select,
+            device_addr,
+            register_addr,
+            num_bytes,
+            return_type,
         )
-        read_values = self.serial_conn.read(num_bytes)
-        read_values = [int(x) for x in read_values]
-        return read_values
 
     def iqs9320_ks_i2c_write_single(
-        self, device_select, register_addr, bytes_array: list, device_addr=None
+        self, device_select, register_addr, bytes_array: ByteData, device_addr=None
     ):
         if device_addr is None:
             device_addr = self.device_address
             if device_addr is None:
                 raise Exception("No device address selected")
-        command = [
-            self.commands.cmd_iqs9320_ks_i2c_write_single,
-            device_select,
-            device_addr,
-            register_addr & 0xFF,
-            (register_addr & 0xFF00) >> 8,
-            len(bytes_array),
-        ]
-        for byte in bytes_array:
-            command.append(byte)
-        self.send_command(command)
-        self.generic_return()
+        return self._i2c_write_single(
+            IQS9320_KS, device_select, device_addr, register_addr, bytes_array
+        )
 
-    def iqs9320_ks_i2c_read_multi(self, register_addr, num_bytes, device_addr=None):
+    def iqs9320_ks_i2c_read_multi(
+        self, register_addr, num_bytes, device_addr=None, return_type=None
+    ):
         if device_addr is None:
             device_addr = self.device_address
             if device_addr is None:
                 raise Exception("No device address selected")
-        self.send_command(
-            [
-                self.commands.cmd_iqs9320_ks_i2c_read_multi,
-                device_addr,
-                register_addr & 0xFF,
-                (register_addr & 0xFF00) >> 8,
-                num_bytes,
-            ]
+        return self._i2c_read_multi(
+            IQS9320_KS, device_addr, register_addr, num_bytes, return_type
         )
-        read_values = self.serial_conn.read(num_bytes * self.num_devices)
-        read_values = [int(x) for x in read_values]
-        return read_values
 
     def iqs9320_ks_i2c_write_multi(
-        self, register_addr, bytes_array: list, device_addr=None
+        self, register_addr, bytes_array: ByteData, device_addr=None
     ):
         if device_addr is None:
             device_addr = self.device_address
             if device_addr is None:
                 raise Exception("No device address selected")
-        command = [
-            self.commands.cmd_iqs9320_ks_i2c_write_multi,
-            device_addr,
-            register_addr & 0xFF,
-            (register_addr & 0xFF00) >> 8,
-            len(bytes_array),
-        ]
-        for byte in bytes_array:
-            command.append(byte)
-        self.send_command(command)
-        self.generic_return()
+        return self._i2c_write_multi(
+            IQS9320_KS, device_addr, register_addr, bytes_array
+        )
 
     def iqs9320_ks_standby(self, selection_bool: bool):
         if selection_bool is True:
             selection = 2
         elif selection_bool is False:
             selection = 1
-        self.send_command([self.commands.cmd_iqs9320_ks_standby, selection])
-        self.generic_return()
+        self._invalidate_cache(IQS9320_KS)
+        return self._write([self.commands.cmd_iqs9320_ks_standby, selection])
 
     def iqs9320_ks_stream_ks(self, report_interval_ms, num_channels):
-        self.send_command(
-            [
-                self.commands.cmd_iqs9320_ks_stream_ks,
-                report_interval_ms,
-                num_channels,
-            ]
-        )
-        self.generic_return()
+        command = [
+            self.commands.cmd_iqs9320_ks_stream_ks,
+            report_interval_ms,
+            num_channels,
+        ]
+        return self._stream(command, b"", self._ks_stream(command, 3))
 
     def iqs9320_ks_stream_i2c_read_single(
         self,
@@ -761,13 +944,12 @@ class KeyboardInterface:
             device_addr,
             len(register_addr),
         ]
-        for x in register_addr:
-            command.append(x & 0xFF)
-            command.append((x & 0xFF00) >> 8)
-        for x in num_bytes:
-            command.append(x)
-        self.send_command(command)
-        self.generic_return()
+        stream = StreamConfig(
+            command[0], report_interval_ms, num_bytes, [device_select], register_addr
+        )
+        return self._stream(
+            command, pack_registers(register_addr) + bytes(num_bytes), stream
+        )
 
     def iqs9320_ks_stream_i2c_read_multi(
         self, report_interval_ms, register_addr: list, num_bytes: list, device_addr=None
@@ -784,10 +966,506 @@ class KeyboardInterface:
             device_addr,
             len(register_addr),
         ]
-        for x in register_addr:
-            command.append(x & 0xFF)
-            command.append((x & 0xFF00) >> 8)
-        for x in num_bytes:
-            command.append(x)
-        self.send_command(command)
+        stream = StreamConfig(
+            command[0],
+            report_interval_ms,
+            num_bytes,
+            list(range(self.num_devices)),
+            register_addr,
+        )
+        return self._stream(
+            command, pack_registers(register_addr) + bytes(num_bytes), stream
+        )
+
+
+_commands = KeyboardInterfaceBase.commands
+
+# fmt: off
+IQS7220A = I2CFamily(
+    "iqs7220a",
+    _commands.cmd_iqs7220a_i2c_read_single, _commands.cmd_iqs7220a_i2c_write_single,
+    _commands.cmd_iqs7220a_i2c_read_multi, _commands.cmd_iqs7220a_i2c_write_multi,
+    address_width=1, device_select=True, address_list=False,
+)
+IQS7320A = I2CFamily(
+    "iqs7320a",
+    _commands.cmd_iqs7320a_i2c_read_single, _commands.cmd_iqs7320a_i2c_write_single,
+    _commands.cmd_iqs7320a_i2c_read_multi, _commands.cmd_iqs7320a_i2c_write_multi,
+    address_width=1, device_select=True, address_list=False,
+)
+IQS9320_I2C = I2CFamily(
+    "iqs9320_i2c",
+    _commands.cmd_iqs9320_i2c_read_single, _commands.cmd_iqs9320_i2c_write_single,
+    _commands.cmd_iqs9320_i2c_read_multi, _commands.cmd_iqs9320_i2c_write_multi,
+    address_width=2, device_select=False, address_list=True,
+)
+IQS9320_KS = I2CFamily(
+    "iqs9320_ks",
+    _commands.cmd_iqs9320_ks_i2c_read_single, _commands.cmd_iqs9320_ks_i2c_write_single,
+    _commands.cmd_iqs9320_ks_i2c_read_multi, _commands.cmd_iqs9320_ks_i2c_write_multi,
+    address_width=2, device_select=True, address_list=False,
+)
+# fmt: on
+
+
+class KeyboardInterface(KeyboardInterfaceBase):
+    # ------------------------------------
+    # Constructor, Destructor, other helper functions
+    # ------------------------------------
+
+    def __init__(
+        self,
+        device,
+        num_columns=1,
+        num_rows=1,
+        device_address=None,
+        return_type="list",
+        port=None,
+        transport=None,
+        retry_policy=None,
+        link=None,
+        serial_number=None,
+        reuse_port=False,
+        skip_setup=False,
+    ):
+        super().__init__(device, num_columns, num_rows, device_address, return_type)
+        self.retry_policy = retry_policy
+        self.stream_config = None
+        # With reuse_port, close() leaves the port open and set up for the
+        # next interface on it instead of stopping serial comms
+        self.reuse_port = reuse_port
+        self.setup_args = None
+        self.__closed = False
+
+        if transport is not None:
+            # Simulator, recording or any other object with the pyserial API,
+            # its own settings are kept unless a link config is given
+            self.port = getattr(transport, "port", port)
+            self.serial_conn = transport
+            self.link = link or LinkConfig(timeout=transport.timeout)
+            if link is not None:
+                apply_link(self.serial_conn, link)
+        elif self.__reuse(port, link, serial_number):
+            pass
+        elif self.__find_devices(port, link, serial_number):
+            print("Connected to Raspberry Pi Pico W")
+        else:
+            raise DeviceNotFoundError("Unable to connect to Raspberry Pi Pico W")
+        self.frame_reader = FrameReader(self.serial_conn, self.packet_byte_a)
+        self.frame_stats = self.frame_reader.stats
+
+        # Setup is skipped when the board is known to be set up the same way
+        if skip_setup or self.setup_args == (device, num_columns, num_rows):
+            self.setup_args = (device, num_columns, num_rows)
+        else:
+            self.setup(device, num_columns, num_rows)
+
+    def __del__(self):
+        try:
+            self.close()
+        except:  # noqa
+            pass
+
+    def close(self):
+        if self.__closed:
+            return
+        self.__closed = True
+        if self.reuse_port and getattr(self.serial_conn, "is_open", True):
+            if self.stream_config is not None:
+                self.stop_streaming()
+            _open_connections[self.port] = (self.serial_conn, self.setup_args)
+            return
+        try:
+            self.stop_serial_comms()
+        finally:
+            self.serial_conn.close()
+
+    def __reuse(self, port=None, link=None, serial_number=None):
+        # Take over a connection left open by an earlier interface
+        if not self.reuse_port or not _open_connections:
+            return False
+        if port is None and serial_number is not None:
+            ports = find_ports(verbose=False, serial_number=serial_number)
+            if not ports:
+                return False
+            port = ports[0].device
+        if port is None:
+            port = next(iter(_open_connections))
+        if port not in _open_connections:
+            return False
+        self.serial_conn, self.setup_args = _open_connections.pop(port)
+        self.port = port
+        self.link = link or LinkConfig(timeout=self.serial_conn.timeout)
+        if link is not None:
+            apply_link(self.serial_conn, link)
+        return True
+
+    def __find_devices(self, port=None, link=None, serial_number=None):
+        self.link = link or LinkConfig()
+        if port is None:
+            ports = [x.device for x in find_ports(serial_number=serial_number)]
+        else:
+            ports = [port]
+        for device in ports:
+            self.port = device
+            try:
+                self.serial_conn = serial.Serial(device, **self.link.serial_kwargs())
+            except serial.SerialException:
+                # The cached port may have gone away
+                clear_port_cache()
+                raise
+            set_buffer_size(
+                self.serial_conn, self.link.rx_buffer_size, self.link.tx_buffer_size
+            )
+            print("Serial port open")
+            return True
+        return False
+
+    def configure_link(self, **changes):
+        # Change link settings at runtime, e.g. ki.configure_link(timeout=0.05)
+        self.link = replace(self.link, **changes)
+        self.__tune_link()
+        return self.link
+
+    def __tune_link(self, stacklevel=4):
+        stream = self.stream_config
+        if not self.link.auto_tune or stream is None:
+            apply_link(self.serial_conn, self.link)
+            return
+        self.link.check_bandwidth(stream, stacklevel)
+        apply_link(
+            self.serial_conn,
+            self.link,
+            self.link.stream_timeout(stream),
+            self.link.stream_buffer_size(stream),
+        )
+
+    def __stream_stopped(self):
+        if self.stream_config is not None:
+            self.stream_config = None
+            if self.link.auto_tune:
+                self.__tune_link()
+
+    def send_command(self, command_bytes, payload=b"", response_len=0, record=None):
+        frame = self.encode_command(command_bytes, payload)
+        if record is not None:
+            record.mark("encode")
+            record.bytes_sent = len(frame)
+
+        # Write packet
+        self.frame_stats = self.frame_reader.begin()
+        self.serial_conn.write(frame)
+        if record is not None:
+            record.mark("write")
+
+        # Await packet response, the expected response is read in the same call
+        try:
+            read_values = self.frame_reader.read_ack(response_len)
+        except AckTimeoutError:
+            if self.metrics is not None:
+                self.metrics.count_failures(["timeout"])
+            raise
+        if record is not None:
+            record.mark("ack")
+        self.verify_ack(read_values, command_bytes)
+
+    def generic_return(self):
+        self.verify_generic_return(self.frame_reader.read(GENERIC_RETURN_LENGTH))
+
+    def read(self, size):
+        # Read raw data, e.g. stream samples, through the frame reader buffer
+        return self.frame_reader.read(size)
+
+    def pipeline(self, max_in_flight=8, timeout=None):
+        # Keep up to max_in_flight commands outstanding, see azo_ki.pipeline
+        from azo_ki.pipeline import Pipeline
+
+        return Pipeline(self, max_in_flight, timeout)
+
+    def enable_metrics(self):
+        # Per-command counters, latency histograms and hooks, see azo_ki.metrics
+        from azo_ki.metrics import Metrics
+
+        self.metrics = Metrics()
+        return self.metrics
+
+    def disable_metrics(self):
+        self.metrics = None
+
+    def enable_cache(self, max_entries=4096):
+        # Opt-in register shadow, mark registers with cache.cacheable()
+        from azo_ki.cache import RegisterCache
+
+        self.register_cache = RegisterCache(max_entries)
+        return self.register_cache
+
+    def disable_cache(self):
+        self.register_cache = None
+
+    def batch(self, pipeline=None):
+        # Collect register accesses and send them merged on exit, see azo_ki.batch
+        from azo_ki.batch import Batch
+
+        return Batch(self, pipeline)
+
+    def poll_scheduler(self, **kwargs):
+        # Poll register sets at their own periods, see azo_ki.scheduler
+        from azo_ki.scheduler import PollScheduler
+
+        return PollScheduler(self, **kwargs)
+
+    def apply_config(self, config, **kwargs):
+        # Write {device: {register_addr: data}} register images, only where
+        # they differ from the devices, see azo_ki.config
+        from azo_ki.config import apply_config
+
+        return apply_config(self, config, **kwargs)
+
+    def _command(self, command_bytes, payload=b""):
+        if self.metrics is not None or self.retry_policy is not None:
+            return self.__transaction(command_bytes, payload)
+        self.send_command(command_bytes, payload)
+
+    def _write(self, command_bytes, payload=b""):
+        if self.metrics is not None or self.retry_policy is not None:
+            return self.__transaction(command_bytes, payload, GENERIC_RETURN_LENGTH)
+        self.send_command(command_bytes, payload, GENERIC_RETURN_LENGTH)
         self.generic_return()
+
+    def _stream(self, command_bytes, payload, stream):
+        self._write(command_bytes, payload)
+        self.stream_config = stream
+        if self.link.auto_tune:
+            self.__tune_link(stacklevel=5)
+
+    def setup(self, device, num_columns: int = 0, num_rows: int = 0):
+        self.setup_args = None
+        super().setup(device, num_columns, num_rows)
+        self.setup_args = (device, num_columns, num_rows)
+        self.__stream_stopped()
+
+    def stop_streaming(self):
+        super().stop_streaming()
+        self.__stream_stopped()
+
+    def _read(self, command_bytes, num_bytes, return_type=None):
+        return_type = self._check_return_type(return_type)
+        if self.metrics is not None or self.retry_policy is not None:
+            read_values = self.__transaction(command_bytes, b"", num_bytes, read=True)
+            return self._convert_values(read_values, return_type)
+        self.send_command(command_bytes, response_len=num_bytes)
+        return self._convert_values(self.__response(num_bytes), return_type)
+
+    def __response(self, num_bytes):
+        read_values = self.frame_reader.read(num_bytes)
+        if len(read_values) != num_bytes:
+            if self.metrics is not None:
+                self.metrics.count_failures(["response_length"])
+            if self.print_errors:
+                print("\033[91m Serial timeout \033[0m")
+            raise ResponseLengthError(
+                "Serial timeout : {} of {} response bytes".format(
+                    len(read_values), num_bytes
+                )
+            )
+        return read_values
+
+    def __attempt(
+        self, command_bytes, payload=b"", response_len=0, read=False, record=None
+    ):
+        self.send_command(command_bytes, payload, response_len, record)
+        read_values = None
+        if read:
+            read_values = self.__response(response_len)
+        elif response_len:
+            self.generic_return()
+        if record is not None:
+            record.mark("read")
+        return read_values
+
+    def __measured(self, command_bytes, payload=b"", response_len=0, read=False):
+        # Transaction with phase timing, the response arrives with the ack so
+        # the read phase is the copy out of the frame reader buffer
+        metrics = self.metrics
+        if metrics is None:
+            return self.__attempt(command_bytes, payload, response_len, read)
+        record = metrics.begin(command_bytes)
+        try:
+            return self.__attempt(command_bytes, payload, response_len, read, record)
+        except Exception as e:
+            record.error = e
+            raise
+        finally:
+            record.bytes_received = self.frame_stats.bytes_read
+            record.discarded = self.frame_stats.discarded
+            metrics.end(record)
+
+    def __transaction(self, command_bytes, payload=b"", response_len=0, read=False):
+        # Transaction with metrics and/or the retry policy
+        policy = self.retry_policy
+        attempts = 1
+        if policy is not None and policy.retries_command(command_bytes[0]):
+            attempts += policy.retries
+        print_errors = self.print_errors
+        try:
+            for attempt in range(1, attempts + 1):
+                # Only the error that is finally raised is printed
+                self.print_errors = print_errors and attempt == attempts
+                try:
+                    if self.metrics is not None:
+                        return self.__measured(
+                            command_bytes, payload, response_len, read
+                        )
+                    return self.__attempt(command_bytes, payload, response_len, read)
+                except KeyboardInterfaceError:
+                    if attempt == attempts:
+                        raise
+                self.__recover(policy, attempt)
+        finally:
+            self.print_errors = print_errors
+
+    def __recover(self, policy, attempt):
+        # Resync: drop everything buffered or pending, and stop streaming if
+        # more unexpected bytes arrived than a stray response would explain
+        metrics = self.metrics
+        # begin() counts what is still buffered as discarded
+        discarded = self.frame_stats.discarded + self.frame_reader.begin().discarded
+        if metrics is not None:
+            metrics.count_recovery("retries")
+            if discarded:
+                metrics.count_recovery("resyncs")
+        if discarded > policy.stale_stream_bytes:
+            try:
+                self.send_command([self.commands.cmd_stop_streaming])
+                self.__stream_stopped()
+            except KeyboardInterfaceError:
+                pass
+            if metrics is not None:
+                metrics.count_recovery("stream_stops")
+        policy.sleep(attempt)
+        self.frame_stats = self.frame_reader.begin()
+
+    # ------------------------------------
+    # Register cache
+    # ------------------------------------
+
+    def __cached_read(
+        self, family, devices, register_addr, num_bytes, return_type, read
+    ):
+        return_type = self._check_return_type(return_type)
+        cache = self.register_cache
+        if cache is None:
+            return self._convert_values(read("bytes"), return_type)
+        read_values = cache.read(family, devices, register_addr, num_bytes)
+        if read_values is None:
+            read_values = read("bytes")
+            cache.update(family, devices, register_addr, read_values, per_device=True)
+        return self._convert_values(read_values, return_type)
+
+    def __cached_write(self, family, devices, register_addr, bytes_array, write):
+        cache = self.register_cache
+        if cache is None:
+            return write()
+        data = byte_view(bytes_array)
+        if cache.unchanged(family, devices, register_addr, data):
+            return None
+        write()
+        cache.update(family, devices, register_addr, data)
+
+    def _i2c_read_single(
+        self, family, device_select, device_addr, register_addr, num_bytes, return_type
+    ):
+        read = super()._i2c_read_single
+        if self.register_cache is None:
+            return read(
+                family,
+                device_select,
+                device_addr,
+                register_addr,
+                num_bytes,
+                return_type,
+            )
+        return self.__cached_read(
+            family,
+            [self._single_device(family, device_select, device_addr)],
+            register_addr,
+            num_bytes,
+            return_type,
+            lambda rt: read(
+                family, device_select, device_addr, register_addr, num_bytes, rt
+            ),
+        )
+
+    def _i2c_write_single(
+        self, family, device_select, device_addr, register_addr, bytes_array
+    ):
+        write = super()._i2c_write_single
+        if self.register_cache is None:
+            return write(family, device_select, device_addr, register_addr, bytes_array)
+        return self.__cached_write(
+            family,
+            [self._single_device(family, device_select, device_addr)],
+            register_addr,
+            bytes_array,
+            lambda: write(
+                family, device_select, device_addr, register_addr, bytes_array
+            ),
+        )
+
+    def _i2c_read_multi(
+        self, family, device_addr, register_addr, num_bytes, return_type
+    ):
+        read = super()._i2c_read_multi
+        if self.register_cache is None:
+            return read(family, device_addr, register_addr, num_bytes, return_type)
+        return self.__cached_read(
+            family,
+            self._multi_devices(family, device_addr),
+            register_addr,
+            num_bytes,
+            return_type,
+            lambda rt: read(family, device_addr, register_addr, num_bytes, rt),
+        )
+
+    def _i2c_write_multi(self, family, device_addr, register_addr, bytes_array):
+        write = super()._i2c_write_multi
+        if self.register_cache is None:
+            return write(family, device_addr, register_addr, bytes_array)
+        return self.__cached_write(
+            family,
+            self._multi_devices(family, device_addr),
+            register_addr,
+            bytes_array,
+            lambda: write(family, device_addr, register_addr, bytes_array),
+        )
+
+    def __ks_resets(self, family, read_values, bytes_per_device=1):
+        # Bit 0 of each device's first key scan byte flags a device reset,
+        # the layout KeyScanDecoder decodes
+        for device_select in range(len(read_values) // bytes_per_device):
+            if read_values[device_select * bytes_per_device] & 0x1:
+                self._invalidate_cache(family, device_select)
+
+    def iqs7220a_ks(self, return_type=None):
+        if self.register_cache is None:
+            return super().iqs7220a_ks(return_type)
+        return_type = self._check_return_type(return_type)
+        read_values = super().iqs7220a_ks("bytes")
+        self.__ks_resets(IQS7220A, read_values)
+        return self._convert_values(read_values, return_type)
+
+    def iqs7320a_ks(self, return_type=None):
+        if self.register_cache is None:
+            return super().iqs7320a_ks(return_type)
+        return_type = self._check_return_type(return_type)
+        read_values = super().iqs7320a_ks("bytes")
+        self.__ks_resets(IQS7320A, read_values)
+        return self._convert_values(read_values, return_type)
+
+    def iqs9320_ks(self, num_channels, return_type=None):
+        if self.register_cache is None:
+            return super().iqs9320_ks(num_channels, return_type)
+        return_type = self._check_return_type(return_type)
+        read_values = super().iqs9320_ks(num_channels, "bytes")
+        self.__ks_resets(IQS9320_KS, read_values, 3)
+        return self._convert_values(read_values, return_type)
@@ -0,0 +1,306 @@
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any
+
+from azo_ki.azo_ki import KeyboardInterfaceBase, max_read_length, max_write_length
+from azo_ki.framing import byte_view
+
+
+@dataclass
+class Access:
+    kind: str  # "read", "write" or "command"
+    future: Future
+    family: Any = None
+    # (device_select, device_addr) per device, device_select is None for
+    # families addressed by device address only
+    devices: list = field(default_factory=list)
+    register_addr: int = 0
+    data: bytes = b""
+    num_bytes: int = 0
+    return_type: Any = None
+    call: Any = None
+
+
+class Batch(KeyboardInterfaceBase):
+    # Command methods are recorded instead of sent and return a Future. When
+    # the block exits, contiguous register accesses are merged into burst
+    # reads/writes, identical accesses to several devices use the *_multi
+    # commands, and the futures (and results, in call order) are filled in.
+
+    def __init__(self, ki, pipeline=None):
+        super().__init__(
+            ki.device, ki.num_columns, ki.num_rows, ki.device_address, ki.return_type
+        )
+        self.ki = ki
+        self.pipeline = pipeline
+        self.accesses = []
+        self.results = []
+        self.frames_requested = 0
+        self.frames_sent = 0
+
+    @property
+    def frames_saved(self):
+        return self.frames_requested - self.frames_sent
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *args):
+        if exc_type is None:
+            self.execute()
+
+    # ------------------------------------
+    # Recording
+    # ------------------------------------
+
+    def __record(self, kind, **kwargs):
+        access = Access(kind, Future(), **kwargs)
+        self.accesses.append(access)
+        self.frames_requested += 1
+        return access.future
+
+    def _command(self, command_bytes, payload=b""):
+        args = (list(command_bytes), bytes(payload))
+        return self.__record("command", call=lambda ki: ki._command(*args))
+
+    def _write(self, command_bytes, payload=b""):
+        args = (list(command_bytes), bytes(payload))
+        return self.__record("command", call=lambda ki: ki._write(*args))
+
+    def _read(self, command_bytes, num_bytes, return_type=None):
+        args = (list(command_bytes), num_bytes, self._check_return_type(return_type))
+        return self.__record("read_command", call=lambda ki: ki._read(*args))
+
+    def _i2c_read_single(
+        self, family, device_select, device_addr, register_addr, num_bytes, return_type
+    ):
+        return self.__record(
+            "read",
+            family=family,
+            devices=[self._single_device(family, device_select, device_addr)],
+            register_addr=register_addr,
+            num_bytes=num_bytes,
+            return_type=self._check_return_type(return_type),
+        )
+
+    def _i2c_write_single(
+        self, family, device_select, device_addr, register_addr, bytes_array
+    ):
+        return self.__record(
+            "write",
+            family=family,
+            devices=[self._single_device(family, device_select, device_addr)],
+            register_addr=register_addr,
+            data=bytes(byte_view(bytes_array)),
+        )
+
+    def _i2c_read_multi(
+        self, family, device_addr, register_addr, num_bytes, return_type
+    ):
+        return self.__record(
+            "read",
+            family=family,
+            devices=self._multi_devices(family, device_addr),
+            register_addr=register_addr,
+            num_bytes=num_bytes,
+            return_type=self._check_return_type(return_type),
+        )
+
+    def _i2c_write_multi(self, family, device_addr, register_addr, bytes_array):
+        return self.__record(
+            "write",
+            family=family,
+            devices=self._multi_devices(family, device_addr),
+            register_addr=register_addr,
+            data=bytes(byte_view(bytes_array)),
+        )
+
+    # ------------------------------------
+    # Execution
+    # ------------------------------------
+
+    def execute(self):
+        accesses = self.accesses
+        self.accesses = []
+        target = self.ki
+        if self.pipeline:
+            target = self.ki.pipeline(self.pipeline)
+        self.__sent = []
+        try:
+            # Consecutive reads or writes are merged, the order between
+            # segments is kept so reads observe earlier writes.
+            segment = []
+            for access in accesses + [None]:
+                if segment and (access is None or access.kind != segment[0].kind):
+                    self.__execute_segment(target, segment)
+                    segment = []
+                if access is not None:
+                    segment.append(access)
+            if target is not self.ki:
+                target.flush()
+            # Surface errors of pipelined writes
+            for value in self.__sent:
+                value.result()
+            for access in accesses:
+                if access.kind in ("read", "read_command"):
+                    self.results.append(access.future.result())
+        except Exception as e:
+            for access in accesses:
+                if not access.future.done():
+                    access.future.set_exception(e)
+            raise
+        return self.results
+
+    def __execute_segment(self, target, segment):
+        kind = segment[0].kind
+        if kind == "write":
+            self.__execute_writes(target, segment)
+        elif kind == "read":
+            self.__execute_reads(target, segment)
+        else:
+            for access in segment:
+                self.__resolve(access.future, access.call(target))
+                self.frames_sent += 1
+
+    def __resolve(self, future, value, convert=None):
+        if isinstance(value, Future):
+            value.add_done_callback(
+                lambda done: self.__resolve(future, done.result(), convert)
+            )
+        elif convert is not None:
+            future.set_result(convert(value))
+        else:
+            future.set_result(value)
+
+    def __group(self, runs):
+        # {(family, register, data or length): [devices]} -> frames, using the
+        # *_multi commands where the same access goes to several devices
+        for (family, register_addr, key), devices in runs.items():
+            if len(devices) > 1 and family.address_list:
+                yield family, register_addr, key, devices, [d[1] for d in devices]
+                continue
+            if len(devices) == self.num_devices > 1 and not family.address_list:
+                addresses = {d[1] for d in devices}
+                selects = sorted(d[0] for d in devices)
+                if len(addresses) == 1 and selects == list(range(self.num_devices)):
+                    devices = sorted(devices)
+                    yield family, register_addr, key, devices, addresses.pop()
+                    continue
+            for device in devices:
+                yield family, register_addr, key, [device], None
+
+    def __execute_writes(self, target, segment):
+        # Later writes win where accesses overlap
+        images = {}
+        for access in segment:
+            family = access.family
+            offset = access.register_addr * family.bytes_per_address
+            for device in access.devices:
+                image = images.setdefault((family, device), {})
+                for i, byte in enumerate(access.data):
+                    image[offset + i] = byte
+
+        runs = {}
+        for (family, device), image in images.items():
+            for register_addr, data in self.__contiguous(image, family):
+                runs.setdefault((family, register_addr, data), []).append(device)
+
+        for family, register_addr, data, devices, multi in self.__group(runs):
+            if multi is not None:
+                num_addresses = len(multi) if family.address_list else None
+                if len(data) <= max_write_length(family, num_addresses):
+                    write, args = target._i2c_write_multi, (family, multi)
+                    self.__write(target, write, *args, register_addr, data)
+                    continue
+            for select, addr in devices:
+                write, args = target._i2c_write_single, (family, select, addr)
+                self.__write(target, write, *args, register_addr, data)
+
+        for access in segment:
+            access.future.set_result(None)
+
+    def __send(self, target, frames, send, *args):
+        # Accesses served by target's register cache never reach the link
+        cache = target.register_cache
+        skipped = 0 if cache is None else cache.hits + cache.writes_skipped
+        value = send(*args)
+        if cache is None or cache.hits + cache.writes_skipped == skipped:
+            self.frames_sent += frames
+        return value
+
+    def __write(self, target, write, *args):
+        value = self.__send(target, 1, write, *args)
+        if isinstance(value, Future):
+            self.__sent.append(value)
+
+    def __contiguous(self, image, family):
+        # Split the written bytes into contiguous runs of at most one frame
+        limit = max_write_length(family)
+        offsets = sorted(image)
+        start = previous = offsets[0]
+        for offset in offsets[1:] + [None]:
+            if offset is None or offset != previous + 1 or offset - start >= limit:
+                data = bytes(image[i] for i in range(start, previous + 1))
+                yield start // family.bytes_per_address, data
+                if offset is not None:
+                    start = offset
+            if offset is not None:
+                previous = offset
+
+    def __execute_reads(self, target, segment):
+        # Merge overlapping and adjacent ranges per device
+        ranges = {}
+        for access in segment:
+            family = access.family
+            start = access.register_addr * family.bytes_per_address
+            for device in access.devices:
+                ranges.setdefault((family, device), []).append(
+                    (start, start + access.num_bytes)
+                )
+        runs = {}
+        for (family, device), spans in ranges.items():
+            limit = max_read_length(family)
+            merged = []
+            for start, end in sorted(spans):
+                if merged and start <= merged[-1][1] and end - merged[-1][0] <= limit:
+                    merged[-1][1] = max(merged[-1][1], end)
+                else:
+                    merged.append([start, end])
+            for start, end in merged:
+                register_addr = start // family.bytes_per_address
+                runs.setdefault((family, register_addr, end - start), []).append(device)
+
+        # Read the merged runs, data is stored per device and byte offset
+        reads = []
+        for family, register_addr, length, devices, multi in self.__group(runs):
+            # Runs longer than one frame are read in chunks
+            frames = -(-length // max_read_length(family))
+            if multi is not None:
+                read, args = target._i2c_read_multi, (family, multi)
+            else:
+                read, args = target._i2c_read_single, (family, *devices[0])
+            value = self.__send(
+                target, frames, read, *args, register_addr, length, "bytes"
+            )
+            reads.append((family, register_addr, length, devices, value))
+
+        data = {}
+        for family, register_addr, length, devices, value in reads:
+            if isinstance(value, Future):
+                value = value.result()
+            start = register_addr * family.bytes_per_address
+            for i, device in enumerate(devices):
+                chunk = value[i * length : (i + 1) * length]
+                data.setdefault((family, device), []).append((start, chunk))
+
+        for access in segment:
+            family = access.family
+            start = access.register_addr * family.bytes_per_address
+            end = start + access.num_bytes
+            values = b""
+            for device in access.devices:
+                for run_start, chunk in data[(family, device)]:
+                    if run_start <= start and end <= run_start + len(chunk):
+                        values += chunk[start - run_start : end - run_start]
+                        break
+            access.future.set_result(self._convert_values(values, access.return_type))
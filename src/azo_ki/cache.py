@@ -0,0 +1,117 @@
+from collections import OrderedDict
+
+
+class RegisterCache:
+    # Write-through shadow of register contents, keyed by
+    # (family, device_select, device_addr, register_addr). Only registers
+    # marked cacheable are stored, reads of those are served from the cache
+    # and writes that would not change them are skipped.
+
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.cacheable_ranges = {}
+        self.hits = 0
+        self.misses = 0
+        self.writes_skipped = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def cacheable(self, family, register_addr, count=1):
+        # Mark count registers from register_addr as static configuration
+        name = getattr(family, "name", family)
+        self.cacheable_ranges.setdefault(name, []).append(
+            (register_addr, register_addr + count)
+        )
+
+    def is_cacheable(self, family, register_addr):
+        for start, end in self.cacheable_ranges.get(family.name, ()):
+            if start <= register_addr < end:
+                return True
+        return False
+
+    def __registers(self, family, register_addr, num_bytes):
+        # Register addresses covered by an access, None if not all cacheable
+        size = family.bytes_per_address
+        if num_bytes % size:
+            return None
+        registers = range(register_addr, register_addr + num_bytes // size)
+        if not all(self.is_cacheable(family, register) for register in registers):
+            return None
+        return registers
+
+    def __lookup(self, family, devices, register_addr, num_bytes):
+        registers = self.__registers(family, register_addr, num_bytes)
+        if registers is None:
+            return None
+        values = []
+        for device in devices:
+            for register in registers:
+                key = (family.name, *device, register)
+                value = self.entries.get(key)
+                if value is None:
+                    return None
+                self.entries.move_to_end(key)
+                values.append(value)
+        return b"".join(values)
+
+    def read(self, family, devices, register_addr, num_bytes):
+        if self.__registers(family, register_addr, num_bytes) is None:
+            return None
+        values = self.__lookup(family, devices, register_addr, num_bytes)
+        if values is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return values
+
+    def unchanged(self, family, devices, register_addr, data):
+        # True if every register already holds data on every device
+        values = self.__lookup(family, devices, register_addr, len(data))
+        if values is None or values != bytes(data) * len(devices):
+            return False
+        self.writes_skipped += 1
+        return True
+
+    def update(self, family, devices, register_addr, data, per_device=False):
+        # Store written data (the same for every device), or read data
+        # (per_device, one num_bytes chunk per device)
+        size = family.bytes_per_address
+        num_bytes = len(data) // len(devices) if per_device else len(data)
+        for i, device in enumerate(devices):
+            chunk = data[i * num_bytes : (i + 1) * num_bytes] if per_device else data
+            for offset in range(0, num_bytes, size):
+                register = register_addr + offset // size
+                key = (family.name, *device, register)
+                value = bytes(chunk[offset : offset + size])
+                if len(value) != size or not self.is_cacheable(family, register):
+                    self.entries.pop(key, None)
+                    continue
+                self.entries[key] = value
+                self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def discard(self, family, devices, register_addr, num_bytes):
+        # Forget the registers an access covers, for writes sent without
+        # going through the cache
+        size = family.bytes_per_address
+        for device in devices:
+            for offset in range(0, num_bytes, size):
+                key = (family.name, *device, register_addr + offset // size)
+                self.entries.pop(key, None)
+
+    def invalidate(self, family=None, device_select=None):
+        if family is None and device_select is None:
+            self.entries.clear()
+            return
+        name = getattr(family, "name", family)
+        for key in list(self.entries):
+            if (name is None or key[0] == name) and (
+                device_select is None or key[1] == device_select
+            ):
+                del self.entries[key]
+
+    def clear(self):
+        self.entries.clear()
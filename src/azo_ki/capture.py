@@ -0,0 +1,250 @@
+# Stream capture files for long recordings
+#
+# A capture is an append-only file: an 8 byte magic, a little-endian uint32
+# header length and a JSON header describing the stream, padded to 16 bytes,
+# followed by fixed size records. Each record is the host receive time as a
+# float64 (seconds since the capture started) and one raw stream sample.
+# StreamCapture memory-maps the records as a typed NumPy array.
+
+import contextlib
+import json
+import struct
+import time
+
+from azo_ki.azo_ki import KeyboardInterfaceBase
+from azo_ki.stream import (
+    FIELD_TYPES,
+    StreamConfig,
+    StreamDecoder,
+    key_scan_field,
+    require_numpy,
+)
+from azo_ki.timing import StreamTiming
+
+MAGIC = b"AZOKICAP"
+VERSION = 1
+HEADER_ALIGN = 16
+TIME = struct.Struct("<d")
+
+
+def record_fields(stream: StreamConfig):
+    # NumPy dtype fields of a record, the sample fields follow the stream's
+    # StreamDecoder layout, key scan samples are one "ks" field
+    fields: list[tuple] = [("time", "<f8")]
+    if stream.register_addr is None:
+        (size,) = stream.num_bytes
+        fields.append(key_scan_field(size, len(stream.devices)))
+        return fields
+    for addr, size in zip(stream.register_addr, stream.num_bytes):
+        name = StreamDecoder.field_name(addr)
+        if size in FIELD_TYPES:
+            fields.append((name, FIELD_TYPES[size], (len(stream.devices),)))
+        else:
+            fields.append((name, "u1", (len(stream.devices), size)))
+    return fields
+
+
+def stream_device(command):
+    # Device family of a stream command, named like the I2CFamily objects
+    device = command.name[len("cmd_") :].split("_stream")[0]
+    return "iqs9320_i2c" if device == "iqs9320" else device
+
+
+def encode_header(stream: StreamConfig, start_time):
+    command = KeyboardInterfaceBase.commands(stream.command)
+    header = {
+        "version": VERSION,
+        "command": int(command),
+        "command_name": command.name,
+        "device": stream_device(command),
+        "report_interval_ms": stream.report_interval_ms,
+        "register_addr": stream.register_addr,
+        "num_bytes": stream.num_bytes,
+        "devices": stream.devices,
+        "sample_size": stream.sample_size,
+        "record_size": TIME.size + stream.sample_size,
+        "start_time": start_time,
+    }
+    data = json.dumps(header).encode()
+    length = -(-(len(MAGIC) + 4 + len(data)) // HEADER_ALIGN) * HEADER_ALIGN
+    data = data.ljust(length - len(MAGIC) - 4)
+    return MAGIC + struct.pack("<I", len(data)) + data
+
+
+def read_header(f):
+    # (header dict, data offset)
+    magic = f.read(len(MAGIC))
+    if magic != MAGIC:
+        raise ValueError("Not a stream capture file")
+    (length,) = struct.unpack("<I", f.read(4))
+    header = json.loads(f.read(length))
+    if header["version"] != VERSION:
+        raise ValueError("Unsupported capture version : {}".format(header["version"]))
+    return header, len(MAGIC) + 4 + length
+
+
+def header_stream(header):
+    return StreamConfig(
+        header["command"],
+        header["report_interval_ms"],
+        header["num_bytes"],
+        header["devices"],
+        header["register_addr"],
+    )
+
+
+class StreamRecorder:
+    # Appends raw samples of a stream to a capture file, e.g.
+    # StreamRecorder(path, ki.stream_config). append=True continues an
+    # existing capture of the same stream.
+
+    def __init__(self, path, stream: StreamConfig | None, append=False):
+        if stream is None:
+            raise ValueError("No stream to record")
+        self.path = path
+        self.stream = stream
+        self.sample_size = stream.sample_size
+        self.samples = 0
+        self.pending = bytearray()
+        self.timing = None
+        if stream.report_interval_ms:
+            self.timing = StreamTiming(stream.report_interval_ms)
+        # The file stays open until close(), unless setting it up fails
+        with contextlib.ExitStack() as files:
+            if append:
+                self.file = files.enter_context(open(path, "r+b"))
+                self.__resume()
+            else:
+                self.start_time = time.time()
+                self.file = files.enter_context(open(path, "wb"))
+                self.file.write(encode_header(stream, self.start_time))
+            self.__files = files.pop_all()
+        # Receive times are monotonic, relative to the capture start
+        self.start = time.monotonic() - (time.time() - self.start_time)
+
+    def __resume(self):
+        header, offset = read_header(self.file)
+        size = self.file.seek(0, 2)
+        if header_stream(header) != self.stream:
+            raise ValueError("Capture file records a different stream")
+        self.start_time = header["start_time"]
+        self.samples = (size - offset) // header["record_size"]
+        # A record cut short by a crash is overwritten
+        self.file.seek(offset + self.samples * header["record_size"])
+        self.file.truncate()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write(self, data, receive_time=None):
+        # Record raw stream bytes, complete samples are written with the
+        # receive time (time.monotonic() if not given), the rest is kept
+        # for the next call
+        if receive_time is None:
+            receive_time = time.monotonic()
+        self.pending += data
+        sample_size = self.sample_size
+        count = len(self.pending) // sample_size
+        if not count:
+            return 0
+        stamp = TIME.pack(receive_time - self.start)
+        view = memoryview(self.pending)
+        self.file.write(
+            b"".join(
+                stamp + view[i * sample_size : (i + 1) * sample_size]
+                for i in range(count)
+            )
+        )
+        view.release()
+        del self.pending[: count * sample_size]
+        self.samples += count
+        if self.timing is not None:
+            self.timing.update(count, receive_time)
+        return count
+
+    def record(self, ki, num_samples=None, duration=None, chunk_samples=64):
+        # Drain the stream from ki into the file until num_samples are written
+        # or duration seconds have passed (and one of them must be given)
+        if num_samples is None and duration is None:
+            raise ValueError("Either num_samples or duration is required")
+        deadline = None if duration is None else time.monotonic() + duration
+        written = 0
+        while num_samples is None or written < num_samples:
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            want = chunk_samples
+            if num_samples is not None:
+                want = min(want, num_samples - written)
+            data = ki.read(want * self.sample_size - len(self.pending))
+            if not data and deadline is None:
+                break
+            written += self.write(data)
+        return written
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.__files.close()
+
+
+class StreamCapture:
+    # Read-only view of a capture file. samples is a NumPy memmap, nothing is
+    # loaded until it is accessed. refresh() maps samples appended since.
+
+    def __init__(self, path):
+        np = require_numpy()
+        self.path = path
+        with open(path, "rb") as f:
+            self.header, self.offset = read_header(f)
+        self.stream = header_stream(self.header)
+        self.dtype = np.dtype(record_fields(self.stream))
+        if self.dtype.itemsize != self.header["record_size"]:
+            raise ValueError("Capture record size does not match its header")
+        self.samples = self.__map()
+
+    def refresh(self):
+        self.samples = self.__map()
+        return len(self.samples)
+
+    def __map(self):
+        np = require_numpy()
+        with open(self.path, "rb") as f:
+            size = f.seek(0, 2)
+        count = (size - self.offset) // self.dtype.itemsize
+        if count:
+            return np.memmap(
+                self.path, self.dtype, "r", offset=self.offset, shape=(count,)
+            )
+        return np.zeros(0, self.dtype)
+
+    def __len__(self):
+        return len(self.samples)
+
+    def __getitem__(self, index):
+        return self.samples[index]
+
+    @property
+    def times(self):
+        return self.samples["time"]
+
+    @property
+    def start_time(self):
+        # Wall clock time of the capture start, time.time() seconds
+        return self.header["start_time"]
+
+    def index_at(self, t):
+        # Index of the first sample received at or after t seconds
+        np = require_numpy()
+        return int(np.searchsorted(self.times, t, side="left"))
+
+    def between(self, start, end):
+        # Samples received from start up to end seconds
+        return self.samples[self.index_at(start) : self.index_at(end)]
+
+    def field(self, register_addr):
+        # One register's samples shaped [sample, device]
+        return self.samples[StreamDecoder.field_name(register_addr)]
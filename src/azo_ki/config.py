@@ -0,0 +1,315 @@
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from functools import partial
+
+from azo_ki.azo_ki import (
+    IQS7220A,
+    IQS7320A,
+    IQS9320_I2C,
+    IQS9320_KS,
+    KeyboardInterfaceBase,
+    max_read_length,
+    max_write_length,
+)
+from azo_ki.framing import byte_view
+
+_devices = KeyboardInterfaceBase.device_select_e
+
+DEVICE_FAMILIES = {
+    _devices.device_iqs7220a: IQS7220A,
+    _devices.device_iqs7320a: IQS7320A,
+    _devices.device_iqs9320_i2c: IQS9320_I2C,
+    _devices.device_iqs9320_ks: IQS9320_KS,
+}
+
+
+@dataclass
+class ApplyReport:
+    bytes_written: int = 0
+    bytes_skipped: int = 0
+    frames_read: int = 0
+    frames_written: int = 0
+    # (device, register_addr) of registers that did not read back as written
+    mismatches: list = field(default_factory=list)
+    verified: bool = False
+
+    @property
+    def ok(self):
+        return not self.mismatches
+
+
+def normalize_config(config, family):
+    # {device: [(register_addr, bytes)]} from {device: {register_addr: data}}
+    images = {}
+    for device, blocks in config.items():
+        images[device] = []
+        for register_addr, data in sorted(blocks.items()):
+            data = bytes(byte_view(data))
+            if len(data) % family.bytes_per_address:
+                raise ValueError(
+                    "Image at {:#x} is not a whole number of registers".format(
+                        register_addr
+                    )
+                )
+            images[device].append((register_addr, data))
+    return images
+
+
+def changed_ranges(current, target, bytes_per_address, max_gap, max_length):
+    # (start, end) byte ranges of target that differ from current. Ranges
+    # less than max_gap bytes apart are merged, and split at max_length.
+    ranges = []
+    for offset in range(0, len(target), bytes_per_address):
+        end = offset + bytes_per_address
+        if current[offset:end] == target[offset:end]:
+            continue
+        if (
+            ranges
+            and offset - ranges[-1][1] <= max_gap
+            and end - ranges[-1][0] <= max_length
+        ):
+            ranges[-1][1] = end
+            continue
+        ranges.append([offset, end])
+    return [tuple(r) for r in ranges]
+
+
+def block_spans(blocks, bytes_per_address, max_gap, max_length):
+    # [(register_addr, num_bytes)] burst spans covering [(register_addr, data)]
+    # blocks. Blocks less than max_gap bytes apart are merged while the span
+    # fits max_length, overlapping blocks always are.
+    spans = []
+    for register_addr, data in sorted(blocks, key=lambda block: block[0]):
+        start = register_addr * bytes_per_address
+        end = start + len(data)
+        if spans and start - spans[-1][1] <= max_gap:
+            last = spans[-1]
+            if start < last[1] or max(end, last[1]) - last[0] <= max_length:
+                last[1] = max(end, last[1])
+                continue
+        spans.append([start, end])
+    return [(start // bytes_per_address, end - start) for start, end in spans]
+
+
+class ConfigApplier:
+    # Writes register images to devices, only where they differ from the
+    # device state. Device keys are device addresses for IQS9320 I2C and
+    # device selects (matrix positions) otherwise.
+    #
+    # Each device's blocks are merged into burst spans that are read and
+    # diffed as a whole. Changed ranges are merged across unchanged
+    # configured registers only, so registers outside the config are read
+    # but never written.
+
+    def __init__(self, ki, family, device_addr=None, max_gap=4):
+        self.ki = ki
+        self.family = family
+        if device_addr is None:
+            device_addr = ki.device_address
+        self.device_addr = device_addr
+        self.max_gap = max_gap
+        self.report = ApplyReport()
+
+    def spans(self, images):
+        # {device: [(register_addr, num_bytes)]}
+        return {
+            device: block_spans(
+                blocks,
+                self.family.bytes_per_address,
+                self.max_gap,
+                max_read_length(self.family),
+            )
+            for device, blocks in images.items()
+        }
+
+    def apply(self, images, verify=True):
+        family = self.family
+        report = self.report
+        per_address = family.bytes_per_address
+        spans = self.spans(images)
+        current = self.read(spans)
+
+        # {device: [(register_addr, bytes)]} of the runs of contiguous
+        # configured registers. Writes never leave a run: the registers
+        # between blocks may change under us and are not rewritten.
+        targets = {}
+        # {(register_addr, data): [device]}, identical ranges are collected
+        # so they can be written to several devices at once
+        writes = {}
+        max_length = max_write_length(family)
+        for device, blocks in images.items():
+            targets[device] = []
+            for span_addr, num_bytes in spans[device]:
+                old = current[device][span_addr]
+                new = bytearray(old)
+                inside = []
+                for register_addr, data in blocks:
+                    start = (register_addr - span_addr) * per_address
+                    if 0 <= start and start + len(data) <= num_bytes:
+                        new[start : start + len(data)] = data
+                        inside.append((register_addr, data))
+                for run_addr, run_bytes in block_spans(
+                    inside, per_address, 0, num_bytes
+                ):
+                    start = (run_addr - span_addr) * per_address
+                    end = start + run_bytes
+                    run = bytes(new[start:end])
+                    targets[device].append((run_addr, run))
+                    written = 0
+                    for range_start, range_end in changed_ranges(
+                        old[start:end], run, per_address, self.max_gap, max_length
+                    ):
+                        key = (
+                            run_addr + range_start // per_address,
+                            run[range_start:range_end],
+                        )
+                        writes.setdefault(key, []).append(device)
+                        written += range_end - range_start
+                    report.bytes_written += written
+                    report.bytes_skipped += run_bytes - written
+
+        for (register_addr, data), devices in writes.items():
+            self.write(targets, register_addr, data, devices)
+
+        if verify:
+            # Read from the devices, not from the register cache
+            readback = self.read(spans, cached=False)
+            for device, blocks in images.items():
+                for register_addr, data in blocks:
+                    actual = self.__block(readback[device], register_addr, len(data))
+                    for offset in range(0, len(data), per_address):
+                        end = offset + per_address
+                        if actual[offset:end] != data[offset:end]:
+                            report.mismatches.append(
+                                (device, register_addr + offset // per_address)
+                            )
+            report.verified = True
+        return report
+
+    def __block(self, state, register_addr, num_bytes):
+        # Bytes of a block in {span register_addr: bytes}
+        per_address = self.family.bytes_per_address
+        for span_addr, data in state.items():
+            start = (register_addr - span_addr) * per_address
+            if 0 <= start and start + num_bytes <= len(data):
+                return data[start : start + num_bytes]
+        raise ValueError("Register {:#x} is in no span".format(register_addr))
+
+    # ------------------------------------
+    # Reads
+    # ------------------------------------
+
+    def read(self, spans, cached=True):
+        # {device: {register_addr: bytes}} of {device: [(register_addr,
+        # num_bytes)]} spans, spans at the same address and length are read
+        # from all their devices at once. cached=False reads the devices even
+        # with the register cache on.
+        layouts = {}
+        for device, device_spans in spans.items():
+            for register_addr, num_bytes in device_spans:
+                layouts.setdefault((register_addr, num_bytes), []).append(device)
+        state = {device: {} for device in spans}
+        per_address = self.family.bytes_per_address
+        max_length = max_read_length(self.family)
+        for (register_addr, length), devices in layouts.items():
+            parts = {device: [] for device in devices}
+            for offset in range(0, length, max_length):
+                num_bytes = min(max_length, length - offset)
+                chunk = self.__read_chunk(
+                    register_addr + offset // per_address, num_bytes, devices, cached
+                )
+                for device, data in chunk.items():
+                    parts[device].append(data)
+            for device, data in parts.items():
+                state[device][register_addr] = b"".join(data)
+        return state
+
+    def __read_chunk(self, register_addr, num_bytes, devices, cached):
+        family = self.family
+        read_single = self.ki._i2c_read_single
+        read_multi = self.ki._i2c_read_multi
+        if not cached:
+            read_single = partial(KeyboardInterfaceBase._i2c_read_single, self.ki)
+            read_multi = partial(KeyboardInterfaceBase._i2c_read_multi, self.ki)
+
+        if len(devices) > 1:
+            # Address list families read just these devices, the others read
+            # the whole matrix
+            if family.address_list:
+                data = read_multi(family, devices, register_addr, num_bytes, "bytes")
+                positions = range(len(devices))
+            else:
+                data = read_multi(
+                    family, self.device_addr, register_addr, num_bytes, "bytes"
+                )
+                positions = devices
+            if isinstance(data, Future):
+                data = data.result()
+            self.report.frames_read += 1
+            return {
+                device: data[i * num_bytes : (i + 1) * num_bytes]
+                for device, i in zip(devices, positions)
+            }
+        out = {}
+        for device in devices:
+            select, addr = self.__single(device)
+            out[device] = read_single(
+                family, select, addr, register_addr, num_bytes, "bytes"
+            )
+            self.report.frames_read += 1
+        return out
+
+    # ------------------------------------
+    # Writes
+    # ------------------------------------
+
+    def __single(self, device):
+        # (device_select, device_addr) of a device key
+        if self.family.address_list:
+            return None, device
+        return device, self.device_addr
+
+    def __matrix_multi(self, images, register_addr, data, devices):
+        # A matrix write_multi writes every device, which is only right when
+        # each of them is configured with the same bytes there
+        if len(devices) < 2 or len(images) != self.ki.num_devices:
+            return False
+        per_address = self.family.bytes_per_address
+        for device, blocks in images.items():
+            if device in devices:
+                continue
+            for block_addr, block in blocks:
+                start = (register_addr - block_addr) * per_address
+                if 0 <= start and block[start : start + len(data)] == data:
+                    break
+            else:
+                return False
+        return True
+
+    def write(self, images, register_addr, data, devices):
+        ki = self.ki
+        family = self.family
+        report = self.report
+        if len(devices) > 1 and family.address_list:
+            ki._i2c_write_multi(family, devices, register_addr, data)
+            # The address list leaves less room for data, longer writes are
+            # sent in chunks
+            limit = max_write_length(family, len(devices))
+            report.frames_written += -(-len(data) // limit)
+        elif self.__matrix_multi(images, register_addr, data, devices):
+            ki._i2c_write_multi(family, self.device_addr, register_addr, data)
+            report.frames_written += 1
+        else:
+            for device in devices:
+                select, addr = self.__single(device)
+                ki._i2c_write_single(family, select, addr, register_addr, data)
+                report.frames_written += 1
+
+
+def apply_config(ki, config, family=None, device_addr=None, max_gap=4, verify=True):
+    # Write {device: {register_addr: data}} register images, skipping what the
+    # devices already hold, and return an ApplyReport
+    if family is None:
+        family = DEVICE_FAMILIES[ki.device]
+    images = normalize_config(config, family)
+    return ConfigApplier(ki, family, device_addr, max_gap).apply(images, verify)
@@ -0,0 +1,77 @@
+import binascii
+
+CRC_INIT = 0xFFFF
+CRC_POLY = 0x1021
+
+
+def crc16_bitwise(data, crc=CRC_INIT):
+    # Reference implementation, processes one bit at a time
+    for byte in data:
+        crc = crc ^ ((byte) << 8)
+        crc = crc & 0xFFFF
+        for _ in range(8):
+            if crc & 0x8000:
+                crc = crc << 1 ^ CRC_POLY
+            else:
+                crc = crc << 1
+            crc = crc & 0xFFFF
+    return crc
+
+
+def _make_table():
+    table = []
+    for i in range(256):
+        table.append(crc16_bitwise([i], 0))
+    return tuple(table)
+
+
+CRC_TABLE = _make_table()
+
+
+def crc16_table(data, crc=CRC_INIT):
+    table = CRC_TABLE
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFF) ^ table[(crc >> 8) ^ byte]
+    return crc
+
+
+def crc16_binascii(data, crc=CRC_INIT):
+    if not isinstance(data, (bytes, bytearray, memoryview)):
+        data = bytes(data)
+    return binascii.crc_hqx(data, crc)
+
+
+backends = {
+    "binascii": crc16_binascii,
+    "table": crc16_table,
+    "bitwise": crc16_bitwise,
+}
+backend_name = "bitwise"
+_backend = crc16_bitwise
+
+
+def set_backend(name):
+    global backend_name, _backend
+    if name not in backends:
+        raise ValueError("Unknown CRC backend : {}".format(name))
+    backend_name = name
+    _backend = backends[name]
+
+
+def _select_backend():
+    # Pick the fastest backend that agrees with the reference implementation
+    check = b"123456789"
+    for name in ("binascii", "table"):
+        try:
+            if backends[name](check) == crc16_bitwise(check):
+                return name
+        except (TypeError, ValueError):
+            pass
+    return "bitwise"
+
+
+set_backend(_select_backend())
+
+
+def crc16(data):
+    return _backend(data)
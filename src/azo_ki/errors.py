@@ -0,0 +1,35 @@
+class KeyboardInterfaceError(Exception):
+    # Base of the errors raised for link and protocol failures
+    pass
+
+
+class DeviceNotFoundError(KeyboardInterfaceError):
+    pass
+
+
+class AckTimeoutError(KeyboardInterfaceError, TimeoutError):
+    # No acknowledge received (or it was cut short)
+    pass
+
+
+class AckMismatchError(KeyboardInterfaceError):
+    # Acknowledge received with the wrong byte B, command ID, command or trailer
+    def __init__(self, message, failures=(), received=b""):
+        super().__init__(message)
+        self.failures = list(failures)
+        self.received = received
+
+
+class GenericReturnError(KeyboardInterfaceError):
+    # A write was acknowledged but not followed by the 0xFF generic return
+    pass
+
+
+class ResponseLengthError(KeyboardInterfaceError, TimeoutError):
+    # Fewer response bytes than expected arrived before the timeout
+    pass
+
+
+class AcquisitionError(KeyboardInterfaceError):
+    # The acquisition process failed to start or stopped with an error
+    pass
@@ -0,0 +1,155 @@
+import struct
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Union
+
+from azo_ki.crc import crc16
+from azo_ki.errors import AckTimeoutError
+
+if TYPE_CHECKING:
+    from typing_extensions import Buffer
+
+PACKET_BYTE_A = 0xCC
+PACKET_BYTE_B = 0xEF
+
+# The packet length byte covers the command ID and the command bytes
+MAX_PACKET_LENGTH = 0xFF
+MAX_COMMAND_LENGTH = MAX_PACKET_LENGTH - 1
+
+# Start of frame (2) + length (1) + command ID (1) + CRC (2) + end of frame (2)
+FRAME_OVERHEAD = 8
+MAX_FRAME_SIZE = MAX_COMMAND_LENGTH + FRAME_OVERHEAD
+
+
+# Data byte_view() accepts: any buffer-protocol object or a list of ints
+ByteData = Union["Buffer", list, tuple]
+
+
+def byte_view(data: ByteData):
+    # Flat unsigned byte view over any buffer-protocol object or list of ints
+    if isinstance(data, (list, tuple)):
+        data = bytes(data)
+    view = memoryview(data)
+    if view.format != "B" or view.ndim != 1:
+        view = view.cast("B")
+    return view
+
+
+def pack_registers(register_addr):
+    # 16-bit register addresses, little-endian
+    return struct.pack("<{}H".format(len(register_addr)), *register_addr)
+
+
+class FrameEncoder:
+    def __init__(self, packet_byte_a=PACKET_BYTE_A, packet_byte_b=PACKET_BYTE_B):
+        self.packet_byte_a = packet_byte_a
+        self.packet_byte_b = packet_byte_b
+        self.buffer = bytearray(MAX_FRAME_SIZE)
+        self.view = memoryview(self.buffer)
+        self.buffer[0] = packet_byte_a
+        self.buffer[1] = packet_byte_b
+
+    def encode(self, command_id, command_bytes, payload: ByteData = b""):
+        buffer = self.buffer
+        view = self.view
+        payload = byte_view(payload)
+
+        header_end = 4 + len(command_bytes)
+        payload_end = header_end + len(payload)
+        if payload_end - 3 > MAX_PACKET_LENGTH:
+            raise ValueError(
+                "Command too long : {} bytes (max {})".format(
+                    payload_end - 4, MAX_COMMAND_LENGTH
+                )
+            )
+
+        buffer[2] = payload_end - 3
+        buffer[3] = command_id
+        buffer[4:header_end] = command_bytes
+        view[header_end:payload_end] = payload
+
+        # CRC covers the packet excluding Start of Frame and Packet Length
+        crc_value = crc16(view[3:payload_end])
+        buffer[payload_end] = crc_value & 0xFF
+        buffer[payload_end + 1] = (crc_value & 0xFF00) >> 8
+        buffer[payload_end + 2] = self.packet_byte_a
+        buffer[payload_end + 3] = self.packet_byte_b
+        return view[: payload_end + 4]
+
+
+# Response acknowledge: A, B, command ID, command, A, B
+ACK_LENGTH = 6
+GENERIC_RETURN = b"\xff\xff\xff\xff"
+GENERIC_RETURN_LENGTH = len(GENERIC_RETURN)
+
+
+@dataclass
+class FrameStats:
+    syscalls: int = 0
+    bytes_read: int = 0
+    discarded: int = 0
+
+
+class FrameReader:
+    def __init__(self, serial_conn, packet_byte_a=PACKET_BYTE_A, max_sync_bytes=100):
+        self.serial_conn = serial_conn
+        self.packet_byte_a = packet_byte_a
+        self.max_sync_bytes = max_sync_bytes
+        self.buffer = bytearray()
+        self.stats = FrameStats()
+
+    def begin(self):
+        # Start a new command, stale buffered and pending bytes are discarded
+        self.stats = FrameStats()
+        self.discard(len(self.buffer))
+        if self.serial_conn.in_waiting:
+            self.stats.discarded += len(self.serial_conn.read_all() or b"")
+            self.stats.syscalls += 1
+        return self.stats
+
+    def discard(self, size):
+        del self.buffer[:size]
+        self.stats.discarded += size
+
+    def fill(self, size, greedy=False):
+        # Read until the buffer holds size bytes, one syscall per shortfall
+        buffer = self.buffer
+        while len(buffer) < size:
+            want = size - len(buffer)
+            if greedy:
+                want = max(want, self.serial_conn.in_waiting)
+            data = self.serial_conn.read(want)
+            self.stats.syscalls += 1
+            if not data:
+                return False
+            self.stats.bytes_read += len(data)
+            buffer += data
+        return True
+
+    def read_ack(self, expected=0):
+        # Sync to start byte A and return the 5 acknowledge bytes that follow.
+        # The expected response length is requested in the same read.
+        buffer = self.buffer
+        self.fill(ACK_LENGTH + expected)
+        scanned = 0
+        while True:
+            index = buffer.find(self.packet_byte_a)
+            if index >= 0:
+                self.discard(index)
+                break
+            scanned += len(buffer)
+            self.discard(len(buffer))
+            if scanned > self.max_sync_bytes or not self.fill(1, greedy=True):
+                raise AckTimeoutError("Failed to receive response packet from device")
+        if index > 0:
+            self.fill(ACK_LENGTH + expected, greedy=True)
+        else:
+            self.fill(ACK_LENGTH)
+        ack = bytes(buffer[1:ACK_LENGTH])
+        del buffer[:ACK_LENGTH]
+        return ack
+
+    def read(self, size):
+        self.fill(size)
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
@@ -0,0 +1,145 @@
+from dataclasses import dataclass
+
+from azo_ki.stream import require_numpy
+
+# Event kinds, also the kind codes of KeyScanDecoder.decode() events
+RELEASE = 0
+PRESS = 1
+RESET = 2
+KIND_NAMES = {RELEASE: "release", PRESS: "press", RESET: "reset"}
+
+EVENT_FIELDS = [
+    ("sample", "<i8"),
+    ("time", "<f8"),
+    ("kind", "u1"),
+    ("device", "<u2"),
+    ("channel", "<i2"),
+]
+
+
+@dataclass(frozen=True)
+class KeyEvent:
+    kind: str
+    device: int
+    # None for reset events
+    channel: int | None
+    time: float | None = None
+
+
+class KeyScanDecoder:
+    # Turns key scan data (iqs7220a_ks, iqs7320a_ks, iqs9320_ks or their
+    # stream_ks samples) into press/release/reset events. Each device's bytes
+    # are a little-endian bitfield with the device reset flag in bit 0 and
+    # channel n in bit n + 1. Frames are XORed against the previous one and
+    # only the changed bits are visited, so the work per frame follows the
+    # number of changes rather than the matrix size. A reset is reported when
+    # the flag is set, the first frame reports keys already held as presses.
+
+    def __init__(self, num_devices, bytes_per_device=1, num_channels=None):
+        self.num_devices = num_devices
+        self.bytes_per_device = bytes_per_device
+        self.bits_per_device = 8 * bytes_per_device
+        if num_channels is None:
+            num_channels = self.bits_per_device - 1
+        if not 0 < num_channels < self.bits_per_device:
+            raise ValueError(
+                "num_channels must be between 1 and {}".format(self.bits_per_device - 1)
+            )
+        self.num_channels = num_channels
+        self.frame_size = num_devices * bytes_per_device
+
+        # Reset and channel bits of every device, unused bits are ignored
+        device_mask = (1 << (num_channels + 1)) - 1
+        self.mask = 0
+        for device in range(num_devices):
+            self.mask |= device_mask << (device * self.bits_per_device)
+        self.previous = 0
+
+    @classmethod
+    def from_stream(cls, stream, num_channels=None):
+        # Decoder for the active key scan stream, e.g. ki.stream_config
+        if stream.register_addr is not None:
+            raise ValueError("Not a key scan stream")
+        return cls(len(stream.devices), stream.num_bytes[0], num_channels)
+
+    def reset(self, frame=None):
+        # Forget the previous frame, or start from the given one
+        self.previous = 0
+        if frame is not None:
+            self.previous = int.from_bytes(frame, "little") & self.mask
+
+    def update(self, frame, receive_time=None):
+        # Events of one frame as a list of KeyEvent
+        value = int.from_bytes(frame[: self.frame_size], "little") & self.mask
+        changed = value ^ self.previous
+        self.previous = value
+        events = []
+        while changed:
+            low = changed & -changed
+            changed ^= low
+            device, bit = divmod(low.bit_length() - 1, self.bits_per_device)
+            if not bit:
+                if value & low:
+                    events.append(KeyEvent("reset", device, None, receive_time))
+            elif value & low:
+                events.append(KeyEvent("press", device, bit - 1, receive_time))
+            else:
+                events.append(KeyEvent("release", device, bit - 1, receive_time))
+        return events
+
+    def decode(self, data, times=None):
+        # Events of a block of frames (e.g. a stream read) as a NumPy array
+        # with EVENT_FIELDS, ordered by sample, device and channel. times
+        # gives each frame's receive time.
+        np = require_numpy()
+        num_frames = len(data) // self.frame_size
+        events = np.zeros(0, EVENT_FIELDS)
+        if not num_frames:
+            return events
+        mask = np.frombuffer(
+            self.mask.to_bytes(self.frame_size, "little"), dtype=np.uint8
+        )
+        frames = np.frombuffer(data, np.uint8, num_frames * self.frame_size)
+        frames = frames.reshape(num_frames, self.frame_size) & mask
+        previous = np.frombuffer(
+            self.previous.to_bytes(self.frame_size, "little"), dtype=np.uint8
+        )
+        self.previous = int.from_bytes(frames[-1].tobytes(), "little")
+
+        # Unpack only the bytes that changed
+        diff = frames.copy()
+        diff[0] ^= previous
+        diff[1:] ^= frames[:-1]
+        samples, columns = np.nonzero(diff)
+        if not len(samples):
+            return events
+        bits = np.unpackbits(diff[samples, columns][:, None], axis=1, bitorder="little")
+        rows, bit = np.nonzero(bits)
+        samples = samples[rows]
+        position = columns[rows].astype(np.int64) * 8 + bit
+        state = (frames[samples, columns[rows]] >> bit) & 1
+
+        events = np.zeros(len(samples), EVENT_FIELDS)
+        events["sample"] = samples
+        if times is not None:
+            events["time"] = np.asarray(times, dtype=np.float64)[samples]
+        else:
+            events["time"] = np.nan
+        events["device"], channel = np.divmod(position, self.bits_per_device)
+        events["channel"] = channel - 1
+        events["kind"] = state
+        reset = channel == 0
+        events["kind"][reset] = RESET
+        # Reset flags clearing are not events
+        return events[~reset | (state == 1)]
+
+    def state(self):
+        # Current key state as a bool array shaped [device, channel]
+        np = require_numpy()
+        bits = np.unpackbits(
+            np.frombuffer(
+                self.previous.to_bytes(self.frame_size, "little"), dtype=np.uint8
+            ),
+            bitorder="little",
+        ).reshape(self.num_devices, self.bits_per_device)
+        return bits[:, 1 : self.num_channels + 1].astype(bool)
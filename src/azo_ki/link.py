@@ -0,0 +1,96 @@
+# Serial link settings for KeyboardInterface(link=...)
+
+import warnings
+from dataclasses import dataclass
+
+# 10 bits per byte on the wire (start, 8 data, stop)
+BITS_PER_BYTE = 10
+
+# Settings applied as pyserial attributes, where the connection has them
+SERIAL_ATTRIBUTES = ("baudrate", "timeout", "write_timeout", "inter_byte_timeout")
+
+
+class LinkOversubscribedWarning(RuntimeWarning):
+    pass
+
+
+@dataclass
+class LinkConfig:
+    # Baud rate, pyserial timeouts and OS buffer sizes. The buffer sizes are
+    # only applied where pyserial supports set_buffer_size (Windows), other
+    # platforms size the driver buffers themselves.
+    #
+    # With auto_tune, starting a stream sets the read timeout to a few report
+    # intervals instead of the fixed timeout, sizes the receive buffer for
+    # buffer_seconds of samples and warns when the stream needs more than
+    # max_utilisation of the link. The Pico's USB CDC link does not run at
+    # the nominal baud rate, set baudrate to the measured rate for budgeting.
+    baudrate: int = 115200
+    timeout: float | None = 0.5
+    write_timeout: float | None = None
+    inter_byte_timeout: float | None = None
+    rx_buffer_size: int | None = None
+    tx_buffer_size: int | None = None
+    auto_tune: bool = False
+    stream_timeout_intervals: float = 4.0
+    min_timeout: float = 0.02
+    buffer_seconds: float = 1.0
+    max_utilisation: float = 0.8
+
+    @property
+    def bytes_per_second(self):
+        return self.baudrate / BITS_PER_BYTE
+
+    def serial_kwargs(self):
+        return {name: getattr(self, name) for name in SERIAL_ATTRIBUTES}
+
+    def utilisation(self, stream):
+        # Fraction of the link bandwidth a StreamConfig needs
+        return stream.bytes_per_second / self.bytes_per_second
+
+    def stream_timeout(self, stream):
+        # A lost sample stalls a read for a few report intervals, plus the
+        # time the sample takes on the wire
+        timeout = stream.report_interval_ms / 1000 * self.stream_timeout_intervals
+        timeout += stream.sample_size / self.bytes_per_second
+        return max(self.min_timeout, timeout)
+
+    def stream_buffer_size(self, stream):
+        size = int(min(stream.bytes_per_second, self.bytes_per_second))
+        return max(4096, int(size * self.buffer_seconds))
+
+    def check_bandwidth(self, stream, stacklevel=2):
+        utilisation = self.utilisation(stream)
+        if utilisation > self.max_utilisation:
+            warnings.warn(
+                "Stream needs {:.0f} B/s, {:.0%} of the {} baud link".format(
+                    stream.bytes_per_second, utilisation, self.baudrate
+                ),
+                LinkOversubscribedWarning,
+                stacklevel=stacklevel,
+            )
+        return utilisation
+
+
+def apply_link(serial_conn, link, timeout=None, rx_buffer_size=None):
+    # Apply link settings to an open connection. Attributes the connection
+    # does not have (e.g. on a simulated transport) are skipped.
+    settings = link.serial_kwargs()
+    if timeout is not None:
+        settings["timeout"] = timeout
+    for name, value in settings.items():
+        if hasattr(serial_conn, name) and getattr(serial_conn, name) != value:
+            setattr(serial_conn, name, value)
+    rx_buffer_size = rx_buffer_size or link.rx_buffer_size
+    set_buffer_size(serial_conn, rx_buffer_size, link.tx_buffer_size)
+
+
+def set_buffer_size(serial_conn, rx_size=None, tx_size=None):
+    # Only pyserial's Windows backend can resize the driver buffers
+    if not hasattr(serial_conn, "set_buffer_size") or not (rx_size or tx_size):
+        return False
+    kwargs = {"rx_size": rx_size or 4096}
+    if tx_size:
+        kwargs["tx_size"] = tx_size
+    serial_conn.set_buffer_size(**kwargs)
+    return True
@@ -0,0 +1,188 @@
+import bisect
+import time
+from dataclasses import dataclass, field
+
+from azo_ki.azo_ki import KeyboardInterfaceBase
+
+# Latency phases of a transaction
+PHASES = ("encode", "write", "ack", "read")
+
+# Acknowledge and response failures counted by verify_ack/verify_generic_return
+FAILURES = (
+    "timeout",
+    "byte_b",
+    "command_id",
+    "command",
+    "trailer",
+    "generic_return",
+    "response_length",
+)
+
+# Recovery actions of the retry policy
+RECOVERIES = ("retries", "resyncs", "stream_stops")
+
+# Histogram bucket upper bounds in seconds, 1 us to ~8 s in powers of two
+BUCKETS = tuple(2**i * 1e-6 for i in range(24))
+
+COMMANDS = {int(command): command for command in KeyboardInterfaceBase.commands}
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, p):
+        # Upper bound of the bucket holding the p-th percentile
+        if not self.count:
+            return 0.0
+        rank = p / 100 * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return min(BUCKETS[i], self.max) if i < len(BUCKETS) else self.max
+        return self.max
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "max": self.max,
+            "buckets": dict(zip(BUCKETS + (float("inf"),), self.counts)),
+        }
+
+
+@dataclass
+class CommandRecord:
+    # One transaction, passed to the post command hooks
+    command: int
+    command_bytes: list
+    start: float
+    last: float = 0.0
+    end: float = 0.0
+    phases: dict = field(default_factory=dict)
+    bytes_sent: int = 0
+    bytes_received: int = 0
+    discarded: int = 0
+    error: Exception | None = None
+
+    def mark(self, phase):
+        # Time since the previous mark, or the start, is booked to phase
+        now = time.perf_counter()
+        self.phases[phase] = now - (self.last or self.start)
+        self.last = now
+
+    @property
+    def elapsed(self):
+        return (self.end or self.last or self.start) - self.start
+
+
+class CommandMetrics:
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.latency = Histogram()
+        self.phases = {phase: Histogram() for phase in PHASES}
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "latency": self.latency.as_dict(),
+            "phases": {name: h.as_dict() for name, h in self.phases.items()},
+        }
+
+
+class Metrics:
+    # Per-command counters and latency histograms, keyed by the commands enum,
+    # and link-wide byte and failure counters. pre_command hooks are called
+    # with (command, command_bytes) and post_command hooks with the
+    # CommandRecord of every transaction.
+
+    def __init__(self):
+        self.commands = {}
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.discarded = 0
+        self.failures = dict.fromkeys(FAILURES, 0)
+        self.recoveries = dict.fromkeys(RECOVERIES, 0)
+        self.stream_overruns = 0
+        self.stream_dropped = 0
+        self.pre_command = []
+        self.post_command = []
+
+    def add_hooks(self, pre=None, post=None):
+        if pre is not None:
+            self.pre_command.append(pre)
+        if post is not None:
+            self.post_command.append(post)
+
+    def begin(self, command_bytes: list[int]):
+        command = COMMANDS.get(command_bytes[0], command_bytes[0])
+        for hook in self.pre_command:
+            hook(command, command_bytes)
+        return CommandRecord(command, command_bytes, time.perf_counter())
+
+    def end(self, record):
+        record.end = time.perf_counter()
+        stats = self.commands.get(record.command)
+        if stats is None:
+            stats = self.commands[record.command] = CommandMetrics()
+        stats.count += 1
+        if record.error is not None:
+            stats.errors += 1
+        for phase, elapsed in record.phases.items():
+            stats.phases[phase].add(elapsed)
+        stats.latency.add(record.elapsed)
+        self.bytes_sent += record.bytes_sent
+        self.bytes_received += record.bytes_received
+        self.discarded += record.discarded
+        for hook in self.post_command:
+            hook(record)
+
+    def count_failures(self, failures):
+        for failure in failures:
+            self.failures[failure] += 1
+
+    def count_recovery(self, recovery):
+        self.recoveries[recovery] += 1
+
+    def count_overrun(self, dropped):
+        self.stream_overruns += 1
+        self.stream_dropped += dropped
+
+    def snapshot(self):
+        return {
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+            "discarded": self.discarded,
+            "failures": dict(self.failures),
+            "recoveries": dict(self.recoveries),
+            "stream_overruns": self.stream_overruns,
+            "stream_dropped": self.stream_dropped,
+            "commands": {
+                getattr(command, "name", command): stats.as_dict()
+                for command, stats in self.commands.items()
+            },
+        }
+
+    def reset(self):
+        hooks = self.pre_command, self.post_command
+        self.__init__()
+        self.pre_command, self.post_command = hooks
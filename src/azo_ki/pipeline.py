@@ -0,0 +1,188 @@
+import time
+from concurrent.futures import Future
+
+from azo_ki.azo_ki import KeyboardInterfaceBase
+from azo_ki.errors import (
+    AckMismatchError,
+    AckTimeoutError,
+    KeyboardInterfaceError,
+    ResponseLengthError,
+)
+from azo_ki.framing import GENERIC_RETURN_LENGTH, byte_view
+
+
+class PipelineFuture(Future):
+    # Waiting on the result drives the pipeline until the response arrives
+
+    def __init__(self, pipeline, command, response_len, generic, return_type):
+        super().__init__()
+        self.pipeline = pipeline
+        self.command = command
+        self.response_len = response_len
+        self.generic = generic
+        self.return_type = return_type
+        self.deadline = time.monotonic() + pipeline.timeout
+
+    def result(self, timeout=None):
+        while not self.done():
+            self.pipeline.receive()
+        return super().result(timeout)
+
+    def exception(self, timeout=None):
+        while not self.done():
+            self.pipeline.receive()
+        return super().exception(timeout)
+
+
+class Pipeline(KeyboardInterfaceBase):
+    # Command methods return a PipelineFuture instead of blocking on the ack.
+    # Up to max_in_flight commands are sent before waiting for a response,
+    # responses are matched to requests by command ID and command byte.
+
+    def __init__(self, ki, max_in_flight=8, timeout=None):
+        super().__init__(
+            ki.device, ki.num_columns, ki.num_rows, ki.device_address, ki.return_type
+        )
+        if not 1 <= max_in_flight <= 0xFF:
+            raise ValueError("max_in_flight must be between 1 and 255")
+        self.ki = ki
+        self.max_in_flight = max_in_flight
+        if timeout is None:
+            timeout = ki.serial_conn.timeout or 0.5
+        self.timeout = timeout
+        self.pending = {}
+        self.frame_stats = ki.frame_reader.begin()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.flush()
+
+    def submit(
+        self,
+        command_bytes,
+        payload=b"",
+        response_len=0,
+        generic=False,
+        return_type=None,
+    ):
+        while len(self.pending) >= self.max_in_flight:
+            self.receive()
+        frame = self.ki.encode_command(command_bytes, payload)
+        future = PipelineFuture(
+            self, command_bytes[0], response_len, generic, return_type
+        )
+        self.pending[self.ki.command_id] = future
+        self.ki.serial_conn.write(frame)
+        return future
+
+    def receive(self):
+        # Read one response and resolve the matching request
+        self.__expire(time.monotonic())
+        if not self.pending:
+            return
+        reader = self.ki.frame_reader
+        try:
+            ack = reader.read_ack()
+        except KeyboardInterfaceError:
+            ack = b""
+        if len(ack) != 5:
+            # The link is silent, nothing else will arrive for these either
+            self.__expire(time.monotonic(), silent=True)
+            return
+        future = self.pending.get(ack[1])
+        if future is None:
+            # Not a response to a pending request, sync to the next one
+            reader.stats.discarded += len(ack) + 1
+            return
+        del self.pending[ack[1]]
+        read_values = reader.read(future.response_len)
+        try:
+            if (
+                ack[0] != self.packet_byte_b
+                or ack[2] != future.command
+                or ack[3] != self.packet_byte_a
+                or ack[4] != self.packet_byte_b
+            ):
+                # The response that followed is skipped with the request
+                raise AckMismatchError(
+                    "Packet transmission failed : {}".format(ack.hex()), received=ack
+                )
+            if future.generic:
+                self.verify_generic_return(read_values)
+                future.set_result(None)
+            elif future.response_len:
+                if len(read_values) != future.response_len:
+                    raise ResponseLengthError("Serial timeout")
+                future.set_result(self._convert_values(read_values, future.return_type))
+            else:
+                future.set_result(None)
+        except (KeyboardInterfaceError, ImportError, TypeError, ValueError) as e:
+            future.set_exception(e)
+
+    def __expire(self, now, silent=False):
+        # Fail the requests past their deadline, or every request once the
+        # link went silent without any being overdue
+        expired = [k for k, future in self.pending.items() if future.deadline <= now]
+        if silent and not expired:
+            expired = list(self.pending)
+        for key in expired:
+            self.pending.pop(key).set_exception(
+                AckTimeoutError("No response for command ID {}".format(key))
+            )
+
+    def flush(self):
+        while self.pending:
+            self.receive()
+
+    # ------------------------------------
+    # Register cache
+    # ------------------------------------
+
+    # Writes sent through the pipeline bypass the interface's register
+    # cache, so the registers they cover are dropped from it
+
+    def _invalidate_cache(self, family=None, device_select=None):
+        self.ki._invalidate_cache(family, device_select)
+
+    def __discard(self, family, devices, register_addr, bytes_array):
+        cache = self.ki.register_cache
+        if cache is not None:
+            cache.discard(family, devices, register_addr, len(byte_view(bytes_array)))
+
+    def _i2c_write_single(
+        self, family, device_select, device_addr, register_addr, bytes_array
+    ):
+        self.__discard(
+            family,
+            [self._single_device(family, device_select, device_addr)],
+            register_addr,
+            bytes_array,
+        )
+        return super()._i2c_write_single(
+            family, device_select, device_addr, register_addr, bytes_array
+        )
+
+    def _i2c_write_multi(self, family, device_addr, register_addr, bytes_array):
+        self.__discard(
+            family,
+            self._multi_devices(family, device_addr),
+            register_addr,
+            bytes_array,
+        )
+        return super()._i2c_write_multi(family, device_addr, register_addr, bytes_array)
+
+    # ------------------------------------
+    # Transactions
+    # ------------------------------------
+
+    def _command(self, command_bytes, payload=b""):
+        return self.submit(command_bytes, payload)
+
+    def _write(self, command_bytes, payload=b""):
+        return self.submit(command_bytes, payload, GENERIC_RETURN_LENGTH, generic=True)
+
+    def _read(self, command_bytes, num_bytes, return_type=None):
+        return_type = self._check_return_type(return_type)
+        return self.submit(command_bytes, b"", num_bytes, return_type=return_type)
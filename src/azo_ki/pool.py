@@ -0,0 +1,115 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any
+
+from azo_ki.azo_ki import KeyboardInterface, find_ports
+from azo_ki.errors import DeviceNotFoundError, KeyboardInterfaceError
+
+
+@dataclass
+class PoolResult:
+    port: str
+    value: Any = None
+    error: Exception | None = None
+    elapsed: float = 0.0
+
+
+class KeyboardInterfacePool:
+    # Command methods of KeyboardInterface are fanned out to every board and
+    # return {port: PoolResult}, e.g. pool.iqs7220a_ks()
+
+    def __init__(
+        self,
+        device,
+        num_columns=1,
+        num_rows=1,
+        device_address=None,
+        ports=None,
+        max_workers=None,
+        **kwargs,
+    ):
+        if ports is None:
+            ports = [port.device for port in find_ports()]
+        if not ports:
+            raise DeviceNotFoundError("Unable to connect to Raspberry Pi Pico W")
+        self.executor = ThreadPoolExecutor(max_workers or len(ports))
+        self.elapsed = 0.0
+
+        def connect(port):
+            return KeyboardInterface(
+                device, num_columns, num_rows, device_address, port=port, **kwargs
+            )
+
+        self.interfaces = {}
+        results = self.__run(dict.fromkeys(ports), lambda port, ki: connect(port))
+        for port, result in results.items():
+            if result.error is not None:
+                self.close()
+                raise result.error
+            self.interfaces[port] = result.value
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return len(self.interfaces)
+
+    def __getitem__(self, port):
+        return self.interfaces[port]
+
+    def __getattr__(self, name):
+        if name.startswith("_") or not callable(getattr(KeyboardInterface, name, None)):
+            raise AttributeError(name)
+
+        def call(*args, **kwargs):
+            return self.run(lambda ki: getattr(ki, name)(*args, **kwargs))
+
+        return call
+
+    def __run(self, targets, function):
+        elapsed = {}
+
+        def timed(port, ki):
+            start = time.perf_counter()
+            try:
+                return function(port, ki)
+            finally:
+                elapsed[port] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        futures = {
+            port: self.executor.submit(timed, port, ki) for port, ki in targets.items()
+        }
+        results = {}
+        for port, future in futures.items():
+            # The future holds whatever function raised
+            error = future.exception()
+            if error is None:
+                value = future.result()
+                results[port] = PoolResult(port, value, elapsed=elapsed[port])
+            elif isinstance(error, Exception):
+                results[port] = PoolResult(port, error=error, elapsed=elapsed[port])
+            else:
+                raise error
+        self.elapsed = time.perf_counter() - start
+        return results
+
+    def run(self, function, ports=None):
+        # Call function(ki) on every board (or the given ports) concurrently
+        targets = self.interfaces
+        if ports is not None:
+            targets = {port: self.interfaces[port] for port in ports}
+        return self.__run(targets, lambda port, ki: function(ki))
+
+    def close(self):
+        for ki in self.interfaces.values():
+            try:
+                ki.close()
+            except (KeyboardInterfaceError, OSError):
+                pass
+        self.interfaces = {}
+        self.executor.shutdown()
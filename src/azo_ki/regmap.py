@@ -0,0 +1,330 @@
+# Declarative register maps
+#
+# A RegisterMap describes the registers of one device family: address,
+# size in bytes, byte order, signedness and named bitfields. Maps are built
+# from a dict (or a JSON file) of the form
+#
+#   {"registers": [
+#       {"name": "system_status", "address": 0x1000, "size": 2,
+#        "fields": {"reset": 0, "ati_error": [1, 1], "power_mode": [4, 2]}},
+#       ...]}
+#
+# where a field is a bit offset or [bit offset, width]. Fields are read as
+# "register" for the whole register or "register.field".
+
+import json
+import struct
+from dataclasses import dataclass
+from typing import Literal
+
+from azo_ki.azo_ki import (
+    IQS7220A,
+    IQS7320A,
+    IQS9320_I2C,
+    IQS9320_KS,
+    max_read_length,
+)
+
+FAMILIES = {
+    family.name: family for family in (IQS7220A, IQS7320A, IQS9320_I2C, IQS9320_KS)
+}
+
+# struct formats of the register sizes with a native integer type
+INTEGER_FORMATS = {1: "b", 2: "h", 4: "i", 8: "q"}
+
+
+@dataclass(frozen=True)
+class Field:
+    name: str
+    offset: int
+    width: int = 1
+
+    @property
+    def mask(self):
+        return (1 << self.width) - 1
+
+
+class Register:
+    def __init__(
+        self,
+        name,
+        address,
+        size=2,
+        byteorder: Literal["little", "big"] = "little",
+        signed=False,
+        fields=(),
+    ):
+        if byteorder not in ("little", "big"):
+            raise ValueError("Unknown byte order : {}".format(byteorder))
+        self.name = name
+        self.address = address
+        self.size = size
+        self.byteorder: Literal["little", "big"] = byteorder
+        self.signed = signed
+        self.fields = {field.name: field for field in fields}
+        for field in self.fields.values():
+            if field.offset + field.width > 8 * size:
+                raise ValueError(
+                    "Field {}.{} does not fit the register".format(name, field.name)
+                )
+
+        # Compiled once, registers without an integer type are unpacked with
+        # int.from_bytes
+        self.struct = None
+        if size in INTEGER_FORMATS:
+            code = INTEGER_FORMATS[size]
+            self.struct = struct.Struct(
+                ("<" if byteorder == "little" else ">")
+                + (code if signed else code.upper())
+            )
+
+    def __repr__(self):
+        return "Register({!r}, {:#x}, {})".format(self.name, self.address, self.size)
+
+    def decode(self, data, offset=0):
+        if self.struct is not None:
+            return self.struct.unpack_from(data, offset)[0]
+        return int.from_bytes(
+            data[offset : offset + self.size], self.byteorder, signed=self.signed
+        )
+
+    def encode(self, value):
+        if self.struct is not None:
+            return self.struct.pack(value)
+        return value.to_bytes(self.size, self.byteorder, signed=self.signed)
+
+    def field_value(self, value, field):
+        return (value >> field.offset) & field.mask
+
+    def with_field(self, value, field, field_value):
+        if not 0 <= field_value <= field.mask:
+            raise ValueError(
+                "Value {} does not fit {}.{}".format(field_value, self.name, field.name)
+            )
+        value &= ~(field.mask << field.offset)
+        return value | (field_value << field.offset)
+
+
+@dataclass(frozen=True)
+class Burst:
+    # One read covering registers from register_addr, each decoded at its
+    # byte offset in the response
+    register_addr: int
+    num_bytes: int
+    registers: tuple
+
+
+class RegisterMap:
+    def __init__(self, family, registers, max_gap=8):
+        self.family = FAMILIES[family] if isinstance(family, str) else family
+        # Bytes read in between two registers rather than splitting a burst
+        self.max_gap = max_gap
+        self.registers = {}
+        self.by_address = {}
+        for register in registers:
+            if register.name in self.registers:
+                raise ValueError("Duplicate register : {}".format(register.name))
+            self.registers[register.name] = register
+            self.by_address[register.address] = register
+        self.plans = {}
+
+    @classmethod
+    def from_dict(cls, family, spec, **kwargs):
+        registers = []
+        for entry in spec["registers"]:
+            fields = []
+            for name, position in entry.get("fields", {}).items():
+                if isinstance(position, int):
+                    position = [position]
+                fields.append(Field(name, *position))
+            registers.append(
+                Register(
+                    entry["name"],
+                    entry["address"],
+                    entry.get("size", 2),
+                    entry.get("byteorder", "little"),
+                    entry.get("signed", False),
+                    fields,
+                )
+            )
+        return cls(family, registers, **kwargs)
+
+    @classmethod
+    def load(cls, family, path, **kwargs):
+        with open(path) as f:
+            return cls.from_dict(family, json.load(f), **kwargs)
+
+    def __getitem__(self, name):
+        return self.registers[name]
+
+    def __contains__(self, name):
+        return name in self.registers
+
+    def lookup(self, name):
+        # (Register, Field or None) of "register" or "register.field"
+        register_name, _, field_name = name.partition(".")
+        try:
+            register = self.registers[register_name]
+        except KeyError:
+            raise KeyError("Unknown register : {}".format(register_name)) from None
+        if not field_name:
+            return register, None
+        try:
+            return register, register.fields[field_name]
+        except KeyError:
+            raise KeyError("Unknown field : {}".format(name)) from None
+
+    # ------------------------------------
+    # Read planning and decoding
+    # ------------------------------------
+
+    def span(self, register):
+        # Register addresses a register covers
+        per_address = self.family.bytes_per_address
+        return -(-register.size // per_address)
+
+    def plan(self, names):
+        # The fewest contiguous burst reads covering the named fields, plans
+        # are cached per field list
+        key = tuple(names)
+        plan = self.plans.get(key)
+        if plan is not None:
+            return plan
+        per_address = self.family.bytes_per_address
+        max_bytes = max_read_length(self.family)
+        registers = sorted(
+            {self.lookup(name)[0] for name in names}, key=lambda r: r.address
+        )
+        bursts = []
+        start = end = 0
+        members = []
+        for register in registers:
+            register_end = register.address + self.span(register)
+            if members:
+                gap = (register.address - end) * per_address
+                size = (max(end, register_end) - start) * per_address
+                if gap <= self.max_gap and size <= max_bytes:
+                    end = max(end, register_end)
+                    members.append(register)
+                    continue
+                bursts.append(self.__burst(start, end, members))
+            start, end, members = register.address, register_end, [register]
+        if members:
+            bursts.append(self.__burst(start, end, members))
+        plan = self.plans[key] = tuple(bursts)
+        return plan
+
+    def __burst(self, start, end, registers):
+        per_address = self.family.bytes_per_address
+        if (end - start) * per_address > max_read_length(self.family):
+            raise ValueError(
+                "Register {} is longer than a single read".format(registers[0].name)
+            )
+        offsets = tuple(
+            (register, (register.address - start) * per_address)
+            for register in registers
+        )
+        return Burst(start, (end - start) * per_address, offsets)
+
+    def decode(self, names, responses):
+        # {name: value} from the responses to plan(names), in plan order
+        values = {}
+        for burst, data in zip(self.plan(names), responses):
+            for register, offset in burst.registers:
+                values[register.name] = register.decode(data, offset)
+        return self.__select(names, values)
+
+    def __select(self, names, values):
+        out = {}
+        for name in names:
+            register, field = self.lookup(name)
+            value = values[register.name]
+            out[name] = value if field is None else register.field_value(value, field)
+        return out
+
+    def read_fields(self, ki, names, device_select=0, device_addr=None):
+        # Read the named registers/fields of one device in as few reads as
+        # possible, e.g. map.read_fields(ki, ["system_status.reset", "counts"])
+        family = self.family
+        if device_addr is None:
+            device_addr = ki.device_address
+        responses = [
+            ki._i2c_read_single(
+                family,
+                device_select,
+                device_addr,
+                burst.register_addr,
+                burst.num_bytes,
+                "bytes",
+            )
+            for burst in self.plan(names)
+        ]
+        return self.decode(names, responses)
+
+    def read_fields_multi(self, ki, names, device_addr=None):
+        # {name: [value per device]} using the *_i2c_read_multi commands, the
+        # devices are device_addr (a list) for IQS9320 I2C and the whole
+        # matrix otherwise
+        family = self.family
+        if device_addr is None:
+            device_addr = ki.device_address
+        num_devices = len(device_addr) if family.address_list else ki.num_devices
+        values = {name: [] for name in names}
+        plan = self.plan(names)
+        responses = [
+            ki._i2c_read_multi(
+                family, device_addr, burst.register_addr, burst.num_bytes, "bytes"
+            )
+            for burst in plan
+        ]
+        for device in range(num_devices):
+            device_responses = [
+                data[device * burst.num_bytes : (device + 1) * burst.num_bytes]
+                for burst, data in zip(plan, responses)
+            ]
+            for name, value in self.decode(names, device_responses).items():
+                values[name].append(value)
+        return values
+
+    # ------------------------------------
+    # Encoding
+    # ------------------------------------
+
+    def encode(self, name, value, current=None):
+        # Register bytes for a register value, or for a field value merged
+        # into the current register value
+        register, field = self.lookup(name)
+        if field is not None:
+            if current is None:
+                raise ValueError("Writing a field needs the current register value")
+            value = register.with_field(current, field, value)
+        return register.encode(value)
+
+    def write_fields(self, ki, values, device_select=0, device_addr=None):
+        # Write registers and fields of one device, fields are merged into
+        # the register's current value (read in one planned pass)
+        family = self.family
+        if device_addr is None:
+            device_addr = ki.device_address
+        partial = [name for name in values if self.lookup(name)[1] is not None]
+        current = {}
+        if partial:
+            registers = sorted({self.lookup(name)[0].name for name in partial})
+            current = self.read_fields(ki, registers, device_select, device_addr)
+        for name, value in values.items():
+            register, field = self.lookup(name)
+            if field is None:
+                current[register.name] = value
+            else:
+                current[register.name] = register.with_field(
+                    current[register.name], field, value
+                )
+        for name in dict.fromkeys(self.lookup(name)[0].name for name in values):
+            register = self.registers[name]
+            ki._i2c_write_single(
+                family,
+                device_select,
+                device_addr,
+                register.address,
+                register.encode(current[name]),
+            )
@@ -0,0 +1,51 @@
+import time
+from dataclasses import dataclass
+
+from azo_ki.azo_ki import KeyboardInterfaceBase
+
+_commands = KeyboardInterfaceBase.commands
+
+# Commands that are not retried by default, the link is gone after the ack
+NOT_RETRIED = frozenset([_commands.cmd_stop_serial_comms])
+
+# Commands without side effects on the devices
+READ_COMMANDS = frozenset(
+    command
+    for command in _commands
+    if command.name.endswith(("_ks", "_read_single", "_read_multi"))
+    and "stream" not in command.name
+) | {_commands.cmd_setup, _commands.cmd_stop_streaming}
+
+
+@dataclass
+class RetryPolicy:
+    # Recovery for KeyboardInterface(retry_policy=...). After a failed
+    # transaction the link is flushed, streaming is stopped if stale stream
+    # data was seen, and the command is sent again after the backoff. The
+    # error is raised once retries are exhausted. Only commands without side
+    # effects are retried unless retry_writes is set: a write whose response
+    # was lost may already have been applied, which matters for registers
+    # with side effects (e.g. write-1-to-clear).
+    retries: int = 3
+    backoff: float = 0.005
+    backoff_factor: float = 2.0
+    max_backoff: float = 0.25
+    retry_writes: bool = False
+    # Stop streaming when more than this many unexpected bytes were discarded
+    stale_stream_bytes: int = 16
+
+    def retries_command(self, command):
+        if command in NOT_RETRIED:
+            return False
+        return self.retry_writes or command in READ_COMMANDS
+
+    def delay(self, attempt):
+        # Backoff before retry attempt 1, 2, ...
+        return min(
+            self.backoff * self.backoff_factor ** (attempt - 1), self.max_backoff
+        )
+
+    def sleep(self, attempt):
+        delay = self.delay(attempt)
+        if delay > 0:
+            time.sleep(delay)
@@ -0,0 +1,403 @@
+# Host-side polling of registers at several rates
+#
+# The stream commands sample one register list at one report interval. A
+# PollScheduler instead takes any number of jobs, each a set of registers
+# read from a set of devices every period seconds, and polls them with the
+# *_i2c_read_* commands. Jobs falling due together are served by one read
+# plan: their registers are merged into the fewest burst reads and each burst
+# is read from every device that needs it with a single *_i2c_read_multi.
+# Plans are computed once per combination of due jobs.
+
+import math
+import time
+from dataclasses import dataclass, field
+
+from azo_ki.azo_ki import max_read_length
+from azo_ki.config import DEVICE_FAMILIES
+from azo_ki.framing import MAX_COMMAND_LENGTH
+from azo_ki.timing import StreamTiming
+
+# Stream methods of each family, the report interval is a single byte
+STREAM_METHODS = {
+    "iqs7220a": "iqs7220a_stream_i2c_read_multi",
+    "iqs7320a": "iqs7320a_stream_i2c_read_multi",
+    "iqs9320_i2c": "iqs9320_stream_i2c_read_multi",
+    "iqs9320_ks": "iqs9320_ks_stream_i2c_read_multi",
+}
+MAX_REPORT_INTERVAL_MS = 0xFF
+
+
+@dataclass
+class PollJob:
+    name: str
+    # [(register_addr, num_bytes)]
+    registers: list
+    # Device addresses for IQS9320 I2C, device selects otherwise
+    devices: list
+    period: float
+    callback: object = None
+    next_due: float = 0.0
+    samples: int = 0
+    # Samples completed after their deadline (the next due time)
+    missed: int = 0
+    # Due times passed over entirely because the scheduler fell behind
+    skipped: int = 0
+    max_latency: float = 0.0
+    # {register_addr: [bytes per device]} of the last sample
+    last: dict = field(default_factory=dict)
+    timing: StreamTiming = field(init=False)
+
+    def __post_init__(self):
+        self.timing = StreamTiming(self.period * 1000)
+
+
+@dataclass(frozen=True)
+class PollRead:
+    # One frame: a burst read from one device (single) or several (multi)
+    register_addr: int
+    num_bytes: int
+    devices: tuple
+    multi: bool
+
+
+def merge_ranges(ranges, max_gap, max_length):
+    # Sorted (start, end) byte ranges merged where less than max_gap bytes
+    # apart, without exceeding max_length
+    merged = []
+    for start, end in sorted(ranges):
+        if (
+            merged
+            and start - merged[-1][1] <= max_gap
+            and max(end, merged[-1][1]) - merged[-1][0] <= max_length
+        ):
+            merged[-1][1] = max(end, merged[-1][1])
+            continue
+        merged.append([start, end])
+    return merged
+
+
+class PollPlan:
+    # Reads serving a set of jobs, and where each job's registers are found
+    # in the responses
+
+    def __init__(self, family, jobs, num_devices, max_gap):
+        self.family = family
+        per_address = family.bytes_per_address
+        max_length = max_read_length(family)
+
+        ranges = set()
+        for job in jobs:
+            for register_addr, num_bytes in job.registers:
+                start = register_addr * per_address
+                ranges.add((start, start + num_bytes))
+        bursts = merge_ranges(ranges, max_gap, max_length)
+
+        # Devices needing each burst
+        needed = [set() for _ in bursts]
+        for job in jobs:
+            for register_addr, num_bytes in job.registers:
+                start = register_addr * per_address
+                i = self.__burst_index(bursts, start, start + num_bytes)
+                needed[i].update(job.devices)
+
+        self.reads = []
+        for (start, end), devices in zip(bursts, needed):
+            devices = tuple(sorted(devices))
+            multi = len(devices) > 1
+            if multi and not family.address_list:
+                # The matrix read_multi reads every device
+                devices = tuple(range(num_devices))
+            self.reads.append(
+                PollRead(start // per_address, end - start, devices, multi)
+            )
+
+        # {job name: [(register_addr, num_bytes, [(read index, byte offset)
+        # per device])]}
+        self.layout = {}
+        for job in jobs:
+            entries = []
+            for register_addr, num_bytes in job.registers:
+                start = register_addr * per_address
+                i = self.__burst_index(bursts, start, start + num_bytes)
+                read = self.reads[i]
+                offset = start - read.register_addr * per_address
+                positions = [
+                    (i, read.devices.index(device) * read.num_bytes + offset)
+                    for device in job.devices
+                ]
+                entries.append((register_addr, num_bytes, positions))
+            self.layout[job.name] = entries
+
+    @staticmethod
+    def __burst_index(bursts, start, end):
+        for i, (burst_start, burst_end) in enumerate(bursts):
+            if burst_start <= start and end <= burst_end:
+                return i
+        raise ValueError("Register range is longer than a single read")
+
+    @property
+    def frames(self):
+        return len(self.reads)
+
+    def execute(self, ki, device_addr):
+        family = self.family
+        responses = []
+        for read in self.reads:
+            if read.multi:
+                addr = list(read.devices) if family.address_list else device_addr
+                data = ki._i2c_read_multi(
+                    family, addr, read.register_addr, read.num_bytes, "bytes"
+                )
+            elif family.address_list:
+                data = ki._i2c_read_single(
+                    family,
+                    None,
+                    read.devices[0],
+                    read.register_addr,
+                    read.num_bytes,
+                    "bytes",
+                )
+            else:
+                data = ki._i2c_read_single(
+                    family,
+                    read.devices[0],
+                    device_addr,
+                    read.register_addr,
+                    read.num_bytes,
+                    "bytes",
+                )
+            responses.append(data)
+        return responses
+
+    def values(self, job, responses):
+        # {register_addr: [bytes per device]} of one job
+        return {
+            register_addr: [
+                bytes(responses[i][offset : offset + num_bytes])
+                for i, offset in positions
+            ]
+            for register_addr, num_bytes, positions in self.layout[job.name]
+        }
+
+
+class PollScheduler:
+    # e.g.
+    #   scheduler = PollScheduler(ki)
+    #   scheduler.add("counts", {0x1000: 4}, [0x30, 0x32], period=0.005)
+    #   scheduler.add("diagnostics", {0x2000: 8}, [0x30, 0x32], period=1.0)
+    #   scheduler.run(duration=10)
+    #   print(scheduler.report())
+    #
+    # Jobs due within merge_window seconds of each other are read together.
+
+    def __init__(
+        self, ki, family=None, device_addr=None, max_gap=8, merge_window=0.001
+    ):
+        self.ki = ki
+        if family is None:
+            family = DEVICE_FAMILIES[ki.device]
+        self.family = family
+        if device_addr is None:
+            device_addr = ki.device_address
+        self.device_addr = device_addr
+        self.max_gap = max_gap
+        self.merge_window = merge_window
+        self.jobs = {}
+        self.plans = {}
+        self.frames = 0
+        self.cycles = 0
+
+    def add(self, name, registers, devices=None, period=1.0, callback=None):
+        # registers is {register_addr: num_bytes} or [(register_addr, num_bytes)],
+        # callback(name, values, receive_time) is called with each sample
+        if name in self.jobs:
+            raise ValueError("Duplicate job : {}".format(name))
+        if period <= 0:
+            raise ValueError("period must be positive")
+        if isinstance(registers, dict):
+            registers = registers.items()
+        if devices is None:
+            if self.family.address_list:
+                devices = self.device_addr
+                if devices is None:
+                    raise ValueError(
+                        "No device addresses for job {}, pass devices".format(name)
+                    )
+                if isinstance(devices, int):
+                    devices = [devices]
+            else:
+                devices = range(self.ki.num_devices)
+        job = PollJob(name, sorted(registers), list(devices), period, callback)
+        self.jobs[name] = job
+        self.plans.clear()
+        return job
+
+    def remove(self, name):
+        del self.jobs[name]
+        self.plans.clear()
+
+    def plan(self, names):
+        # Read plan of a set of jobs, cached
+        key = frozenset(names)
+        plan = self.plans.get(key)
+        if plan is None:
+            jobs = [self.jobs[name] for name in sorted(key)]
+            plan = self.plans[key] = PollPlan(
+                self.family, jobs, self.ki.num_devices, self.max_gap
+            )
+        return plan
+
+    # ------------------------------------
+    # Planning
+    # ------------------------------------
+
+    def hyperperiod(self):
+        # Seconds after which the pattern of due jobs repeats, None if the
+        # periods are not whole microseconds
+        jobs = list(self.jobs.values())
+        periods = [round(job.period * 1e6) for job in jobs]
+        for period, job in zip(periods, jobs):
+            if abs(period / 1e6 - job.period) > 1e-9:
+                return None
+        return math.lcm(*periods) / 1e6
+
+    def schedule(self):
+        # [(time, jobs due)] over one hyperperiod, and the frames it takes
+        hyperperiod = self.hyperperiod()
+        if hyperperiod is None:
+            raise ValueError("Job periods have no common multiple")
+        events = {}
+        for job in self.jobs.values():
+            for i in range(round(hyperperiod / job.period)):
+                events.setdefault(round(i * job.period, 9), []).append(job.name)
+        slots = sorted(events.items())
+        frames = sum(self.plan(names).frames for _, names in slots)
+        return slots, frames
+
+    def frame_rates(self):
+        # (frames per second of the merged plan, frames per second polling
+        # each job on its own)
+        hyperperiod = self.hyperperiod()
+        if hyperperiod is None:
+            raise ValueError("Job periods have no common multiple")
+        _, frames = self.schedule()
+        separate = sum(
+            self.plan([job.name]).frames * hyperperiod / job.period
+            for job in self.jobs.values()
+        )
+        return frames / hyperperiod, separate / hyperperiod
+
+    def stream_args(self):
+        # Arguments of the family's *_stream_i2c_read_multi method sampling
+        # every job, when one firmware stream can replace polling: a single
+        # period in whole milliseconds, at most 255 ms. None otherwise.
+        periods = {job.period for job in self.jobs.values()}
+        if len(periods) != 1:
+            return None
+        interval_ms = periods.pop() * 1000
+        if (
+            interval_ms != round(interval_ms)
+            or not 0 < interval_ms <= MAX_REPORT_INTERVAL_MS
+        ):
+            return None
+        registers = {}
+        devices = set()
+        for job in self.jobs.values():
+            registers.update(job.registers)
+            devices.update(job.devices)
+        per_register = 1 + self.family.address_width
+        header = 4 + (len(devices) if self.family.address_list else 0)
+        if header + per_register * len(registers) > MAX_COMMAND_LENGTH:
+            return None
+        register_addr = sorted(registers)
+        num_bytes = [registers[addr] for addr in register_addr]
+        if self.family.address_list:
+            return [int(interval_ms), sorted(devices), register_addr, num_bytes]
+        return [int(interval_ms), register_addr, num_bytes, self.device_addr]
+
+    def start_stream(self):
+        # Start the firmware stream from stream_args(), returns the stream
+        # configuration or None if the jobs need polling
+        args = self.stream_args()
+        if args is None:
+            return None
+        getattr(self.ki, STREAM_METHODS[self.family.name])(*args)
+        return self.ki.stream_config
+
+    # ------------------------------------
+    # Polling
+    # ------------------------------------
+
+    def start(self, now=None):
+        if now is None:
+            now = time.monotonic()
+        for job in self.jobs.values():
+            job.next_due = now
+
+    def step(self, now=None):
+        # Read the jobs that are due, returns their names
+        if now is None:
+            now = time.monotonic()
+        due = [
+            job for job in self.jobs.values() if job.next_due <= now + self.merge_window
+        ]
+        if not due:
+            return []
+        plan = self.plan([job.name for job in due])
+        responses = plan.execute(self.ki, self.device_addr)
+        done = time.monotonic()
+        self.frames += plan.frames
+        self.cycles += 1
+
+        for job in due:
+            job.samples += 1
+            job.max_latency = max(job.max_latency, done - job.next_due)
+            job.timing.update(1, done)
+            job.next_due += job.period
+            if done > job.next_due:
+                job.missed += 1
+                # Drop the due times already passed instead of catching up
+                behind = math.floor((done - job.next_due) / job.period)
+                job.skipped += behind
+                job.next_due += behind * job.period
+            job.last = plan.values(job, responses)
+            if job.callback is not None:
+                job.callback(job.name, job.last, done)
+        return [job.name for job in due]
+
+    def next_due(self):
+        return min(job.next_due for job in self.jobs.values())
+
+    def run(self, duration=None, cycles=None):
+        # Poll until duration seconds have passed or cycles plans have run
+        if duration is None and cycles is None:
+            raise ValueError("Either duration or cycles is required")
+        start = time.monotonic()
+        self.start(start)
+        deadline = None if duration is None else start + duration
+        count = 0
+        while cycles is None or count < cycles:
+            wait = self.next_due() - time.monotonic()
+            if deadline is not None and time.monotonic() + max(wait, 0) >= deadline:
+                break
+            if wait > 0:
+                time.sleep(wait)
+            if self.step():
+                count += 1
+        return count
+
+    def report(self):
+        out = {"frames": self.frames, "cycles": self.cycles, "jobs": {}}
+        for job in self.jobs.values():
+            mean = job.timing.mean_interval
+            out["jobs"][job.name] = {
+                "period_s": job.period,
+                "target_hz": 1 / job.period,
+                "achieved_hz": 1 / mean if mean else None,
+                "samples": job.samples,
+                "missed": job.missed,
+                "skipped": job.skipped,
+                "max_latency_s": job.max_latency,
+                "p99_jitter_s": job.timing.jitter_percentile(99),
+            }
+        return out
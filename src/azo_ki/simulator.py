@@ -0,0 +1,266 @@
+import struct
+import time
+
+from azo_ki.azo_ki import KeyboardInterfaceBase
+from azo_ki.crc import crc16
+from azo_ki.framing import GENERIC_RETURN, PACKET_BYTE_A, PACKET_BYTE_B
+
+cmd = KeyboardInterfaceBase.commands
+
+SOF = bytes([PACKET_BYTE_A, PACKET_BYTE_B])
+
+
+class SimulatedPico:
+    # In-memory Pico firmware model with the pyserial API. Frames are parsed
+    # and CRC checked, acknowledged and answered like the firmware does: key
+    # scan data, I2C register memory per device and the generic return.
+    # Stream commands produce samples from the same register memory, either
+    # on demand with stream() or in real time at the report interval.
+    # latency (seconds per frame) and baudrate throttle the link.
+
+    port = "sim"
+
+    def __init__(
+        self, num_devices=1, latency=0.0, baudrate=None, realtime_streams=False
+    ):
+        self.num_devices = num_devices
+        self.latency = latency
+        self.baudrate = baudrate
+        self.realtime_streams = realtime_streams
+        self.timeout = 0.5
+        self.rx = bytearray()
+        self.tx = bytearray()
+        self.frames = []
+        self.crc_errors = 0
+        # Register memory per device key (device select or device address),
+        # registers are 16-bit words so register n is at byte offset 2n
+        self.memory = {}
+        self.ks_data = {}
+        # Bytes sent before every response, to exercise resynchronisation
+        self.noise = b""
+        # Hold back this many responses and send them in reverse order
+        self.reorder = 0
+        self.held = []
+        # Active stream: (report interval in seconds, sample function)
+        self.active_stream = None
+        self.stream_start = 0.0
+        self.samples_sent = 0
+
+    # ------------------------------------
+    # pyserial API
+    # ------------------------------------
+
+    def write(self, data):
+        self.__throttle(len(data))
+        self.rx += bytes(data)
+        self.__process()
+        return len(data)
+
+    def read(self, size=1):
+        deadline = time.monotonic() + (self.timeout or 0)
+        self.__stream_due()
+        while len(self.tx) < size and self.__waiting_for_stream(deadline):
+            self.__stream_due()
+        data = bytes(self.tx[:size])
+        # Only what was taken, tx may have grown from another thread since
+        del self.tx[: len(data)]
+        self.__throttle(len(data))
+        return data
+
+    def read_all(self):
+        return self.read(self.in_waiting)
+
+    @property
+    def in_waiting(self):
+        self.__stream_due()
+        return len(self.tx)
+
+    def reset_input_buffer(self):
+        self.tx.clear()
+
+    def close(self):
+        pass
+
+    def __throttle(self, num_bytes):
+        # 10 bits per byte on the wire (start, 8 data, stop)
+        if self.baudrate and num_bytes:
+            time.sleep(num_bytes * 10 / self.baudrate)
+
+    # ------------------------------------
+    # Firmware model
+    # ------------------------------------
+
+    def device_memory(self, key):
+        if key not in self.memory:
+            self.memory[key] = bytearray(0x20000)
+        return self.memory[key]
+
+    def __process(self):
+        while len(self.rx) >= 4:
+            start = self.rx.find(SOF)
+            if start < 0:
+                del self.rx[:-1]
+                return
+            del self.rx[:start]
+            if len(self.rx) < 3:
+                return
+            length = self.rx[2]
+            end = 3 + length + 4
+            if len(self.rx) < end:
+                return
+            frame = bytes(self.rx[:end])
+            body = frame[3 : 3 + length]
+            crc = frame[3 + length] | (frame[4 + length] << 8)
+            if crc != crc16(body) or frame[-2:] != SOF:
+                # The firmware drops corrupt frames without an ack
+                self.crc_errors += 1
+                del self.rx[:2]
+                continue
+            del self.rx[:end]
+            self.frames.append(body)
+            if self.latency:
+                time.sleep(self.latency)
+            command_id, command = body[0], body[1]
+            response = self.noise + SOF + bytes([command_id, command]) + SOF
+            response += self.respond(command, body[2:])
+            if self.reorder:
+                self.held.append(response)
+                if len(self.held) >= self.reorder:
+                    self.tx += b"".join(reversed(self.held))
+                    self.held.clear()
+            else:
+                self.tx += response
+
+    def respond(self, command, args):
+        if command == cmd.cmd_setup:
+            self.num_devices = max(1, args[1] * args[2])
+            self.active_stream = None
+            return b""
+        if command == cmd.cmd_stop_streaming:
+            self.active_stream = None
+            return b""
+        if command == cmd.cmd_stop_serial_comms:
+            return b""
+        if command in (cmd.cmd_iqs7220a_ks, cmd.cmd_iqs7320a_ks, cmd.cmd_iqs9320_ks):
+            return self.key_scan(command)
+        if command in (
+            cmd.cmd_iqs7320a_autonomous_mode,
+            cmd.cmd_iqs7320a_standby_mode,
+            cmd.cmd_iqs9320_ks_standby,
+        ):
+            return GENERIC_RETURN
+
+        name = cmd(command).name
+        if "stream" in name:
+            self.start_stream(command, name, args)
+            return GENERIC_RETURN
+        keys, register, size, data = self.__parse_access(name, args)
+        if "write" in name:
+            for key in keys:
+                self.device_memory(key)[register : register + size] = data
+            return GENERIC_RETURN
+        return b"".join(self.read_memory(key, register, size) for key in keys)
+
+    def key_scan(self, command):
+        if command == cmd.cmd_iqs9320_ks:
+            return bytes(self.ks_data.get(command, bytes(self.num_devices * 3)))
+        return bytes(self.ks_data.get(command, bytes(self.num_devices)))
+
+    def read_memory(self, key, register, size):
+        return bytes(self.device_memory(key)[register : register + size])
+
+    def __parse_access(self, name, args):
+        # (device keys, byte offset, size, data) of an I2C register access
+        wide = "iqs9320" in name
+        if "single" in name:
+            if name.startswith("cmd_iqs9320_i2c"):
+                keys, args = [args[0]], args[1:]
+            else:
+                keys, args = [args[0]], args[2:]
+        elif name.startswith("cmd_iqs9320_i2c"):
+            keys, args = list(args[1 : 1 + args[0]]), args[1 + args[0] :]
+        else:
+            keys, args = list(range(self.num_devices)), args[1:]
+        if wide:
+            register, args = struct.unpack_from("<H", args)[0], args[2:]
+        else:
+            register, args = args[0], args[1:]
+        return keys, register * 2, args[0], args[1:]
+
+    # ------------------------------------
+    # Streaming
+    # ------------------------------------
+
+    def start_stream(self, command, name, args):
+        interval = args[0] / 1000
+        if "stream_ks" in name:
+            scan = {
+                cmd.cmd_iqs7220a_stream_ks: cmd.cmd_iqs7220a_ks,
+                cmd.cmd_iqs7320a_stream_ks: cmd.cmd_iqs7320a_ks,
+                cmd.cmd_iqs9320_ks_stream_ks: cmd.cmd_iqs9320_ks,
+            }[command]
+
+            def sample():
+                return self.key_scan(scan)
+
+        else:
+            args = args[1:]
+            if "single" in name:
+                if name.startswith("cmd_iqs9320_stream"):
+                    keys, args = [args[0]], args[2:]
+                else:
+                    keys, args = [args[0]], args[3:]
+            elif name.startswith("cmd_iqs9320_stream"):
+                keys, args = list(args[1 : 1 + args[0]]), args[1 + args[0] + 1 :]
+            else:
+                keys, args = list(range(self.num_devices)), args[2:]
+            # Register list followed by the read lengths
+            count = len(args) // (3 if "iqs9320" in name else 2)
+            if "iqs9320" in name:
+                registers = struct.unpack_from("<{}H".format(count), args)
+            else:
+                registers = args[:count]
+            sizes = args[-count:]
+            layout = [(r * 2, size) for r, size in zip(registers, sizes)]
+
+            # Register-major: all devices for a register, then the next one
+            def sample():
+                return b"".join(
+                    self.read_memory(key, register, size)
+                    for register, size in layout
+                    for key in keys
+                )
+
+        self.active_stream = (interval, sample)
+        self.stream_start = time.monotonic()
+        self.samples_sent = 0
+
+    def stream(self, num_samples=1):
+        # Send num_samples of the active stream
+        if self.active_stream is None:
+            return
+        sample = self.active_stream[1]
+        for _ in range(num_samples):
+            self.tx += sample()
+        self.samples_sent += num_samples
+
+    def __stream_due(self):
+        if not self.realtime_streams or self.active_stream is None:
+            return
+        interval = self.active_stream[0]
+        elapsed = time.monotonic() - self.stream_start
+        due = int(elapsed / interval) if interval else self.samples_sent + 1
+        if due > self.samples_sent:
+            self.stream(due - self.samples_sent)
+
+    def __waiting_for_stream(self, deadline):
+        # Sleep until the next sample is due, False once the read timed out
+        if not self.realtime_streams or self.active_stream is None:
+            return False
+        now = time.monotonic()
+        if now >= deadline:
+            return False
+        interval = self.active_stream[0]
+        due = self.stream_start + (self.samples_sent + 1) * interval
+        time.sleep(max(0.0, min(due, deadline) - now))
+        return True
@@ -0,0 +1,316 @@
+import threading
+import time
+from dataclasses import dataclass
+
+from azo_ki.errors import KeyboardInterfaceError
+from azo_ki.timing import StreamTiming
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+
+def require_numpy():
+    # The numpy module, for code that only needs it once it decodes samples
+    if numpy is None:
+        raise ImportError("numpy is required for stream decoding: pip install numpy")
+    return numpy
+
+
+# Little-endian unsigned field types by register width
+FIELD_TYPES = {1: "u1", 2: "<u2", 4: "<u4", 8: "<u8"}
+
+
+def key_scan_field(num_bytes, num_devices):
+    # Key scan samples are one "ks" field holding every device's bytes
+    shape = (num_devices,) if num_bytes == 1 else (num_devices, num_bytes)
+    return ("ks", "u1", shape)
+
+
+@dataclass
+class StreamConfig:
+    # The stream a *_stream_* command started. Key scan streams have no
+    # register list and num_bytes holds the key scan bytes per device.
+    command: int
+    report_interval_ms: int
+    num_bytes: list
+    devices: list
+    register_addr: list | None = None
+
+    def __post_init__(self):
+        self.num_bytes = list(self.num_bytes)
+        self.devices = list(self.devices)
+        if self.register_addr is not None:
+            self.register_addr = list(self.register_addr)
+
+    @property
+    def sample_size(self):
+        # Bytes per sample, every register for every device
+        return sum(self.num_bytes) * len(self.devices)
+
+    @property
+    def bytes_per_second(self):
+        if not self.report_interval_ms:
+            return float("inf")
+        return self.sample_size * 1000 / self.report_interval_ms
+
+    def decoder(self) -> "StreamDecoder":
+        if self.register_addr is None:
+            (size,) = self.num_bytes
+            return KeyScanStreamDecoder(size, self.devices)
+        return StreamDecoder(self.register_addr, self.num_bytes, self.devices)
+
+
+class StreamDecoder:
+    def __init__(self, register_addr: list, num_bytes: list, devices: int | list = 1):
+        if len(register_addr) != len(num_bytes):
+            raise ValueError(
+                "Number of register addresses and read length is not equal"
+            )
+        if len(set(register_addr)) != len(register_addr):
+            raise ValueError("Duplicate register address in stream configuration")
+        self.register_addr = list(register_addr)
+        self.num_bytes = list(num_bytes)
+        # Either a device count or the list of device addresses streamed
+        if isinstance(devices, int):
+            devices = list(range(devices))
+        self.devices = list(devices)
+        self.num_devices = len(self.devices)
+
+        # Each sample is register-major: all devices for the first register,
+        # then all devices for the next register.
+        fields = []
+        for addr, size in zip(self.register_addr, self.num_bytes):
+            if size in FIELD_TYPES:
+                fields.append(
+                    (self.field_name(addr), FIELD_TYPES[size], (self.num_devices,))
+                )
+            else:
+                fields.append((self.field_name(addr), "u1", (self.num_devices, size)))
+        self._layout(fields)
+
+    def _layout(self, fields):
+        np = require_numpy()
+        self.dtype = np.dtype(fields)
+        self.frame_size = self.dtype.itemsize
+        # Samples tagged with the host receive time (time.monotonic())
+        self.timed_dtype = np.dtype([("time", "<f8"), *fields])
+        self.field_names = [name for name, *_ in fields]
+
+    @staticmethod
+    def field_name(register_addr):
+        return "{:#06x}".format(register_addr)
+
+    def decode(self, data):
+        # Structured array shaped [sample], each field shaped [sample, device]
+        np = require_numpy()
+        num_samples = len(data) // self.frame_size
+        return np.frombuffer(data, dtype=self.dtype, count=num_samples)
+
+    def decode_timed(self, data, receive_time):
+        np = require_numpy()
+        samples = self.decode(data)
+        timed = np.empty(len(samples), self.timed_dtype)
+        timed["time"] = receive_time
+        for name in self.field_names:
+            timed[name] = samples[name]
+        return timed
+
+    def decode_dict(self, data):
+        samples = self.decode(data)
+        return {addr: samples[self.field_name(addr)] for addr in self.register_addr}
+
+    def decode_array(self, data):
+        # Plain array shaped [sample, device, register], registers must be 1-8 bytes
+        if any(size not in FIELD_TYPES for size in self.num_bytes):
+            raise ValueError("Registers must be 1, 2, 4 or 8 bytes wide to stack")
+        np = require_numpy()
+        samples = self.decode(data)
+        dtype = np.dtype("u{}".format(max(self.num_bytes)))
+        out = np.empty((len(samples), self.num_devices, len(self.register_addr)), dtype)
+        for i, addr in enumerate(self.register_addr):
+            out[:, :, i] = samples[self.field_name(addr)]
+        return out
+
+    def read(self, ki, num_samples):
+        # Read num_samples complete samples in one bulk read
+        return self.decode(ki.read(num_samples * self.frame_size))
+
+
+class KeyScanStreamDecoder(StreamDecoder):
+    # Samples of a *_stream_ks stream, num_bytes key scan bytes per device
+    # in one "ks" field, the layout StreamCapture records them with.
+
+    def __init__(self, num_bytes: int, devices: int | list = 1):
+        self.register_addr = []
+        self.num_bytes = [num_bytes]
+        if isinstance(devices, int):
+            devices = list(range(devices))
+        self.devices = list(devices)
+        self.num_devices = len(self.devices)
+        self._layout([key_scan_field(num_bytes, self.num_devices)])
+
+    def decode_dict(self, data):
+        return {"ks": self.decode(data)["ks"]}
+
+    def decode_array(self, data):
+        # Plain array shaped [sample, device, byte]
+        samples = self.decode(data)
+        return samples["ks"].reshape(len(samples), self.num_devices, -1)
+
+
+class StreamReader:
+    # Samples carry a "time" field, the monotonic time of the read that
+    # received them. timing tracks the actual against the requested report
+    # interval, the interval of ki's active stream unless one is given.
+    # Without a decoder the layout of ki's active stream is used.
+
+    def __init__(
+        self,
+        ki,
+        decoder: StreamDecoder | None = None,
+        capacity=4096,
+        chunk_samples=64,
+        report_interval_ms=None,
+        gap_threshold=None,
+    ):
+        stream: StreamConfig | None = getattr(ki, "stream_config", None)
+        if decoder is None:
+            if stream is None:
+                raise ValueError("No decoder given and no stream active")
+            decoder = stream.decoder()
+        self.ki = ki
+        self.decoder = decoder
+        self.capacity = capacity
+        self.chunk_samples = chunk_samples
+
+        if report_interval_ms is None and stream is not None:
+            report_interval_ms = stream.report_interval_ms
+        self.timing = None
+        if report_interval_ms:
+            self.timing = StreamTiming(report_interval_ms, gap_threshold)
+        self.summary = None
+
+        # Preallocated ring of decoded samples
+        self.buffer = require_numpy().zeros(capacity, dtype=decoder.timed_dtype)
+        self.head = 0
+        self.count = 0
+        self.received = 0
+        self.overruns = 0
+        self.dropped = 0
+        self.error = None
+
+        self.__condition = threading.Condition()
+        self.__stop = threading.Event()
+        self.__thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    @property
+    def running(self):
+        return self.__thread is not None and self.__thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return self
+        self.__stop.clear()
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+        return self
+
+    def stop(self, stop_streaming=True):
+        # Returns the timing summary, also kept in summary
+        self.__stop.set()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+        if stop_streaming:
+            self.ki.stop_streaming()
+        if self.timing is not None:
+            self.summary = self.timing.summary()
+        return self.summary
+
+    def __run(self):
+        frame_size = self.decoder.frame_size
+        pending = bytearray()
+        try:
+            while not self.__stop.is_set():
+                # Drain whatever is waiting, at least one sample per read
+                available = len(pending) + self.ki.serial_conn.in_waiting
+                num_samples = max(1, min(available // frame_size, self.chunk_samples))
+                pending += self.ki.read(num_samples * frame_size - len(pending))
+                complete = len(pending) // frame_size * frame_size
+                if complete:
+                    receive_time = time.monotonic()
+                    self.__push(
+                        self.decoder.decode_timed(pending[:complete], receive_time),
+                        receive_time,
+                    )
+                    del pending[:complete]
+        except (KeyboardInterfaceError, OSError, ValueError) as e:
+            # Raised to the consumer by the next get() or poll()
+            self.error = e
+            with self.__condition:
+                self.__condition.notify_all()
+
+    def __push(self, samples, receive_time):
+        num_samples = len(samples)
+        with self.__condition:
+            self.received += num_samples
+            if self.timing is not None:
+                self.timing.update(num_samples, receive_time)
+
+            # Ring full, the oldest samples are overwritten
+            overflow = self.count + num_samples - self.capacity
+            if overflow > 0:
+                self.overruns += 1
+                self.dropped += overflow
+                metrics = getattr(self.ki, "metrics", None)
+                if metrics is not None:
+                    metrics.count_overrun(overflow)
+            if num_samples > self.capacity:
+                samples = samples[-self.capacity :]
+                num_samples = self.capacity
+
+            start = self.head
+            end = start + num_samples
+            if end <= self.capacity:
+                self.buffer[start:end] = samples
+            else:
+                split = self.capacity - start
+                self.buffer[start:] = samples[:split]
+                self.buffer[: end - self.capacity] = samples[split:]
+            self.head = end % self.capacity
+            self.count = min(self.count + num_samples, self.capacity)
+            self.__condition.notify_all()
+
+    def __pop(self, num_samples):
+        start = (self.head - self.count) % self.capacity
+        index = (start + require_numpy().arange(num_samples)) % self.capacity
+        self.count -= num_samples
+        return self.buffer[index]
+
+    def get(self, num_samples, timeout=None):
+        # Block until num_samples are available, returns fewer on timeout
+        if num_samples > self.capacity:
+            raise ValueError("Cannot get more samples than the ring capacity")
+        with self.__condition:
+            self.__condition.wait_for(
+                lambda: self.count >= num_samples or self.error is not None,
+                timeout,
+            )
+            if self.error is not None:
+                raise self.error
+            return self.__pop(min(num_samples, self.count))
+
+    def poll(self):
+        # Return all available samples without blocking
+        with self.__condition:
+            if self.error is not None:
+                raise self.error
+            return self.__pop(self.count)
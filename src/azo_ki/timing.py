@@ -0,0 +1,86 @@
+from collections import deque
+
+
+class StreamTiming:
+    # Host-side timing of a stream. Samples are tagged with the monotonic
+    # time of the read that completed them, so the samples of one read share
+    # a receive time and the interval of each is the read's average.
+    #
+    # jitter is the deviation of the actual from the requested interval,
+    # gaps are receive pauses longer than gap_threshold (default three report
+    # intervals), e.g. host GC pauses, and missing is the number of samples
+    # that should have arrived by the last receive time but did not.
+
+    def __init__(self, report_interval_ms, gap_threshold=None, window=4096):
+        self.interval = report_interval_ms / 1000
+        if gap_threshold is None:
+            gap_threshold = 3 * self.interval
+        self.gap_threshold = gap_threshold
+        # Jitter of the most recent reads as (jitter, samples)
+        self.recent = deque(maxlen=window)
+        self.count = 0
+        self.first_time = None
+        self.last_time = None
+        self.gaps = 0
+        self.max_gap = 0.0
+
+    def update(self, num_samples, receive_time):
+        if not num_samples:
+            return
+        if self.last_time is None:
+            self.first_time = receive_time
+            num_intervals = num_samples - 1
+        else:
+            num_intervals = num_samples
+            gap = receive_time - self.last_time
+            if gap > self.gap_threshold:
+                self.gaps += 1
+                self.max_gap = max(self.max_gap, gap)
+            jitter = gap / num_intervals - self.interval
+            self.recent.append((jitter, num_intervals))
+        self.count += num_samples
+        self.last_time = receive_time
+
+    @property
+    def elapsed(self):
+        if self.last_time is None:
+            return 0.0
+        return self.last_time - self.first_time
+
+    @property
+    def mean_interval(self):
+        if self.count < 2:
+            return None
+        return self.elapsed / (self.count - 1)
+
+    @property
+    def missing(self):
+        if not self.interval or self.count < 2:
+            return 0
+        return max(0, round(self.elapsed / self.interval) + 1 - self.count)
+
+    def jitter_percentile(self, p=99):
+        # Absolute jitter in seconds that p % of recent samples are within
+        values = sorted((abs(j), n) for j, n in self.recent)
+        total = sum(n for _, n in values)
+        if not total:
+            return None
+        target = p / 100 * total
+        seen = 0
+        for jitter, n in values:
+            seen += n
+            if seen >= target:
+                return jitter
+        return values[-1][0]
+
+    def summary(self):
+        return {
+            "samples": self.count,
+            "elapsed_s": self.elapsed,
+            "requested_interval_s": self.interval,
+            "mean_interval_s": self.mean_interval,
+            "p99_jitter_s": self.jitter_percentile(99),
+            "gaps": self.gaps,
+            "max_gap_s": self.max_gap,
+            "missing": self.missing,
+        }
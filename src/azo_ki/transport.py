@@ -0,0 +1,141 @@
+# Serial transports for KeyboardInterface(transport=...)
+#
+# A transport is any object with the pyserial subset used by the interface:
+# write(data), read(size), read_all(), in_waiting, timeout and close().
+# serial.Serial is used when no transport is given, SimulatedPico models the
+# firmware in memory, and the classes below record and replay a session.
+
+import json
+
+from azo_ki.errors import KeyboardInterfaceError
+
+
+class RecordingTransport:
+    # Pass-through transport that logs every write and non-empty read
+
+    def __init__(self, transport):
+        self.transport = transport
+        self.events = []
+
+    @property
+    def port(self):
+        return getattr(self.transport, "port", None)
+
+    @property
+    def timeout(self):
+        return self.transport.timeout
+
+    @timeout.setter
+    def timeout(self, value):
+        self.transport.timeout = value
+
+    @property
+    def in_waiting(self):
+        return self.transport.in_waiting
+
+    def write(self, data):
+        self.events.append(("w", bytes(data)))
+        return self.transport.write(data)
+
+    def read(self, size=1):
+        data = self.transport.read(size)
+        if data:
+            self.events.append(("r", bytes(data)))
+        return data
+
+    def read_all(self):
+        data = self.transport.read_all()
+        if data:
+            self.events.append(("r", bytes(data)))
+        return data
+
+    def close(self):
+        self.transport.close()
+
+    def save(self, path):
+        # One JSON object per line: {"w": hex} or {"r": hex}
+        with open(path, "w") as f:
+            f.writelines(
+                json.dumps({direction: data.hex()}) + "\n"
+                for direction, data in self.events
+            )
+
+
+def load_events(path):
+    events = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                ((direction, data),) = json.loads(line).items()
+                events.append((direction, bytes.fromhex(data)))
+    return events
+
+
+class ReplayTransport:
+    # Plays back a recorded session. Writes must match the recording (unless
+    # strict is False), the bytes read after a write become available once
+    # the write has been made.
+
+    port = "replay"
+
+    def __init__(self, events, strict=True):
+        if isinstance(events, str):
+            events = load_events(events)
+        self.events = list(events)
+        self.strict = strict
+        self.position = 0
+        self.buffer = bytearray()
+        self.timeout = 0.5
+        self.__release()
+
+    def __release(self):
+        # Queue the responses up to the next recorded write
+        while self.position < len(self.events):
+            direction, data = self.events[self.position]
+            if direction != "r":
+                break
+            self.buffer += data
+            self.position += 1
+
+    @property
+    def in_waiting(self):
+        return len(self.buffer)
+
+    @property
+    def done(self):
+        return self.position >= len(self.events) and not self.buffer
+
+    def write(self, data):
+        data = bytes(data)
+        pending = data
+        while pending:
+            if self.position >= len(self.events):
+                raise KeyboardInterfaceError(
+                    "Replay finished, unexpected write : {}".format(data.hex())
+                )
+            expected = self.events[self.position][1]
+            if self.strict and pending[: len(expected)] != expected[: len(pending)]:
+                raise KeyboardInterfaceError(
+                    "Replay mismatch at event {} : expected {}, written {}".format(
+                        self.position, expected.hex(), data.hex()
+                    )
+                )
+            if len(pending) < len(expected):
+                # Partial write of a recorded write
+                self.events[self.position] = ("w", expected[len(pending) :])
+                break
+            pending = pending[len(expected) :]
+            self.position += 1
+            self.__release()
+        return len(data)
+
+    def read(self, size=1):
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+    def read_all(self):
+        return self.read(len(self.buffer))
+
+    def close(self):
+        pass
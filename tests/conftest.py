@@ -0,0 +1,57 @@
+import pytest
+import serial
+
+import azo_ki.azo_ki
+from azo_ki import KeyboardInterface, SimulatedPico
+
+
+class FakePort:
+    device = "/dev/ttyFAKE0"
+    vid = 0x2E8A
+    pid = 0x000A
+    serial_number = "E6614C311B000000"
+
+    def __str__(self):
+        return self.device
+
+
+@pytest.fixture(autouse=True)
+def fresh_ports():
+    # Every test enumerates its own fake ports
+    azo_ki.azo_ki.clear_port_cache()
+    yield
+    azo_ki.azo_ki.clear_port_cache()
+    azo_ki.azo_ki.close_open_connections()
+
+
+@pytest.fixture
+def pico(monkeypatch):
+    fake = SimulatedPico()
+    monkeypatch.setattr(azo_ki.azo_ki.list_ports, "comports", lambda: [FakePort()])
+    monkeypatch.setattr(serial, "Serial", lambda *args, **kwargs: fake)
+    return fake
+
+
+@pytest.fixture
+def make_ki(pico):
+    def make(device=KeyboardInterface.device_select_e.device_iqs9320_i2c, **kwargs):
+        kwargs.setdefault("device_address", 0x30)
+        return KeyboardInterface(device, **kwargs)
+
+    return make
+
+
+@pytest.fixture
+def boards(monkeypatch):
+    # Four boards, each with its own fake Pico and 50 ms command latency
+    picos = {}
+    ports = []
+    for i in range(4):
+        port = FakePort()
+        port.device = "/dev/ttyFAKE{}".format(i)
+        port.serial_number = "E6614C311B00000{}".format(i)
+        ports.append(port)
+        picos[port.device] = SimulatedPico(latency=0.05)
+    monkeypatch.setattr(azo_ki.azo_ki.list_ports, "comports", lambda: ports)
+    monkeypatch.setattr(serial, "Serial", lambda device, **kwargs: picos[device])
+    return picos
@@ -0,0 +1,160 @@
+import multiprocessing
+import os
+import struct
+import time
+from multiprocessing import shared_memory
+
+import pytest
+
+from azo_ki import KeyboardInterface, SimulatedPico
+from azo_ki.acquisition import Acquisition, RingReader, SharedRing
+from azo_ki.stream import StreamConfig
+
+np = pytest.importorskip("numpy")
+
+STREAM = StreamConfig(
+    KeyboardInterface.commands.cmd_iqs9320_stream_i2c_read_multi,
+    5,
+    [4],
+    [0x30, 0x32],
+    [0x1000],
+)
+
+
+def samples(ring, start, count):
+    data = b"".join(struct.pack("<II", i, i + 1) for i in range(start, start + count))
+    return ring.decode(data, 1.0)
+
+
+@pytest.fixture
+def ring():
+    ring = SharedRing.create(STREAM, capacity=8)
+    yield ring
+    ring.close()
+    ring.unlink()
+
+
+def test_ring_readers_in_place(ring):
+    reader = RingReader(ring.name)
+    assert reader.ring.stream == STREAM
+    ring.publish(samples(ring, 0, 5))
+    records = reader.read()
+    assert records["0x1000"][:, 0].tolist() == [0, 1, 2, 3, 4]
+    assert records["time"].tolist() == [1.0] * 5
+    # A view into the shared block, not a copy
+    assert not records.flags.owndata and records.base is not None
+    assert reader.overwritten() == 0
+
+    # Wraps: the first read stops at the end of the ring
+    ring.publish(samples(ring, 5, 6))
+    assert reader.read()["0x1000"][:, 0].tolist() == [5, 6, 7]
+    assert reader.read()["0x1000"][:, 0].tolist() == [8, 9, 10]
+    assert len(reader.read()) == 0 and reader.lag == 0
+    del records
+    reader.close()
+
+
+def test_ring_lag_is_detected(ring):
+    reader = RingReader(ring, start="oldest")
+    ring.publish(samples(ring, 0, 4))
+    records = reader.read()
+    # The writer laps the records while they are in use
+    ring.publish(samples(ring, 4, 6))
+    assert reader.overwritten() == 2
+    ring.publish(samples(ring, 10, 10))
+    # 20 published, 8 kept: 6..11 were never read
+    assert reader.read()["0x1000"][0, 0] == 12
+    assert reader.dropped == 2 + 8
+    assert reader.received == 2 + 4
+    del records
+
+
+def make_ki():
+    pico = SimulatedPico(realtime_streams=True)
+    for addr in (0x30, 0x32):
+        pico.device_memory(addr)[0x2000:0x2004] = struct.pack("<I", addr)
+    return KeyboardInterface(
+        KeyboardInterface.device_select_e.device_iqs9320_i2c,
+        device_address=0x30,
+        transport=pico,
+    )
+
+
+def check_counts(records, queue):
+    if not (records["0x1000"] == [0x30, 0x32]).all():
+        queue.put("bad sample")
+    queue.put(len(records))
+
+
+def slow_consumer(records):
+    time.sleep(0.05)
+
+
+@pytest.mark.skipif(
+    "fork" not in multiprocessing.get_all_start_methods(), reason="needs fork"
+)
+def test_acquisition_processes():
+    context = multiprocessing.get_context("fork")
+    queue = context.Queue()
+    acquisition = Acquisition(
+        make_ki,
+        "iqs9320_stream_i2c_read_multi",
+        [1, [0x30, 0x32], [0x1000], [4]],
+        capacity=16,
+        context="fork",
+    )
+    with acquisition:
+        assert acquisition.stream is not None
+        assert acquisition.stream.devices == [0x30, 0x32]
+        acquisition.add_consumer(check_counts, queue, start="oldest")
+        acquisition.add_consumer(slow_consumer, start="oldest")
+        time.sleep(0.3)
+    stats = acquisition.stats
+    assert stats is not None
+    fast, slow = stats["consumers"]
+    assert stats["samples"] > 50
+    assert fast["error"] is None and slow["error"] is None
+    # Sequence numbers account for every sample since the consumer started
+    assert fast["received"] + fast["dropped"] <= stats["samples"]
+    assert fast["received"] > stats["samples"] // 2
+    # The slow consumer fell behind without holding up acquisition
+    assert slow["dropped"] > 0
+    counts = []
+    while not queue.empty():
+        item = queue.get()
+        assert item != "bad sample"
+        counts.append(item)
+    assert sum(counts) >= fast["received"]
+
+
+def crashing_consumer(records):
+    os._exit(3)
+
+
+@pytest.mark.skipif(
+    "fork" not in multiprocessing.get_all_start_methods(), reason="needs fork"
+)
+def test_acquisition_consumer_died():
+    acquisition = Acquisition(
+        make_ki,
+        "iqs9320_stream_i2c_read_multi",
+        [1, [0x30, 0x32], [0x1000], [4]],
+        capacity=16,
+        context="fork",
+        timeout=1.0,
+    )
+    with acquisition:
+        assert acquisition.ring is not None
+        name = acquisition.ring.name
+        acquisition.add_consumer(crashing_consumer, start="oldest")
+        acquisition.add_consumer(slow_consumer, start="oldest")
+        time.sleep(0.1)
+    stats = acquisition.stats
+    assert stats is not None
+    crashed, slow = stats["consumers"]
+    assert crashed["error"] == "Consumer exited without a result (exit code 3)"
+    assert slow["error"] is None
+    assert acquisition.process is None
+    # The ring is unlinked
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name)
@@ -0,0 +1,80 @@
+import asyncio
+
+from azo_ki import AsyncKeyboardInterface, KeyboardInterface
+
+device = KeyboardInterface.device_select_e
+
+
+class FakeWriter:
+    # In-memory transport, forwards frames to the fake Pico
+    def __init__(self, pico, reader):
+        self.pico = pico
+        self.reader = reader
+        self.closed = False
+
+    def write(self, data):
+        self.pico.write(data)
+        self.reader.feed_data(self.pico.read_all())
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+async def connect(pico, **kwargs):
+    reader = asyncio.StreamReader()
+    writer = FakeWriter(pico, reader)
+    ki = AsyncKeyboardInterface(reader, writer, device.device_iqs9320_i2c, **kwargs)
+    await ki.setup(device.device_iqs9320_i2c, 1, 1)
+    return ki
+
+
+def test_async_read_write(pico):
+    async def run():
+        async with await connect(pico, device_address=0x30) as ki:
+            await ki.iqs9320_i2c_write_single(0x2000, [1, 2])
+            assert await ki.iqs9320_i2c_read_single(0x2000, 2) == [1, 2]
+            results = await asyncio.gather(
+                ki.iqs9320_i2c_read_single(0x2000, 1, return_type="bytes"),
+                ki.iqs9320_i2c_read_multi([0x30, 0x32], 0x2000, 2),
+            )
+            assert results == [b"\x01", [1, 2, 0, 0]]
+        assert ki.writer.closed
+
+    asyncio.run(run())
+
+
+def test_async_resync_and_samples(pico):
+    async def run():
+        ki = await connect(pico, device_address=0x30)
+        pico.noise = b"\x00\x00"
+        await ki.iqs9320_stream_i2c_read_single(10, [0x1000], [2])
+        assert ki.discarded == 2
+        ki.reader.feed_data(b"\x01\x02\x03\x04")
+        samples = ki.iter_samples(frame_size=2)
+        assert [await anext(samples), await anext(samples)] == [
+            b"\x01\x02",
+            b"\x03\x04",
+        ]
+
+    asyncio.run(run())
+
+
+def test_async_chunked_transfers(pico):
+    image = bytes(i * 7 % 251 for i in range(600))
+
+    async def run():
+        ki = await connect(pico, device_address=0x30)
+        pico.frames.clear()
+        assert await ki.iqs9320_i2c_write_single(0x1000, image) is None
+        assert len(pico.frames) == 3
+        assert pico.device_memory(0x30)[0x2000:0x2258] == image
+        data = await ki.iqs9320_i2c_read_single(0x1000, 600, return_type="bytes")
+        assert data == image
+        assert len(pico.frames) == 6
+        multi = await ki.iqs9320_i2c_read_multi([0x30, 0x32], 0x1000, 300)
+        assert multi == list(image[:300]) + [0] * 300
+
+    asyncio.run(run())
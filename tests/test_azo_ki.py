@@ -1,3 +1,99 @@
+import pytest
+
+from azo_ki import AsyncKeyboardInterface, KeyboardInterface, SimulatedPico
+from azo_ki.azo_ki import KeyboardInterfaceBase
+
+
 def test_azo_ki():
     x = 1
     assert x == 1
+
+
+def test_return_types(make_ki):
+    ki = make_ki()
+    ki.iqs9320_i2c_write_single(0x2000, [0x10, 0x20])
+    assert ki.iqs9320_i2c_read_single(0x2000, 2) == [0x10, 0x20]
+    assert ki.iqs9320_i2c_read_single(0x2000, 2, return_type="bytes") == b"\x10\x20"
+    view = ki.iqs9320_i2c_read_single(0x2000, 2, return_type="memoryview")
+    assert isinstance(view, memoryview) and view.tobytes() == b"\x10\x20"
+    with pytest.raises(ValueError):
+        ki.iqs9320_i2c_read_single(0x2000, 2, return_type="tuple")
+
+
+def test_return_type_constructor(make_ki):
+    ki = make_ki(return_type="bytes")
+    assert ki.iqs9320_i2c_read_multi([0x30, 0x32], 0x2000, 2) == bytes(4)
+    with pytest.raises(ValueError):
+        make_ki(return_type="array")
+
+
+def test_return_type_numpy(make_ki):
+    np = pytest.importorskip("numpy")
+    ki = make_ki(return_type="numpy")
+    ki.iqs9320_i2c_write_single(0x2000, [1, 2, 3])
+    data = ki.iqs9320_i2c_read_single(0x2000, 3)
+    assert data.dtype == np.uint8 and data.tolist() == [1, 2, 3]
+
+
+def test_all_commands_simulated():
+    pico = SimulatedPico()
+    e = KeyboardInterface.device_select_e
+    ki = KeyboardInterface(e.device_iqs7220a, 2, 1, 0x56, transport=pico)
+    pico.ks_data[ki.commands.cmd_iqs7220a_ks] = b"\x04\x08"
+    assert ki.iqs7220a_ks() == [4, 8]
+    ki.iqs7220a_i2c_write_single(1, 0x10, [1, 2])
+    assert ki.iqs7220a_i2c_read_single(1, 0x10, 2) == [1, 2]
+    ki.iqs7220a_i2c_write_multi(0x11, [3, 4])
+    assert ki.iqs7220a_i2c_read_multi(0x11, 2) == [3, 4, 3, 4]
+    ki.iqs7220a_stream_ks(10)
+    ki.iqs7220a_stream_i2c_read_single(10, 1, [0x10], [2])
+    ki.iqs7220a_stream_i2c_read_multi(10, [0x10, 0x11], [2, 2])
+    pico.stream(1)
+    assert ki.read(8) == b"\x00\x00\x01\x02\x03\x04\x03\x04"
+    ki.stop_streaming()
+
+    ki.iqs7320a_ks()
+    ki.iqs7320a_i2c_write_single(0, 0x10, [1])
+    ki.iqs7320a_i2c_read_single(0, 0x10, 1)
+    ki.iqs7320a_i2c_write_multi(0x10, [1])
+    ki.iqs7320a_i2c_read_multi(0x10, 1)
+    ki.iqs7320a_autonomous(True)
+    ki.iqs7320a_standby(False)
+    ki.iqs7320a_stream_ks(10)
+    ki.iqs7320a_stream_i2c_read_single(10, 0, [0x10], [2])
+    ki.iqs7320a_stream_i2c_read_multi(10, [0x10], [2])
+
+    ki.iqs9320_i2c_write_single(0x2000, [5, 6], device_addr=0x30)
+    ki.iqs9320_i2c_write_multi([0x30, 0x32], 0x2001, [7, 8])
+    assert ki.iqs9320_i2c_read_single(0x2000, 4, device_addr=0x30) == [5, 6, 7, 8]
+    assert ki.iqs9320_i2c_read_multi([0x30, 0x32], 0x2001, 2) == [7, 8, 7, 8]
+    ki.iqs9320_stream_i2c_read_single(10, [0x2000], [2], device_addr=0x30)
+    ki.iqs9320_stream_i2c_read_multi(10, [0x30, 0x32], [0x2001], [2])
+    pico.stream(2)
+    assert ki.read(8) == b"\x07\x08" * 4
+
+    ki.iqs9320_ks(20)
+    ki.iqs9320_ks_i2c_write_single(0, 0x10, [1, 2])
+    ki.iqs9320_ks_i2c_read_single(0, 0x10, 2)
+    ki.iqs9320_ks_i2c_write_multi(0x10, [1, 2])
+    ki.iqs9320_ks_i2c_read_multi(0x10, 2)
+    ki.iqs9320_ks_standby(True)
+    ki.iqs9320_ks_stream_ks(10, 20)
+    pico.stream(1)
+    assert ki.read(6) == bytes(6)
+    ki.iqs9320_ks_stream_i2c_read_single(10, 0, [0x10], [2])
+    ki.iqs9320_ks_stream_i2c_read_multi(10, [0x10], [2])
+    ki.close()
+
+    assert {frame[1] for frame in pico.frames} == set(ki.commands)
+    assert pico.crc_errors == 0
+
+
+def test_base_requires_transactions():
+    from azo_ki.batch import Batch
+    from azo_ki.pipeline import Pipeline
+
+    abstract = {"_command", "_write", "_read"}
+    assert KeyboardInterfaceBase.__abstractmethods__ == abstract
+    for subclass in (KeyboardInterface, AsyncKeyboardInterface, Pipeline, Batch):
+        assert not subclass.__abstractmethods__
@@ -0,0 +1,103 @@
+from azo_ki import KeyboardInterface
+from azo_ki.azo_ki import IQS9320_I2C, max_write_length
+
+
+def test_batch_merges_contiguous_writes(make_ki, pico):
+    ki = make_ki()
+    with ki.batch() as batch:
+        for i in range(8):
+            batch.iqs9320_i2c_write_single(0x2000 + i, [i, 0x10 + i])
+        read = batch.iqs9320_i2c_read_single(0x2002, 4)
+        batch.iqs9320_i2c_read_single(0x2001, 2)
+    # One burst write and one burst read instead of 10 frames
+    assert batch.frames_requested == 10
+    assert batch.frames_sent == 2
+    assert batch.frames_saved == 8
+    assert read.result() == [2, 0x12, 3, 0x13]
+    assert batch.results == [[2, 0x12, 3, 0x13], [1, 0x11]]
+    assert bytes(pico.memory[0x30][0x4000:0x4010]) == bytes(
+        x for i in range(8) for x in (i, 0x10 + i)
+    )
+
+
+def test_batch_uses_write_multi(make_ki, pico):
+    ki = make_ki()
+    with ki.batch() as batch:
+        for addr in (0x30, 0x32, 0x34):
+            batch.iqs9320_i2c_write_single(0x2000, [1, 2], device_addr=addr)
+        batch.iqs9320_i2c_write_single(0x2001, [3, 4], device_addr=0x30)
+    assert batch.frames_sent == 2
+    commands = [frame[1] for frame in pico.frames[-2:]]
+    assert ki.commands.cmd_iqs9320_i2c_write_multi in commands
+    assert bytes(pico.memory[0x34][0x4000:0x4002]) == b"\x01\x02"
+    assert bytes(pico.memory[0x30][0x4000:0x4004]) == b"\x01\x02\x03\x04"
+
+
+def test_batch_keeps_order_and_pipelines(make_ki, pico):
+    ki = make_ki(device=KeyboardInterface.device_select_e.device_iqs9320_ks)
+    with ki.batch(pipeline=4) as batch:
+        first = batch.iqs9320_ks_i2c_read_single(0, 0x10, 2)
+        batch.iqs9320_ks_i2c_write_single(0, 0x10, [5, 6])
+        second = batch.iqs9320_ks_i2c_read_single(0, 0x10, 2)
+        scan = batch.iqs9320_ks(20)
+    assert first.result() == [0, 0]
+    assert second.result() == [5, 6]
+    assert scan.result() == [0, 0, 0]
+    assert batch.frames_sent == 4
+
+
+def test_batch_matrix_multi(make_ki, pico):
+    ki = make_ki(
+        device=KeyboardInterface.device_select_e.device_iqs7220a,
+        num_columns=2,
+        num_rows=2,
+        device_address=0x56,
+    )
+    with ki.batch() as batch:
+        for device_select in range(4):
+            batch.iqs7220a_i2c_write_single(device_select, 0x10, [1, 2])
+            batch.iqs7220a_i2c_write_single(device_select, 0x11, [3, 4])
+        reads = [batch.iqs7220a_i2c_read_single(i, 0x10, 4) for i in range(4)]
+    assert batch.frames_sent == 2
+    assert [frame[1] for frame in pico.frames[-2:]] == [
+        ki.commands.cmd_iqs7220a_i2c_write_multi,
+        ki.commands.cmd_iqs7220a_i2c_read_multi,
+    ]
+    assert [read.result() for read in reads] == [[1, 2, 3, 4]] * 4
+
+
+def test_batch_counts_sent_frames(make_ki, pico):
+    ki = make_ki()
+    # Fills a two address write_multi frame exactly
+    data = bytes(range(max_write_length(IQS9320_I2C, 2)))
+    pico.frames.clear()
+    with ki.batch() as batch:
+        for addr in (0x30, 0x32):
+            batch.iqs9320_i2c_write_single(0x2000, data, device_addr=addr)
+    assert [frame[1] for frame in pico.frames] == [
+        ki.commands.cmd_iqs9320_i2c_write_multi
+    ]
+    assert batch.frames_sent == 1
+
+    # A read longer than one frame is sent as several
+    pico.frames.clear()
+    with ki.batch() as batch:
+        read = batch.iqs9320_i2c_read_single(0x2000, 300, return_type="bytes")
+    assert read.result()[: len(data)] == data
+    assert batch.frames_sent == len(pico.frames) == 2
+
+
+def test_batch_skips_cached_frames(make_ki, pico):
+    ki = make_ki()
+    cache = ki.enable_cache()
+    cache.cacheable(IQS9320_I2C, 0x2000, 2)
+    ki.iqs9320_i2c_write_single(0x2000, [1, 2, 3, 4])
+    pico.frames.clear()
+    with ki.batch() as batch:
+        batch.iqs9320_i2c_write_single(0x2000, [1, 2, 3, 4])
+        batch.iqs9320_i2c_write_single(0x2010, [5, 6])
+        read = batch.iqs9320_i2c_read_single(0x2000, 4)
+    # The unchanged write and the cached read never reach the link
+    assert read.result() == [1, 2, 3, 4]
+    assert batch.frames_requested == 3
+    assert batch.frames_sent == len(pico.frames) == 1
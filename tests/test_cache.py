@@ -0,0 +1,102 @@
+from azo_ki import KeyboardInterface
+from azo_ki.azo_ki import IQS7220A, IQS9320_I2C, IQS9320_KS
+from azo_ki.keyscan import KeyScanDecoder
+
+
+def test_cache_serves_reads_and_skips_writes(make_ki, pico):
+    ki = make_ki()
+    cache = ki.enable_cache()
+    cache.cacheable(IQS9320_I2C, 0x2000, 4)
+    ki.iqs9320_i2c_write_single(0x2000, [1, 2, 3, 4])
+    sent = len(pico.frames)
+
+    assert ki.iqs9320_i2c_read_single(0x2000, 4) == [1, 2, 3, 4]
+    assert ki.iqs9320_i2c_read_single(0x2001, 2, return_type="bytes") == b"\x03\x04"
+    ki.iqs9320_i2c_write_single(0x2000, [1, 2, 3, 4])
+    assert len(pico.frames) == sent
+    assert cache.hits == 2
+    assert cache.writes_skipped == 1
+
+    # Registers not marked cacheable always go to the device
+    ki.iqs9320_i2c_read_single(0x2003, 4)
+    assert len(pico.frames) == sent + 1
+    assert cache.misses == 0
+
+
+def test_cache_read_fills_multi(make_ki, pico):
+    ki = make_ki()
+    cache = ki.enable_cache()
+    cache.cacheable("iqs9320_i2c", 0x10)
+    pico.device_memory(0x30)[0x20:0x22] = b"\x01\x02"
+    pico.device_memory(0x32)[0x20:0x22] = b"\x03\x04"
+    assert ki.iqs9320_i2c_read_multi([0x30, 0x32], 0x10, 2) == [1, 2, 3, 4]
+    sent = len(pico.frames)
+    assert ki.iqs9320_i2c_read_single(0x10, 2, device_addr=0x32) == [3, 4]
+    ki.iqs9320_i2c_write_multi([0x30, 0x32], 0x10, [3, 4])
+    assert len(pico.frames) == sent + 1
+    assert len(cache) == 2
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_cache_invalidated_on_reset(make_ki, pico):
+    ki = make_ki(
+        device=KeyboardInterface.device_select_e.device_iqs7220a,
+        num_columns=2,
+        device_address=0x56,
+    )
+    cache = ki.enable_cache()
+    cache.cacheable(IQS7220A, 0x10)
+    ki.iqs7220a_i2c_write_single(0, 0x10, [1, 2])
+    ki.iqs7220a_i2c_write_single(1, 0x10, [1, 2])
+    assert len(cache) == 2
+
+    pico.ks_data[ki.commands.cmd_iqs7220a_ks] = b"\x00\x01"
+    assert ki.iqs7220a_ks() == [0, 1]
+    assert len(cache) == 1
+    ki.iqs7220a_i2c_write_single(1, 0x10, [1, 2])
+    assert cache.writes_skipped == 0
+
+    ki.setup(ki.device, ki.num_columns, ki.num_rows)
+    assert len(cache) == 0
+    ki.disable_cache()
+    assert ki.register_cache is None
+
+
+def test_cache_invalidated_on_iqs9320_ks_reset(make_ki, pico):
+    ki = make_ki(
+        device=KeyboardInterface.device_select_e.device_iqs9320_ks,
+        num_columns=3,
+        device_address=0x30,
+    )
+    cache = ki.enable_cache()
+    cache.cacheable(IQS9320_KS, 0x10)
+    for device in range(3):
+        ki.iqs9320_ks_i2c_write_single(device, 0x10, [1, 2])
+
+    # Device 1 reset, device 2 has channel 7 (bit 0 of its second byte) held
+    frame = b"\x00\x00\x00" + b"\x01\x00\x00" + b"\x00\x01\x00"
+    pico.ks_data[ki.commands.cmd_iqs9320_ks] = frame
+    assert ki.iqs9320_ks(20, return_type="bytes") == frame
+    assert len(cache) == 2
+    ki.iqs9320_ks_i2c_write_single(1, 0x10, [1, 2])
+    ki.iqs9320_ks_i2c_write_single(2, 0x10, [1, 2])
+    assert cache.writes_skipped == 1
+
+    events = KeyScanDecoder(3, 3, 20).update(frame)
+    assert [(e.kind, e.device) for e in events if e.kind == "reset"] == [("reset", 1)]
+
+
+def test_pipelined_writes_update_cache(make_ki, pico):
+    ki = make_ki()
+    cache = ki.enable_cache()
+    cache.cacheable(IQS9320_I2C, 0x2000)
+    ki.iqs9320_i2c_write_single(0x2000, [1, 2])
+    with ki.pipeline() as pipeline:
+        pipeline.iqs9320_i2c_write_single(0x2000, [9, 9])
+    assert ki.iqs9320_i2c_read_single(0x2000, 2) == [9, 9]
+
+    with ki.batch(pipeline=4) as batch:
+        batch.iqs9320_i2c_write_single(0x2000, [7, 7])
+    ki.iqs9320_i2c_write_single(0x2000, [1, 2])
+    assert bytes(pico.memory[0x30][0x4000:0x4002]) == b"\x01\x02"
+    assert cache.writes_skipped == 0
@@ -0,0 +1,71 @@
+import pytest
+
+from azo_ki import KeyboardInterface, SimulatedPico
+from azo_ki.capture import StreamCapture, StreamRecorder
+
+np = pytest.importorskip("numpy")
+
+device = KeyboardInterface.device_select_e.device_iqs9320_i2c
+
+
+def test_record_and_map(tmp_path):
+    pico = SimulatedPico()
+    ki = KeyboardInterface(device, device_address=0x30, transport=pico)
+    ki.iqs9320_i2c_write_multi([0x30, 0x32], 0x1000, [1, 0, 0, 0, 2, 0])
+    ki.iqs9320_stream_i2c_read_multi(10, [0x30, 0x32], [0x1000, 0x1002], [4, 2])
+    path = str(tmp_path / "capture.bin")
+
+    with StreamRecorder(path, ki.stream_config) as recorder:
+        pico.stream(100)
+        assert recorder.record(ki, num_samples=100, chunk_samples=32) == 100
+        # Partial samples are kept until the rest arrives
+        assert recorder.write(bytes(5), receive_time=recorder.start + 100) == 0
+        assert recorder.write(bytes(7), receive_time=recorder.start + 100) == 1
+
+    capture = StreamCapture(path)
+    assert capture.header["device"] == "iqs9320_i2c"
+    assert capture.header["devices"] == [0x30, 0x32]
+    assert capture.stream == ki.stream_config
+    assert isinstance(capture.samples, np.memmap)
+    assert len(capture) == 101
+    assert capture.field(0x1000)[0].tolist() == [1, 1]
+    assert capture.field(0x1002)[99].tolist() == [2, 2]
+    assert capture.field(0x1000)[100].tolist() == [0, 0]
+    assert np.all(np.diff(capture.times) >= 0)
+    assert capture.index_at(50) == 100
+    assert len(capture.between(0, 50)) == 100
+
+    # Appending continues the capture, a cut off record is dropped
+    with open(path, "ab") as f:
+        f.write(bytes(3))
+    with StreamRecorder(path, ki.stream_config, append=True) as recorder:
+        assert recorder.samples == 101
+        recorder.write(bytes(12))
+    assert capture.refresh() == 102
+
+    ki.stop_streaming()
+    with pytest.raises(ValueError, match="No stream"):
+        StreamRecorder(path, ki.stream_config)
+    ki.iqs9320_stream_i2c_read_single(10, [0x1000], [4])
+    with pytest.raises(ValueError, match="different stream"):
+        StreamRecorder(path, ki.stream_config, append=True)
+
+
+def test_record_key_scan(tmp_path):
+    pico = SimulatedPico()
+    ki = KeyboardInterface(
+        KeyboardInterface.device_select_e.device_iqs9320_ks,
+        num_columns=2,
+        device_address=0x30,
+        transport=pico,
+    )
+    pico.ks_data[ki.commands.cmd_iqs9320_ks] = bytes(range(6))
+    ki.iqs9320_ks_stream_ks(5, 20)
+    path = str(tmp_path / "ks.bin")
+    with StreamRecorder(path, ki.stream_config) as recorder:
+        pico.stream(3)
+        recorder.record(ki, num_samples=3)
+    capture = StreamCapture(path)
+    assert capture.header["device"] == "iqs9320_ks"
+    assert capture["ks"].shape == (3, 2, 3)
+    assert capture["ks"][2].tolist() == [[0, 1, 2], [3, 4, 5]]
@@ -0,0 +1,66 @@
+from azo_ki import KeyboardInterface, SimulatedPico
+from azo_ki.azo_ki import IQS9320_I2C, max_read_length, max_write_length
+
+IMAGE = bytes(i * 7 % 251 for i in range(1000))
+
+
+def test_large_read_and_write(make_ki, pico):
+    ki = make_ki()
+    pico.frames.clear()
+    assert ki.iqs9320_i2c_write_single(0x1000, IMAGE) is None
+    limit = max_write_length(IQS9320_I2C)
+    assert len(pico.frames) == -(-len(IMAGE) // limit)
+    assert pico.device_memory(0x30)[0x2000 : 0x2000 + len(IMAGE)] == IMAGE
+
+    pico.frames.clear()
+    assert ki.iqs9320_i2c_read_single(0x1000, len(IMAGE), return_type="bytes") == IMAGE
+    # 254 byte chunks, each starting at the next register address
+    assert len(pico.frames) == 4
+    assert [frame[3:5] for frame in pico.frames] == [
+        (0x1000 + i * 127).to_bytes(2, "little") for i in range(4)
+    ]
+    assert ki.iqs9320_i2c_read_single(0x1000, len(IMAGE))[:3] == list(IMAGE[:3])
+
+
+def test_large_read_multi_is_device_major(make_ki, pico):
+    ki = make_ki()
+    pico.device_memory(0x30)[0x2000:0x2400] = IMAGE[:1000].ljust(0x400, b"\x01")
+    pico.device_memory(0x32)[0x2000:0x2400] = bytes(0x400)
+    ki.iqs9320_i2c_write_multi([0x32], 0x1000, IMAGE[::-1])
+    data = ki.iqs9320_i2c_read_multi([0x30, 0x32], 0x1000, 600, return_type="bytes")
+    assert data == IMAGE[:600] + IMAGE[::-1][:600]
+
+
+def test_pipelined_chunks(make_ki, pico):
+    ki = make_ki()
+    ki.iqs9320_i2c_write_single(0x1000, IMAGE)
+    pico.frames.clear()
+    with ki.pipeline(max_in_flight=8) as pipeline:
+        future = pipeline.iqs9320_i2c_read_single(0x1000, 1000, return_type="bytes")
+        # All chunks are sent before the first response is waited for
+        assert len(pipeline.pending) == 4
+        assert future.result() == IMAGE
+    assert len(pico.frames) == 4
+
+
+def test_batched_chunks(make_ki, pico):
+    ki = make_ki()
+    with ki.batch(pipeline=4) as batch:
+        batch.iqs9320_i2c_write_single(0x1000, IMAGE)
+        read = batch.iqs9320_i2c_read_single(0x1000, 1000, return_type="bytes")
+    assert 1000 > max_read_length(IQS9320_I2C)
+    assert read.result() == IMAGE
+
+
+def test_matrix_chunked_write_multi():
+    pico = SimulatedPico()
+    ki = KeyboardInterface(
+        KeyboardInterface.device_select_e.device_iqs7220a,
+        num_columns=3,
+        num_rows=1,
+        device_address=0x56,
+        transport=pico,
+    )
+    ki.iqs7220a_i2c_write_multi(0x10, IMAGE[:400])
+    data = ki.iqs7220a_i2c_read_multi(0x10, 400, return_type="bytes")
+    assert data == IMAGE[:400] * 3
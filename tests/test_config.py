@@ -0,0 +1,178 @@
+import pytest
+
+from azo_ki import KeyboardInterface, SimulatedPico
+from azo_ki.config import block_spans, changed_ranges
+
+
+def frame_names(pico):
+    return [KeyboardInterface.commands(frame[1]).name for frame in pico.frames]
+
+
+@pytest.fixture
+def i2c():
+    pico = SimulatedPico()
+    ki = KeyboardInterface(
+        KeyboardInterface.device_select_e.device_iqs9320_i2c,
+        device_address=[0x30, 0x32],
+        transport=pico,
+    )
+    return ki, pico
+
+
+@pytest.fixture
+def matrix():
+    pico = SimulatedPico()
+    ki = KeyboardInterface(
+        KeyboardInterface.device_select_e.device_iqs9320_ks,
+        num_columns=2,
+        num_rows=2,
+        device_address=0x30,
+        transport=pico,
+    )
+    return ki, pico
+
+
+def test_changed_ranges():
+    current = bytes(16)
+    target = bytearray(16)
+    target[2:4] = b"\x01\x02"
+    target[6:8] = b"\x03\x04"
+    target[14:16] = b"\x05\x06"
+    # Registers 1 and 3 are 2 bytes apart and merged, register 7 is not
+    assert changed_ranges(current, target, 2, 2, 255) == [(2, 8), (14, 16)]
+    assert changed_ranges(current, target, 2, 0, 255) == [(2, 4), (6, 8), (14, 16)]
+    assert changed_ranges(current, target, 2, 2, 4) == [(2, 4), (6, 8), (14, 16)]
+    assert changed_ranges(target, target, 2, 2, 255) == []
+
+
+def test_block_spans():
+    blocks = [(0x10, bytes(2)), (0x11, bytes(4)), (0x14, bytes(2)), (0x20, bytes(2))]
+    # 0x10-0x12 are contiguous, 0x14 is one register (2 bytes) further on
+    assert block_spans(blocks, 2, 2, 255) == [(0x10, 10), (0x20, 2)]
+    assert block_spans(blocks, 2, 0, 255) == [(0x10, 6), (0x14, 2), (0x20, 2)]
+    assert block_spans(blocks, 2, 2, 6) == [(0x10, 6), (0x14, 2), (0x20, 2)]
+
+
+def test_apply_writes_only_changes(i2c):
+    ki, pico = i2c
+    pico.device_memory(0x30)[0x200:0x210] = bytes(range(16))
+    image = bytearray(range(16))
+    image[4:6] = b"\xaa\xbb"
+
+    pico.frames.clear()
+    report = ki.apply_config({0x30: {0x100: image}})
+    assert report.ok and report.verified
+    assert report.bytes_written == 2
+    assert report.bytes_skipped == 14
+    assert pico.device_memory(0x30)[0x200:0x210] == image
+    assert frame_names(pico) == [
+        "cmd_iqs9320_i2c_read_single",
+        "cmd_iqs9320_i2c_write_single",
+        "cmd_iqs9320_i2c_read_single",
+    ]
+
+    # Nothing left to write
+    pico.frames.clear()
+    report = ki.apply_config({0x30: {0x100: image}}, verify=False)
+    assert report.bytes_written == 0 and report.frames_written == 0
+    assert frame_names(pico) == ["cmd_iqs9320_i2c_read_single"]
+
+
+def test_apply_shares_identical_writes(i2c):
+    ki, pico = i2c
+    config = {addr: {0x100: b"\x01\x02\x03\x04"} for addr in (0x30, 0x32)}
+
+    pico.frames.clear()
+    report = ki.apply_config(config)
+    assert report.ok
+    assert report.bytes_written == 8
+    # One multi read, one multi write, one multi readback
+    assert (report.frames_read, report.frames_written) == (2, 1)
+    assert frame_names(pico) == [
+        "cmd_iqs9320_i2c_read_multi",
+        "cmd_iqs9320_i2c_write_multi",
+        "cmd_iqs9320_i2c_read_multi",
+    ]
+    for addr in (0x30, 0x32):
+        assert pico.device_memory(addr)[0x200:0x204] == b"\x01\x02\x03\x04"
+
+
+def test_apply_coalesces_blocks(i2c):
+    ki, pico = i2c
+    # 20 single register blocks, all but the first one change
+    config = {0x30: {0x100 + i: [i, 0] if i else [0, 0] for i in range(20)}}
+    pico.frames.clear()
+    report = ki.apply_config(config, verify=False)
+    assert (report.frames_read, report.frames_written) == (1, 1)
+    assert (report.bytes_written, report.bytes_skipped) == (38, 2)
+    assert frame_names(pico) == [
+        "cmd_iqs9320_i2c_read_single",
+        "cmd_iqs9320_i2c_write_single",
+    ]
+    assert pico.device_memory(0x30)[0x202:0x228] == bytes(
+        x for i in range(1, 20) for x in (i, 0)
+    )
+
+
+def test_apply_never_writes_unconfigured_registers(i2c):
+    ki, pico = i2c
+    original = pico.respond
+    changes = [b"\xaa\xbb"]
+
+    def respond(command, args):
+        # Register 0x11 changes on the device after the first read
+        result = original(command, args)
+        if changes:
+            pico.device_memory(0x30)[0x22:0x24] = changes.pop()
+        return result
+
+    pico.respond = respond
+    pico.frames.clear()
+    report = ki.apply_config({0x30: {0x10: [1, 0], 0x12: [2, 0]}})
+    assert report.ok
+    # One read of 0x10-0x12, a write per block, one readback
+    assert (report.frames_read, report.frames_written) == (2, 2)
+    assert (report.bytes_written, report.bytes_skipped) == (4, 0)
+    assert pico.device_memory(0x30)[0x20:0x26] == b"\x01\x00\xaa\xbb\x02\x00"
+
+
+def test_apply_matrix(matrix):
+    ki, pico = matrix
+    same = {device: {0x10: b"\x11\x22"} for device in range(4)}
+    report = ki.apply_config(same)
+    assert report.ok and report.frames_written == 1
+    assert (
+        pico.frames[-2][1] == KeyboardInterface.commands.cmd_iqs9320_ks_i2c_write_multi
+    )
+
+    # Devices differ, so each is written on its own
+    pico.frames.clear()
+    report = ki.apply_config({0: {0x10: b"\x33\x44"}, 2: {0x10: b"\x55\x66"}})
+    assert report.ok and report.frames_written == 2
+    assert pico.device_memory(1)[0x20:0x22] == b"\x11\x22"
+    for device, data in ((0, b"\x33\x44"), (1, b"\x11\x22"), (2, b"\x55\x66")):
+        assert (
+            ki.iqs9320_ks_i2c_read_single(device, 0x10, 2, return_type="bytes") == data
+        )
+
+
+def test_apply_reports_mismatches(i2c):
+    ki, pico = i2c
+    original = pico.respond
+
+    def respond(command, args):
+        # Register 0x101 of 0x30 ignores writes
+        result = original(command, args)
+        pico.device_memory(0x30)[0x202:0x204] = b"\x00\x00"
+        return result
+
+    pico.respond = respond
+    report = ki.apply_config({0x30: {0x100: b"\x01\x00\x02\x00"}})
+    assert not report.ok
+    assert report.mismatches == [(0x30, 0x101)]
+
+
+def test_apply_rejects_partial_registers(i2c):
+    ki, _ = i2c
+    with pytest.raises(ValueError):
+        ki.apply_config({0x30: {0x100: b"\x01\x02\x03"}})
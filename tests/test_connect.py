@@ -0,0 +1,81 @@
+import pytest
+import serial
+
+import azo_ki.azo_ki
+from azo_ki import KeyboardInterface
+from azo_ki.azo_ki import find_ports
+
+device = KeyboardInterface.device_select_e.device_iqs9320_i2c
+cmd = KeyboardInterface.commands
+
+
+def commands_sent(pico):
+    return [frame[1] for frame in pico.frames]
+
+
+def count_enumerations(monkeypatch):
+    calls = []
+    comports = azo_ki.azo_ki.list_ports.comports
+
+    def counted():
+        calls.append(1)
+        return comports()
+
+    monkeypatch.setattr(azo_ki.azo_ki.list_ports, "comports", counted)
+    return calls
+
+
+def test_cached_discovery(monkeypatch, pico):
+    calls = count_enumerations(monkeypatch)
+    for _ in range(3):
+        KeyboardInterface(device, device_address=0x30)
+    assert len(calls) == 1
+    find_ports(max_age=0)
+    assert len(calls) == 2
+
+    # Ports that fail to open are dropped from the cache
+    def unplugged(port, **kwargs):
+        raise serial.SerialException("could not open port")
+
+    monkeypatch.setattr(serial, "Serial", unplugged)
+    with pytest.raises(serial.SerialException):
+        KeyboardInterface(device, device_address=0x30)
+    find_ports()
+    assert len(calls) == 3
+
+
+def test_select_by_serial_number(boards):
+    ki = KeyboardInterface(
+        device, device_address=0x30, serial_number="E6614C311B000002"
+    )
+    assert ki.port == "/dev/ttyFAKE2"
+    assert ki.serial_conn is boards["/dev/ttyFAKE2"]
+
+
+def test_reuse_port_and_skip_setup(monkeypatch, pico):
+    calls = count_enumerations(monkeypatch)
+    ki = KeyboardInterface(device, device_address=0x30, reuse_port=True)
+    ki.iqs9320_stream_i2c_read_single(10, [0x1000], [2])
+    ki.close()
+    # The stream is stopped, serial comms are left running
+    assert commands_sent(pico)[-1] == cmd.cmd_stop_streaming
+
+    # Set up the same way, neither enumeration nor setup is repeated
+    pico.frames.clear()
+    ki = KeyboardInterface(device, device_address=0x30, reuse_port=True)
+    assert ki.serial_conn is pico
+    assert commands_sent(pico) == []
+    assert len(calls) == 1
+    ki.close()
+    ki.close()
+
+    # A different matrix is set up on the reused port
+    ki = KeyboardInterface(device, 2, 2, device_address=0x30, reuse_port=True)
+    assert commands_sent(pico) == [cmd.cmd_setup]
+    ki.reuse_port = False
+    ki.close()
+    assert commands_sent(pico)[-1] == cmd.cmd_stop_serial_comms
+
+    pico.frames.clear()
+    ki = KeyboardInterface(device, device_address=0x30, port="sim", skip_setup=True)
+    assert commands_sent(pico) == []
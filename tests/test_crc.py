@@ -0,0 +1,32 @@
+import random
+
+import pytest
+
+from azo_ki import crc
+
+
+def test_crc_check_value():
+    # CRC-16/CCITT-FALSE check value
+    assert crc.crc16_bitwise(b"123456789") == 0x29B1
+
+
+@pytest.mark.parametrize("name", sorted(crc.backends))
+def test_crc_backend_matches_reference(name):
+    rng = random.Random(name)
+    backend = crc.backends[name]
+    for length in list(range(32)) + [255, 256, 1024]:
+        data = bytes(rng.getrandbits(8) for _ in range(length))
+        assert backend(data) == crc.crc16_bitwise(data)
+        assert backend(list(data)) == crc.crc16_bitwise(data)
+        assert backend(memoryview(data)) == crc.crc16_bitwise(data)
+
+
+def test_crc_set_backend():
+    previous = crc.backend_name
+    try:
+        crc.set_backend("table")
+        assert crc.crc16(b"123456789") == 0x29B1
+        with pytest.raises(ValueError):
+            crc.set_backend("unknown")
+    finally:
+        crc.set_backend(previous)
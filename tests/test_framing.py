@@ -0,0 +1,77 @@
+import array
+
+import pytest
+
+from azo_ki import AckTimeoutError
+from azo_ki.crc import crc16_bitwise
+from azo_ki.framing import MAX_COMMAND_LENGTH, FrameEncoder, byte_view
+
+
+def reference_frame(command_id, command_bytes):
+    # The original list based packet builder
+    total_packet = [0xCC, 0xEF, len(command_bytes) + 1, command_id]
+    total_packet += list(command_bytes)
+    crc_value = crc16_bitwise(total_packet[3:])
+    total_packet += [crc_value & 0xFF, (crc_value & 0xFF00) >> 8, 0xCC, 0xEF]
+    return bytes(total_packet)
+
+
+def test_encode_matches_reference():
+    encoder = FrameEncoder()
+    header = [0x31, 0x30, 0x00, 0x20, 4]
+    payload = bytes([1, 2, 3, 4])
+    frame = encoder.encode(7, header, payload)
+    assert bytes(frame) == reference_frame(7, header + list(payload))
+    # Buffer is reused for the next, shorter frame
+    frame = encoder.encode(8, [0x01])
+    assert bytes(frame) == reference_frame(8, [0x01])
+
+
+def test_encode_accepts_buffer_payloads():
+    encoder = FrameEncoder()
+    words = array.array("H", [0x1234, 0x5678])
+    frame = encoder.encode(1, [0x33], words)
+    assert bytes(frame) == reference_frame(1, [0x33] + list(words.tobytes()))
+    assert len(byte_view(words)) == 4
+
+
+def test_encode_rejects_oversized_command():
+    encoder = FrameEncoder()
+    encoder.encode(1, [0x33], bytes(MAX_COMMAND_LENGTH - 1))
+    with pytest.raises(ValueError):
+        encoder.encode(1, [0x33], bytes(MAX_COMMAND_LENGTH))
+
+
+def test_write_then_read(make_ki, pico):
+    ki = make_ki()
+    ki.iqs9320_i2c_write_single(0x2000, bytearray([0x10, 0x00]))
+    assert ki.iqs9320_i2c_read_single(0x2000, 2) == [0x10, 0x00]
+    ki.iqs9320_i2c_write_multi([0x30, 0x32], 0x1000, [1, 2, 3])
+    assert ki.iqs9320_i2c_read_multi([0x30, 0x32], 0x1000, 3) == [1, 2, 3] * 2
+
+
+def test_read_ack_single_syscall(make_ki):
+    ki = make_ki()
+    ki.iqs9320_i2c_write_single(0x2000, [1, 2])
+    assert ki.frame_stats.syscalls == 1
+    assert ki.frame_stats.discarded == 0
+    ki.iqs9320_i2c_read_single(0x2000, 2)
+    assert ki.frame_stats.syscalls == 1
+    assert ki.frame_stats.bytes_read == 6 + 2
+
+
+def test_read_ack_resync(make_ki, pico):
+    ki = make_ki()
+    pico.noise = b"\x00\x11\x22"
+    ki.iqs9320_i2c_write_single(0x2000, [7, 8])
+    assert ki.iqs9320_i2c_read_single(0x2000, 2) == [7, 8]
+    assert ki.frame_stats.discarded == 3
+    assert ki.frame_stats.syscalls == 2
+
+
+def test_read_ack_timeout(make_ki, pico):
+    ki = make_ki()
+    pico.respond = lambda command, args: b""
+    pico.write = lambda data: len(data)
+    with pytest.raises(AckTimeoutError):
+        ki.stop_streaming()
@@ -0,0 +1,66 @@
+import pytest
+
+from azo_ki import KeyboardInterface, SimulatedPico
+from azo_ki.keyscan import KIND_NAMES, PRESS, RESET, KeyEvent, KeyScanDecoder
+
+
+def test_update_events():
+    decoder = KeyScanDecoder(num_devices=2, num_channels=4)
+    # Device 0 reset with channel 0 held, device 1 channel 3, unused bit 7
+    assert decoder.update(bytes([0b00011, 0b10000000])) == [
+        KeyEvent("reset", 0, None),
+        KeyEvent("press", 0, 0),
+    ]
+    assert decoder.update(bytes([0b00010, 0b10010000]), 1.5) == [
+        KeyEvent("press", 1, 3, 1.5)
+    ]
+    assert decoder.update(bytes([0b00100, 0b10010000])) == [
+        KeyEvent("release", 0, 0),
+        KeyEvent("press", 0, 1),
+    ]
+    assert decoder.update(bytes([0b00100, 0b10010000])) == []
+
+
+def test_decode_block_matches_update():
+    np = pytest.importorskip("numpy")
+    frames = [bytes([0, 0, 0]), bytes([3, 0, 0]), bytes([2, 0, 0x10]), bytes(3)]
+    decoder = KeyScanDecoder(num_devices=1, bytes_per_device=3, num_channels=20)
+    expected = []
+    for i, frame in enumerate(frames):
+        expected += [(i, e.kind, e.channel) for e in decoder.update(frame)]
+    decoder.reset()
+    events = decoder.decode(b"".join(frames), times=np.arange(4.0))
+    assert [
+        (
+            e["sample"],
+            KIND_NAMES[e["kind"]],
+            e["channel"] if e["kind"] != RESET else None,
+        )
+        for e in events
+    ] == expected
+    assert events["time"].tolist() == [1.0, 1.0, 2.0, 3.0, 3.0]
+    assert decoder.state().shape == (1, 20)
+    assert not decoder.state().any()
+
+
+def test_key_scan_stream():
+    pytest.importorskip("numpy")
+    pico = SimulatedPico()
+    ki = KeyboardInterface(
+        KeyboardInterface.device_select_e.device_iqs7220a,
+        num_columns=2,
+        num_rows=2,
+        device_address=0x56,
+        transport=pico,
+    )
+    ki.iqs7220a_stream_ks(10)
+    decoder = KeyScanDecoder.from_stream(ki.stream_config, num_channels=4)
+    assert decoder.frame_size == 4
+    pico.stream(2)
+    pico.ks_data[ki.commands.cmd_iqs7220a_ks] = bytes([0, 0, 0b100, 0])
+    pico.stream(2)
+    events = decoder.decode(ki.read(4 * decoder.frame_size))
+    assert events[["sample", "device", "channel", "kind"]].tolist() == [
+        (2, 2, 1, PRESS)
+    ]
+    assert decoder.state()[2].tolist() == [False, True, False, False]
@@ -0,0 +1,84 @@
+import pytest
+import serial
+
+import azo_ki.azo_ki
+from azo_ki import (
+    KeyboardInterface,
+    LinkConfig,
+    LinkOversubscribedWarning,
+    SimulatedPico,
+)
+
+device = KeyboardInterface.device_select_e.device_iqs9320_i2c
+
+
+def test_serial_settings(monkeypatch, pico):
+    opened = {}
+
+    def open_serial(port, **kwargs):
+        opened.update(kwargs, port=port)
+        return pico
+
+    monkeypatch.setattr(serial, "Serial", open_serial)
+    link = LinkConfig(baudrate=921600, timeout=0.05, inter_byte_timeout=0.01)
+    ki = KeyboardInterface(device, device_address=0x30, link=link)
+    assert opened == {
+        "port": "/dev/ttyFAKE0",
+        "baudrate": 921600,
+        "timeout": 0.05,
+        "write_timeout": None,
+        "inter_byte_timeout": 0.01,
+    }
+
+    # Default settings when no link config is given
+    KeyboardInterface(device, device_address=0x30)
+    assert opened["baudrate"] == 115200
+    assert opened["timeout"] == 0.5
+    assert ki.link is link
+
+
+def test_configure_link_at_runtime():
+    pico = SimulatedPico()
+    ki = KeyboardInterface(device, device_address=0x30, transport=pico)
+    # A transport keeps its own settings until a link config is applied
+    assert pico.baudrate is None
+    ki.configure_link(baudrate=1000000, timeout=0.1)
+    assert (pico.baudrate, pico.timeout) == (1000000, 0.1)
+    assert ki.iqs9320_i2c_read_single(0x2000, 2) == [0, 0]
+
+
+def test_auto_tune_stream():
+    pico = SimulatedPico()
+    link = LinkConfig(timeout=0.5, auto_tune=True)
+    ki = KeyboardInterface(device, device_address=0x30, transport=pico, link=link)
+
+    ki.iqs9320_stream_i2c_read_multi(10, [0x30, 0x32], [0x1000, 0x2000], [4, 2])
+    stream = ki.stream_config
+    assert stream is not None
+    assert stream.sample_size == 12
+    assert stream.bytes_per_second == 1200
+    # Four report intervals plus the sample's time on the wire
+    assert pico.timeout == pytest.approx(0.04 + 12 / 11520)
+    ki.stop_streaming()
+    assert ki.stream_config is None
+    assert pico.timeout == 0.5
+
+    # 60 bytes every 1 ms needs 60 kB/s, more than a 115200 baud link
+    with pytest.warns(LinkOversubscribedWarning, match="60000 B/s"):
+        ki.iqs9320_stream_i2c_read_multi(1, [0x30] * 10, [0x1000], [6])
+    assert ki.link.utilisation(ki.stream_config) > 5
+
+
+def test_buffer_size(monkeypatch, pico):
+    sizes = []
+    pico.set_buffer_size = lambda **kwargs: sizes.append(kwargs)
+    monkeypatch.setattr(azo_ki.azo_ki.serial, "Serial", lambda port, **kwargs: pico)
+    link = LinkConfig(rx_buffer_size=65536, auto_tune=True)
+    ki = KeyboardInterface(device, device_address=0x30, link=link)
+    assert sizes == [{"rx_size": 65536}]
+    # One second of samples, capped at the link rate
+    ki.iqs9320_stream_i2c_read_single(100, [0x1000, 0x1100], [250, 250])
+    assert sizes[-1] == {"rx_size": 5000}
+    with pytest.warns(LinkOversubscribedWarning):
+        ki.iqs9320_stream_i2c_read_single(10, [0x1000, 0x1100], [250, 250])
+    assert sizes[-1] == {"rx_size": 11520}
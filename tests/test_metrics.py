@@ -0,0 +1,63 @@
+import pytest
+
+from azo_ki import AckTimeoutError, GenericReturnError
+from azo_ki.metrics import Histogram
+
+
+def test_metrics_per_command(make_ki, pico):
+    ki = make_ki()
+    metrics = ki.enable_metrics()
+    records = []
+    metrics.add_hooks(post=records.append)
+    ki.iqs9320_i2c_write_single(0x2000, [1, 2])
+    ki.iqs9320_i2c_read_single(0x2000, 2)
+    ki.iqs9320_i2c_read_single(0x2000, 2)
+
+    stats = metrics.commands[ki.commands.cmd_iqs9320_i2c_read_single]
+    assert stats.count == 2 and stats.errors == 0
+    assert stats.phases["ack"].count == 2
+    assert [r.command for r in records] == [
+        ki.commands.cmd_iqs9320_i2c_write_single,
+        ki.commands.cmd_iqs9320_i2c_read_single,
+        ki.commands.cmd_iqs9320_i2c_read_single,
+    ]
+    assert set(records[0].phases) == {"encode", "write", "ack", "read"}
+    # Frames of 15 and 13 bytes, 6 byte acks with a 4 byte generic return
+    # and 2 byte responses
+    assert metrics.bytes_sent == 15 + 13 * 2
+    assert metrics.bytes_received == 10 + 8 * 2
+    snapshot = metrics.snapshot()
+    assert snapshot["commands"]["cmd_iqs9320_i2c_read_single"]["count"] == 2
+
+
+def test_metrics_failures(make_ki, pico):
+    ki = make_ki()
+    metrics = ki.enable_metrics()
+    pico.noise = b"\x00"
+    ki.stop_streaming()
+    assert metrics.discarded == 1
+
+    pico.respond = lambda command, args: b"\x00" * 4
+    with pytest.raises(GenericReturnError):
+        ki.iqs9320_i2c_write_single(0x2000, [1])
+    assert metrics.failures["generic_return"] == 1
+    stats = metrics.commands[ki.commands.cmd_iqs9320_i2c_write_single]
+    assert stats.errors == 1
+
+    pico.write = lambda data: len(data)
+    with pytest.raises(AckTimeoutError):
+        ki.stop_streaming()
+    assert metrics.failures["timeout"] == 1
+
+    ki.disable_metrics()
+    assert ki.metrics is None
+
+
+def test_histogram():
+    histogram = Histogram()
+    for value in (1e-6, 3e-6, 3e-6, 1e-3):
+        histogram.add(value)
+    assert histogram.count == 4
+    assert histogram.percentile(50) == 4e-6
+    assert histogram.percentile(100) == 1e-3
+    assert histogram.as_dict()["max"] == 1e-3
@@ -0,0 +1,75 @@
+import time
+
+import pytest
+
+from azo_ki import AckMismatchError, AckTimeoutError
+from azo_ki.framing import GENERIC_RETURN_LENGTH
+
+
+def test_pipeline_writes_and_reads(make_ki, pico):
+    ki = make_ki()
+    with ki.pipeline(max_in_flight=4) as pipeline:
+        writes = [
+            pipeline.iqs9320_i2c_write_single(0x2000 + i, [i, 0]) for i in range(10)
+        ]
+        read = pipeline.iqs9320_i2c_read_single(0x2000, 20, return_type="bytes")
+        assert len(pipeline.pending) <= 4
+    assert all(future.done() and future.result() is None for future in writes)
+    assert read.result() == bytes(x for i in range(10) for x in (i, 0))
+
+
+def test_pipeline_out_of_order(make_ki, pico):
+    ki = make_ki()
+    ki.iqs9320_i2c_write_single(0x10, [1, 0, 2, 0, 3, 0])
+    pico.reorder = 3
+    pipeline = ki.pipeline(max_in_flight=3)
+    futures = [pipeline.iqs9320_i2c_read_single(0x10 + i, 1) for i in range(3)]
+    # Waiting on the first result drives the pipeline past the other responses
+    assert futures[0].result() == [1]
+    assert [future.result() for future in futures] == [[1], [2], [3]]
+
+
+def test_pipeline_timeout(make_ki, pico):
+    ki = make_ki()
+    pico.reorder = 10
+    pipeline = ki.pipeline(max_in_flight=2, timeout=0.0)
+    future = pipeline.iqs9320_i2c_read_single(0x10, 1)
+    with pytest.raises(TimeoutError):
+        future.result()
+    assert not pipeline.pending
+
+
+def test_pipeline_deadlines_while_responses_arrive(make_ki, pico):
+    ki = make_ki()
+    write = pico.write
+    pico.write = lambda data: len(data)
+    pipeline = ki.pipeline(max_in_flight=8)
+    first = pipeline.iqs9320_i2c_read_single(0x10, 1)
+    pico.write = write
+    second = pipeline.iqs9320_i2c_read_single(0x10, 1)
+    first.deadline = time.monotonic() - 1
+    # The overdue request fails without waiting for the link to go quiet
+    assert second.result() == [0]
+    assert first.done() and isinstance(first.exception(), AckTimeoutError)
+
+
+def test_pipeline_bad_ack_fails_its_request(make_ki, pico):
+    ki = make_ki()
+    write = pico.write
+    calls = []
+
+    def corrupt(data):
+        # The acknowledge of the second write has the wrong command byte
+        result = write(data)
+        calls.append(data)
+        if len(calls) == 2:
+            pico.tx[-GENERIC_RETURN_LENGTH - 3] = 0
+        return result
+
+    pico.write = corrupt
+    with ki.pipeline(max_in_flight=8) as pipeline:
+        futures = [
+            pipeline.iqs9320_i2c_write_single(0x2000 + i, [i, 0]) for i in range(3)
+        ]
+    assert futures[0].result() is None and futures[2].result() is None
+    assert isinstance(futures[1].exception(), AckMismatchError)
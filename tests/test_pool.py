@@ -0,0 +1,25 @@
+from azo_ki import KeyboardInterface, KeyboardInterfacePool
+
+
+def test_pool_fan_out(boards):
+    device = KeyboardInterface.device_select_e.device_iqs9320_i2c
+    with KeyboardInterfacePool(device, device_address=0x30) as pool:
+        assert len(pool) == 4
+        results = pool.iqs9320_i2c_write_multi([0x30, 0x32], 0x2000, [1, 2])
+        assert sorted(results) == sorted(boards)
+        assert all(result.error is None for result in results.values())
+        # One command per board, 200 ms if the boards were driven in series
+        results = pool.iqs9320_i2c_read_single(0x2000, 2)
+        assert {result.value[1] for result in results.values()} == {2}
+        assert pool.elapsed < 0.15
+        assert all(result.elapsed >= 0.05 for result in results.values())
+
+
+def test_pool_errors_are_per_board(boards):
+    device = KeyboardInterface.device_select_e.device_iqs9320_i2c
+    pool = KeyboardInterfacePool(device, ports=["/dev/ttyFAKE0", "/dev/ttyFAKE1"])
+    results = pool.iqs9320_i2c_read_single(0x2000, 2)
+    assert all(isinstance(result.error, Exception) for result in results.values())
+    results = pool.run(lambda ki: ki.port, ports=["/dev/ttyFAKE1"])
+    assert results["/dev/ttyFAKE1"].value == "/dev/ttyFAKE1"
+    pool.close()
@@ -0,0 +1,81 @@
+import struct
+
+import pytest
+
+from azo_ki import KeyboardInterface, SimulatedPico
+from azo_ki.regmap import RegisterMap
+
+SPEC = {
+    "registers": [
+        {"name": "product", "address": 0x1000, "size": 4},
+        {
+            "name": "status",
+            "address": 0x1002,
+            "fields": {"reset": 0, "mode": [4, 3]},
+        },
+        {"name": "delta", "address": 0x1004, "signed": True},
+        {"name": "serial", "address": 0x1005, "size": 3, "byteorder": "big"},
+        {"name": "threshold", "address": 0x1020},
+    ]
+}
+
+
+@pytest.fixture
+def ki():
+    pico = SimulatedPico()
+    ki = KeyboardInterface(
+        KeyboardInterface.device_select_e.device_iqs9320_i2c,
+        device_address=0x30,
+        transport=pico,
+    )
+    for addr in (0x30, 0x32):
+        memory = pico.device_memory(addr)
+        # 16-bit register n is at byte 2n, 0x1003 is not in the map
+        data = struct.pack("<IH2xh", addr, 0x51, -2) + b"\x01\x02\x03"
+        memory[0x2000:0x200D] = data
+        memory[0x2040:0x2042] = struct.pack("<H", 900 + addr)
+    return ki
+
+
+def test_plan_coalesces_contiguous_registers():
+    regmap = RegisterMap.from_dict("iqs9320_i2c", SPEC)
+    plan = regmap.plan(["status.mode", "threshold", "product", "serial"])
+    # 0x1000-0x1006 in one burst, 0x1020 is too far away to read through
+    assert [(b.register_addr, b.num_bytes) for b in plan] == [
+        (0x1000, 14),
+        (0x1020, 2),
+    ]
+    assert regmap.plan(["status.mode", "threshold", "product", "serial"]) is plan
+
+
+def test_read_fields(ki):
+    regmap = RegisterMap.from_dict("iqs9320_i2c", SPEC)
+    ki.enable_metrics()
+    values = regmap.read_fields(
+        ki, ["product", "status", "status.reset", "status.mode", "delta", "serial"]
+    )
+    assert values == {
+        "product": 0x30,
+        "status": 0x51,
+        "status.reset": 1,
+        "status.mode": 5,
+        "delta": -2,
+        "serial": 0x010203,
+    }
+    assert ki.metrics.commands[ki.commands.cmd_iqs9320_i2c_read_single].count == 1
+
+    values = regmap.read_fields_multi(ki, ["product", "threshold"], [0x30, 0x32])
+    assert values == {"product": [0x30, 0x32], "threshold": [948, 950]}
+
+
+def test_write_fields(ki):
+    regmap = RegisterMap.from_dict("iqs9320_i2c", SPEC)
+    regmap.write_fields(ki, {"status.mode": 2, "threshold": 1000})
+    assert regmap.read_fields(ki, ["status", "threshold"]) == {
+        "status": 0x21,
+        "threshold": 1000,
+    }
+    with pytest.raises(ValueError, match="does not fit"):
+        regmap.write_fields(ki, {"status.mode": 8})
+    with pytest.raises(KeyError, match="Unknown field"):
+        regmap.lookup("status.missing")
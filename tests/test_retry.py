@@ -0,0 +1,115 @@
+import pytest
+
+from azo_ki import (
+    AckMismatchError,
+    AckTimeoutError,
+    GenericReturnError,
+    KeyboardInterface,
+    RetryPolicy,
+    SimulatedPico,
+)
+
+device = KeyboardInterface.device_select_e.device_iqs9320_i2c
+no_backoff = RetryPolicy(retries=2, backoff=0)
+
+
+def connect(pico, retry_policy=None):
+    return KeyboardInterface(
+        device, device_address=0x30, transport=pico, retry_policy=retry_policy
+    )
+
+
+def fail_next(pico, count, response=None):
+    # The next count frames are answered with response, or not at all
+    write = pico.write
+    remaining = [count]
+
+    def drop(data):
+        if remaining[0]:
+            remaining[0] -= 1
+            if response is not None:
+                pico.tx += response
+            return len(data)
+        return write(data)
+
+    pico.write = drop
+
+
+def test_typed_errors_without_policy(capsys):
+    pico = SimulatedPico()
+    ki = connect(pico)
+    fail_next(pico, 1)
+    with pytest.raises(AckTimeoutError, match="Failed to receive response packet"):
+        ki.iqs9320_i2c_read_single(0x2000, 2)
+    fail_next(pico, 1, b"\xcc\xef\x00\x31\xcc\xef")
+    with pytest.raises(AckMismatchError) as error:
+        ki.iqs9320_i2c_write_single(0x2000, [1])
+    assert error.value.failures == ["command_id"]
+    assert "ID error" in capsys.readouterr().out
+
+
+def test_retry_recovers():
+    pico = SimulatedPico()
+    ki = connect(pico, no_backoff)
+    metrics = ki.enable_metrics()
+    ki.print_errors = False
+    ki.iqs9320_i2c_write_single(0x2000, [1, 2])
+    fail_next(pico, 2)
+    assert ki.iqs9320_i2c_read_single(0x2000, 2) == [1, 2]
+    assert metrics.recoveries["retries"] == 2
+    assert metrics.failures["timeout"] == 2
+
+    fail_next(pico, 3)
+    with pytest.raises(AckTimeoutError):
+        ki.iqs9320_i2c_read_single(0x2000, 2)
+
+
+def test_retry_generic_return(capsys):
+    pico = SimulatedPico()
+    ki = connect(pico, RetryPolicy(retries=2, backoff=0, retry_writes=True))
+    respond = pico.respond
+    calls = []
+
+    def corrupt(command, args):
+        calls.append(command)
+        if len(calls) == 1:
+            return b"\x00" * 4
+        return respond(command, args)
+
+    pico.respond = corrupt
+    ki.iqs9320_i2c_write_single(0x2000, [5])
+    assert len(calls) == 2
+    assert pico.memory[0x30][0x4000] == 5
+    # Errors that were recovered from are not printed
+    assert "Invalid response" not in capsys.readouterr().out
+
+    # Writes are not retried by default
+    ki.retry_policy = no_backoff
+    calls.clear()
+    with pytest.raises(GenericReturnError):
+        ki.iqs9320_i2c_write_single(0x2000, [5])
+
+
+def test_retry_stops_stale_stream():
+    pico = SimulatedPico()
+    ki = connect(pico, no_backoff)
+    metrics = ki.enable_metrics()
+    ki.print_errors = False
+    # Stream samples full of 0xCC arriving after the command was sent
+    fail_next(pico, 1, b"\xcc" * 64)
+    ki.iqs9320_i2c_read_single(0x2000, 2)
+    assert metrics.recoveries["stream_stops"] == 1
+    assert ki.commands.cmd_stop_streaming in [frame[1] for frame in pico.frames]
+
+
+def test_retry_stale_stream_threshold():
+    # The first 6 bytes are taken as a bad acknowledge, the rest is discarded
+    for extra, stops in ((16, 0), (17, 1)):
+        pico = SimulatedPico()
+        ki = connect(pico, RetryPolicy(retries=2, backoff=0, stale_stream_bytes=16))
+        metrics = ki.enable_metrics()
+        ki.print_errors = False
+        fail_next(pico, 1, b"\xcc" * (6 + extra))
+        assert ki.iqs9320_i2c_read_single(0x2000, 2) == [0, 0]
+        assert metrics.recoveries["resyncs"] == 1
+        assert metrics.recoveries["stream_stops"] == stops
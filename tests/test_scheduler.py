@@ -0,0 +1,118 @@
+import struct
+import time
+
+import pytest
+
+from azo_ki import KeyboardInterface, SimulatedPico
+from azo_ki.scheduler import PollScheduler
+
+
+@pytest.fixture
+def sim():
+    pico = SimulatedPico()
+    for addr in (0x30, 0x32):
+        memory = pico.device_memory(addr)
+        memory[0x2000:0x2008] = struct.pack("<II", addr, addr + 1)
+        memory[0x4000:0x4004] = struct.pack("<I", 0x100 + addr)
+    return pico
+
+
+@pytest.fixture
+def ki(sim):
+    return KeyboardInterface(
+        KeyboardInterface.device_select_e.device_iqs9320_i2c,
+        device_address=[0x30, 0x32],
+        transport=sim,
+    )
+
+
+def test_due_jobs_share_reads(ki):
+    scheduler = ki.poll_scheduler()
+    scheduler.add("counts", {0x1000: 4}, period=0.005)
+    scheduler.add("deltas", {0x1002: 4}, [0x32], period=0.005)
+    scheduler.add("diagnostics", {0x2000: 4}, period=1.0)
+
+    # counts and deltas are contiguous: one read_multi of both devices
+    plan = scheduler.plan(["counts", "deltas"])
+    assert [(r.register_addr, r.num_bytes, r.devices) for r in plan.reads] == [
+        (0x1000, 8, (0x30, 0x32))
+    ]
+    assert scheduler.plan(["counts", "deltas", "diagnostics"]).frames == 2
+
+    slots, frames = scheduler.schedule()
+    assert len(slots) == 200 and slots[0] == (0.0, ["counts", "deltas", "diagnostics"])
+    assert frames == 201
+    merged, separate = scheduler.frame_rates()
+    assert merged == pytest.approx(201) and separate == pytest.approx(401)
+
+
+def test_rejects_unplannable_jobs(sim):
+    ki = KeyboardInterface(
+        KeyboardInterface.device_select_e.device_iqs9320_i2c, transport=sim
+    )
+    scheduler = ki.poll_scheduler()
+    with pytest.raises(ValueError, match="No device addresses"):
+        scheduler.add("counts", {0x1000: 4}, period=0.005)
+    scheduler.add("counts", {0x1000: 4}, [0x30], period=0.005)
+    scheduler.add("slow", {0x2000: 4}, [0x30], period=1 / 3)
+    assert scheduler.hyperperiod() is None
+    with pytest.raises(ValueError, match="no common multiple"):
+        scheduler.frame_rates()
+
+
+def test_step_reads_and_decodes(ki, sim):
+    received = []
+    scheduler = PollScheduler(ki)
+    scheduler.add("counts", {0x1000: 4, 0x1002: 4}, period=0.005)
+    scheduler.add(
+        "diagnostics",
+        [(0x2000, 4)],
+        [0x32],
+        period=1.0,
+        callback=lambda *args: received.append(args),
+    )
+    sim.frames.clear()
+    scheduler.start()
+    assert scheduler.step() == ["counts", "diagnostics"]
+    assert len(sim.frames) == 2
+    assert scheduler.jobs["counts"].last == {
+        0x1000: [struct.pack("<I", 0x30), struct.pack("<I", 0x32)],
+        0x1002: [struct.pack("<I", 0x31), struct.pack("<I", 0x33)],
+    }
+    name, values, _ = received[0]
+    assert name == "diagnostics" and values == {0x2000: [struct.pack("<I", 0x132)]}
+
+    # Ten periods behind: one late sample, the other due times are dropped
+    counts = scheduler.jobs["counts"]
+    counts.next_due = time.monotonic() - 0.0501
+    assert scheduler.step() == ["counts"]
+    assert counts.missed == 1 and counts.skipped >= 8
+    assert counts.next_due > time.monotonic() - 0.005
+    assert scheduler.frames == 3
+
+
+def test_run_reports_rates(ki):
+    scheduler = ki.poll_scheduler()
+    scheduler.add("fast", {0x1000: 4}, period=0.005)
+    scheduler.add("slow", {0x2000: 4}, period=0.02)
+    scheduler.run(duration=0.1)
+    report = scheduler.report()
+    fast, slow = report["jobs"]["fast"], report["jobs"]["slow"]
+    assert fast["samples"] > slow["samples"] >= 2
+    assert fast["target_hz"] == 200
+    assert fast["achieved_hz"] == pytest.approx(200, rel=0.5)
+    assert report["frames"] == report["cycles"] + slow["samples"]
+
+
+def test_single_period_uses_a_stream(ki):
+    scheduler = ki.poll_scheduler()
+    scheduler.add("counts", {0x1000: 4}, period=0.005)
+    scheduler.add("status", {0x1010: 2}, [0x32], period=0.005)
+    assert scheduler.stream_args() == [5, [0x30, 0x32], [0x1000, 0x1010], [4, 2]]
+    stream = scheduler.start_stream()
+    assert stream.report_interval_ms == 5 and stream.devices == [0x30, 0x32]
+    ki.stop_streaming()
+
+    scheduler.add("diagnostics", {0x2000: 4}, period=1.0)
+    assert scheduler.stream_args() is None
+    assert scheduler.start_stream() is None
@@ -0,0 +1,101 @@
+import struct
+import time
+
+import pytest
+
+from azo_ki import KeyboardInterface
+from azo_ki.stream import KeyScanStreamDecoder, StreamDecoder, StreamReader
+
+np = pytest.importorskip("numpy")
+
+
+def make_sample(values_4, values_2):
+    # Register-major layout: 4 byte register for every device, then 2 byte register
+    return struct.pack(
+        "<{}I{}H".format(len(values_4), len(values_2)), *values_4, *values_2
+    )
+
+
+def test_decode_multi_device():
+    decoder = StreamDecoder([0x1000, 0x2000], [4, 2], [0x30, 0x32, 0x34])
+    assert decoder.frame_size == 3 * (4 + 2)
+    data = make_sample([1, 2, 3], [4, 5, 6]) + make_sample([7, 8, 9], [10, 11, 12])
+    samples = decoder.decode(data)
+    assert samples.shape == (2,)
+    assert samples["0x1000"].tolist() == [[1, 2, 3], [7, 8, 9]]
+    fields = decoder.decode_dict(data)
+    assert fields[0x2000].tolist() == [[4, 5, 6], [10, 11, 12]]
+    array = decoder.decode_array(data)
+    assert array.shape == (2, 3, 2)
+    assert array[1, 2].tolist() == [9, 12]
+
+
+def test_decode_partial_sample_and_odd_width():
+    decoder = StreamDecoder([0x10, 0x20], [3, 1], 2)
+    data = bytes(range(8)) + bytes(3)
+    samples = decoder.decode(data)
+    assert len(samples) == 1
+    assert samples["0x0010"].tolist() == [[[0, 1, 2], [3, 4, 5]]]
+    with pytest.raises(ValueError):
+        decoder.decode_array(data)
+
+
+def test_read_from_interface(make_ki, pico):
+    ki = make_ki()
+    decoder = StreamDecoder([0x1000], [2], [0x30, 0x32])
+    ki.iqs9320_stream_i2c_read_multi(1, decoder.devices, [0x1000], [2])
+    pico.tx += struct.pack("<6H", 1, 2, 3, 4, 5, 6)
+    assert decoder.read(ki, 3)["0x1000"].tolist() == [[1, 2], [3, 4], [5, 6]]
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def test_stream_reader_get(make_ki, pico):
+    ki = make_ki()
+    decoder = StreamDecoder([0x1000], [2], 2)
+    ki.iqs9320_stream_i2c_read_multi(1, [0x30, 0x32], [0x1000], [2])
+    with StreamReader(ki, decoder, capacity=16) as reader:
+        pico.tx += struct.pack("<10H", *range(10))
+        samples = reader.get(5, timeout=2.0)
+        assert samples["0x1000"].tolist() == [[0, 1], [2, 3], [4, 5], [6, 7], [8, 9]]
+        assert len(reader.poll()) == 0
+    assert pico.frames[-1][1] == ki.commands.cmd_stop_streaming
+
+
+def test_stream_reader_overrun(make_ki, pico):
+    ki = make_ki()
+    decoder = StreamDecoder([0x10], [1], 1)
+    reader = StreamReader(ki, decoder, capacity=4).start()
+    pico.tx += bytes(range(10))
+    wait_for(lambda: reader.received == 10)
+    assert reader.poll()["0x0010"].ravel().tolist() == [6, 7, 8, 9]
+    assert reader.dropped == 6 and reader.overruns >= 1
+    assert len(reader.get(1, timeout=0.01)) == 0
+    reader.stop(stop_streaming=False)
+    assert not reader.running
+
+
+def test_stream_reader_key_scan(pico):
+    ki = KeyboardInterface(
+        KeyboardInterface.device_select_e.device_iqs9320_ks,
+        num_columns=2,
+        device_address=0x30,
+        transport=pico,
+    )
+    pico.ks_data[ki.commands.cmd_iqs9320_ks] = bytes(range(6))
+    ki.iqs9320_ks_stream_ks(5, 20)
+    assert ki.stream_config is not None
+    decoder = ki.stream_config.decoder()
+    assert isinstance(decoder, KeyScanStreamDecoder)
+    assert decoder.frame_size == 6
+    with StreamReader(ki, capacity=8) as reader:
+        pico.stream(3)
+        samples = reader.get(3, timeout=2.0)
+    assert samples["ks"].shape == (3, 2, 3)
+    assert samples["ks"][2].tolist() == [[0, 1, 2], [3, 4, 5]]
+    assert decoder.decode_array(bytes(range(6))).shape == (1, 2, 3)
@@ -0,0 +1,75 @@
+import time
+
+import pytest
+
+from azo_ki import KeyboardInterface, SimulatedPico
+from azo_ki.stream import StreamDecoder, StreamReader
+from azo_ki.timing import StreamTiming
+
+
+def test_interval_jitter_and_gaps():
+    timing = StreamTiming(10)
+    now = 100.0
+    for _ in range(100):
+        timing.update(1, now)
+        now += 0.010
+    # Two reads 1 ms early, then a 100 ms pause with 5 samples queued
+    timing.update(1, now - 0.009)
+    timing.update(1, now + 0.001)
+    timing.update(5, now + 0.100)
+    summary = timing.summary()
+    assert summary["samples"] == 107
+    assert summary["gaps"] == 1
+    assert summary["max_gap_s"] == pytest.approx(0.099)
+    # 5 samples in 99 ms, about 4 samples missing at the nominal rate
+    assert summary["missing"] == 4
+    assert summary["p99_jitter_s"] == pytest.approx(0.0098)
+    assert timing.jitter_percentile(50) == pytest.approx(0.0, abs=1e-9)
+
+
+def test_stream_reader_timing():
+    pytest.importorskip("numpy")
+    pico = SimulatedPico(realtime_streams=True)
+    ki = KeyboardInterface(
+        KeyboardInterface.device_select_e.device_iqs9320_i2c,
+        device_address=0x30,
+        transport=pico,
+    )
+    decoder = StreamDecoder([0x1000], [2], 1)
+    ki.iqs9320_stream_i2c_read_single(5, [0x1000], [2])
+    start = time.monotonic()
+    with StreamReader(ki, decoder, chunk_samples=1) as reader:
+        samples = reader.get(10, timeout=2.0)
+        assert reader.timing is not None
+        assert reader.timing.count >= 10
+    assert samples["time"][0] >= start
+    assert list(samples["time"]) == sorted(samples["time"])
+    summary = reader.summary
+    assert summary is not None
+    assert summary["requested_interval_s"] == 0.005
+    assert summary["mean_interval_s"] == pytest.approx(0.005, rel=0.5)
+    assert summary["missing"] <= 1
+
+
+def test_key_scan_stream_timing():
+    pytest.importorskip("numpy")
+    pico = SimulatedPico(realtime_streams=True)
+    ki = KeyboardInterface(
+        KeyboardInterface.device_select_e.device_iqs9320_ks,
+        num_columns=2,
+        device_address=0x30,
+        transport=pico,
+    )
+    pico.ks_data[ki.commands.cmd_iqs9320_ks] = bytes(range(6))
+    ki.iqs9320_ks_stream_ks(5, 20)
+    start = time.monotonic()
+    with StreamReader(ki, chunk_samples=1) as reader:
+        samples = reader.get(10, timeout=2.0)
+    assert samples["ks"][0].tolist() == [[0, 1, 2], [3, 4, 5]]
+    assert samples["time"][0] >= start
+    assert list(samples["time"]) == sorted(samples["time"])
+    summary = reader.summary
+    assert summary is not None
+    assert summary["requested_interval_s"] == 0.005
+    assert summary["mean_interval_s"] == pytest.approx(0.005, rel=0.5)
+    assert summary["missing"] <= 1
@@ -0,0 +1,71 @@
+import time
+
+import pytest
+
+from azo_ki import (
+    KeyboardInterface,
+    KeyboardInterfaceError,
+    RecordingTransport,
+    ReplayTransport,
+    SimulatedPico,
+)
+from azo_ki.transport import load_events
+
+device = KeyboardInterface.device_select_e.device_iqs9320_i2c
+
+
+def session(ki):
+    ki.iqs9320_i2c_write_single(0x2000, [1, 2])
+    return ki.iqs9320_i2c_read_single(0x2000, 2)
+
+
+def test_record_replay(tmp_path):
+    recording = RecordingTransport(SimulatedPico())
+    ki = KeyboardInterface(device, device_address=0x30, transport=recording)
+    assert session(ki) == [1, 2]
+    path = str(tmp_path / "session.jsonl")
+    recording.save(path)
+    assert load_events(path) == recording.events
+
+    replay = ReplayTransport(path)
+    ki = KeyboardInterface(device, device_address=0x30, transport=replay)
+    assert ki.port == "replay"
+    assert session(ki) == [1, 2]
+    assert replay.done
+
+    # The replayed session only answers the recorded commands
+    replay = ReplayTransport(recording.events)
+    ki = KeyboardInterface(device, device_address=0x30, transport=replay)
+    with pytest.raises(KeyboardInterfaceError, match="Replay mismatch"):
+        ki.iqs9320_i2c_write_single(0x2000, [1, 3])
+
+
+def test_simulator_drops_corrupt_frames():
+    pico = SimulatedPico()
+    ki = KeyboardInterface(device, device_address=0x30, transport=pico)
+    frame = bytearray(ki.encode_command([ki.commands.cmd_stop_streaming]))
+    frame[-3] ^= 0xFF
+    pico.write(frame)
+    assert pico.crc_errors == 1
+    assert pico.in_waiting == 0
+
+
+def test_simulator_realtime_stream():
+    pico = SimulatedPico(realtime_streams=True)
+    ki = KeyboardInterface(device, device_address=0x30, transport=pico)
+    ki.iqs9320_i2c_write_single(0x1000, [1, 2])
+    ki.iqs9320_stream_i2c_read_single(5, [0x1000], [2])
+    start = time.monotonic()
+    assert ki.read(8) == b"\x01\x02" * 4
+    assert time.monotonic() - start >= 0.015
+    ki.stop_streaming()
+    assert pico.in_waiting <= 2
+
+
+def test_simulator_baudrate():
+    pico = SimulatedPico(baudrate=10000, latency=0.01)
+    ki = KeyboardInterface(device, device_address=0x30, transport=pico)
+    start = time.monotonic()
+    ki.iqs9320_i2c_read_single(0x2000, 100)
+    # 10 bits per byte for the frame, ack and response plus the frame latency
+    assert time.monotonic() - start >= (13 + 106) * 10 / 10000 + 0.01